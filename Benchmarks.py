@@ -0,0 +1,464 @@
+import os
+import io
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+import numpy as np
+import Graphing
+import EasyStats
+import DataFiles
+from Logging import log, INFO, WARNING
+
+# Micro benchmarks for the hot paths of the library. Run with
+#   python Benchmarks.py [group ...] [--quick] [--json out.json] [--compare base.json]
+# Results can be written as JSON and compared with those of another commit;
+# --compare lists the cases that got slower than the threshold.
+
+SIZES = [10**4, 10**5, 10**6, 10**7]
+QUICK_SIZES = [10**3, 10**4, 10**5]
+
+def best_of(function, repeat=3, setup=None):
+    # setup() runs untimed before every repetition and its result is passed to function
+    best = float('inf')
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def _print_table(title, rows):
+    print(title)
+    print('{0:>10} {1:>12} {2:>12} {3:>9}'.format('points', 'before [s]', 'after [s]', 'speedup'))
+    for n, before, after in rows:
+        print('{0:>10} {1:>12.5f} {2:>12.5f} {3:>8.1f}x'.format(n, before, after, before / after))
+    print()
+
+def _print_times(title, rows):
+    print(title)
+    print('{0:>10} {1:>12} {2:>14}'.format('points', 'time [s]', 'points/s'))
+    for n, seconds in rows:
+        print('{0:>10} {1:>12.5f} {2:>14.3g}'.format(n, seconds, n / seconds if seconds > 0 else float('inf')))
+    print()
+
+def _repeat(n):
+    return 1 if n >= 10**6 else 3
+
+# transform step (shift + fitted model) of the add_* methods, as it was before
+# the vectorized pipeline, kept here as the reference
+def _legacy_shift(x, y, x_shift, y_shift):
+    X = [x_i + x_shift for x_i in x]
+    Y = [y_i + y_shift for y_i in y]
+    return X, Y
+
+def _legacy_linear(x, m, b, x_shift, y_shift):
+    yf = np.array([m*x_i+b for x_i in x])
+    return _legacy_shift(x, yf, x_shift, y_shift)
+
+def _legacy_quadratic(x, p, x_shift, y_shift):
+    yf = np.array([p[0]*(x_i**2) + p[1]*x_i + p[2] for x_i in x])
+    return _legacy_shift(x, yf, x_shift, y_shift)
+
+def _legacy_exponential(x, y, p, x_shift, y_shift):
+    for y_i in y:
+        if y_i <= 0:
+            raise Graphing.NegativeLog
+    yf = np.array([np.exp(p[1]) * np.exp(p[0]*x_i) for x_i in x])
+    return _legacy_shift(x, yf, x_shift, y_shift)
+
+def _vectorized_shift(x, y, x_shift, y_shift):
+    return Graphing.Graphing2D._shifted(x, x_shift), Graphing.Graphing2D._shifted(y, y_shift)
+
+def _vectorized_linear(x, m, b, x_shift, y_shift):
+    return Graphing.Graphing2D._shifted(x, x_shift), Graphing.PolyVal([m, b + y_shift], x)
+
+def _vectorized_quadratic(x, p, x_shift, y_shift):
+    return Graphing.Graphing2D._shifted(x, x_shift), Graphing.PolyVal([p[0], p[1], p[2] + y_shift], x)
+
+def _vectorized_exponential(x, y, p, x_shift, y_shift):
+    if np.any(y <= 0):
+        raise Graphing.NegativeLog
+    Y = np.multiply(x, p[0], dtype=np.float64)
+    np.exp(Y, out=Y)
+    Y *= np.exp(p[1])
+    Y += y_shift
+    return Graphing.Graphing2D._shifted(x, x_shift), Y
+
+def bench_transform(sizes=SIZES, legacy_limit=10**7):
+    # legacy_limit caps the sizes for which the (slow) legacy version is timed
+    results = {}
+    for n in sizes:
+        x = np.linspace(0, 1, n)
+        y = np.exp(0.5*x) + 1
+        p = [0.5, 0.1, 1.0]
+        cases = {
+            'shift' : (lambda: _legacy_shift(x, y, 1.0, 2.0), lambda: _vectorized_shift(x, y, 1.0, 2.0)),
+            'linear' : (lambda: _legacy_linear(x, 2.0, 1.0, 1.0, 2.0), lambda: _vectorized_linear(x, 2.0, 1.0, 1.0, 2.0)),
+            'quadratic' : (lambda: _legacy_quadratic(x, p, 1.0, 2.0), lambda: _vectorized_quadratic(x, p, 1.0, 2.0)),
+            'exponential' : (lambda: _legacy_exponential(x, y, p, 1.0, 2.0), lambda: _vectorized_exponential(x, y, p, 1.0, 2.0))
+        }
+        for name, (legacy, vectorized) in cases.items():
+            repeat = 1 if n >= 10**6 else 3
+            before = best_of(legacy, repeat) if n <= legacy_limit else float('nan')
+            after = best_of(vectorized, repeat)
+            results.setdefault(name, []).append((n, before, after))
+    for name, rows in results.items():
+        _print_table('transform: ' + name, rows)
+    return results
+
+# add_data input validation as it was before the dtype based check
+def _legacy_is_number(val):
+    return isinstance(val, int) or isinstance(val, float) or isinstance(val, np.int64) or isinstance(val, np.float64)
+
+def _legacy_ingest(arg):
+    if not False in [_legacy_is_number(e) for e in arg]:
+        return arg if isinstance(arg, np.ndarray) else np.array(arg)
+    raise Graphing.BadParameter
+
+def bench_ingest(sizes=[10**6, 10**7, 10**8], legacy_limit=10**7, list_limit=10**7):
+    # Python lists of 10^8 floats need several GB, so lists stop at list_limit
+    results = {}
+    for n in sizes:
+        array = np.random.default_rng(0).random(n)
+        cases = {'ndarray' : array}
+        if n <= list_limit:
+            cases['list'] = array.tolist()
+        for name, arg in cases.items():
+            before = best_of(lambda: _legacy_ingest(arg), 1) if n <= legacy_limit else float('nan')
+            after = best_of(lambda: Graphing.Graphing2D._as_column(arg), 1 if name == 'list' else 3)
+            results.setdefault(name, []).append((n, before, after))
+        del cases, array
+    for name, rows in results.items():
+        _print_table('add_data validation: ' + name, rows)
+    return results
+
+def bench_fits(sizes=SIZES):
+    rng = np.random.default_rng(0)
+    results = {}
+    for n in sizes:
+        x = np.linspace(0, 10, n)
+        y = 2*x + 1 + rng.normal(0, 0.1, n)
+        error = np.full(n, 0.1)
+        cases = {
+            'LinearFit' : lambda: EasyStats.LinearFit(x, y),
+            'LinearFitCasero' : lambda: EasyStats.LinearFitCasero(x, y),
+            'QuadraticFit' : lambda: EasyStats.QuadraticFit(x, y),
+            'NRankFit(8)' : lambda: EasyStats.NRankFit(x, y, 8),
+            'NRankFit(8, chebyshev)' : lambda: EasyStats.NRankFit(x, y, 8, 'chebyshev'),
+            'NRankFit(auto, chebyshev)' : lambda: EasyStats.NRankFit(x, y, 'auto', 'chebyshev'),
+            'WeightedLinearFit' : lambda: EasyStats.WeightedLinearFit(x, y, error),
+            'WeightedLinearFit(odr)' : lambda: EasyStats.WeightedLinearFit(x, y, error, error),
+            'OnlineLinearFit' : lambda: EasyStats.OnlineLinearFit().update(x, y).result()
+        }
+        for name, function in cases.items():
+            results.setdefault(name, []).append((n, best_of(function, _repeat(n))))
+    for name, rows in results.items():
+        _print_times('fit: ' + name, rows)
+    return results
+
+def _write_table(path, n, xlsx=False):
+    x = np.linspace(0, 10, n)
+    import pandas as pd
+    frame = pd.DataFrame({'x' : x, 'y' : 2*x + 1, 'x_error' : np.full(n, 0.1), 'y_error' : np.full(n, 0.2)})
+    if xlsx:
+        frame.to_excel(path, index=False)
+    else:
+        frame.to_csv(path, sep=';' if path.endswith('.csv') else '\t', index=False)
+
+def bench_files(sizes=[10**4, 10**5, 10**6], xlsx_limit=10**5):
+    # Graphing2D construction from files (eager, lazy with two columns read, and
+    # from the .npy cache). The binary formats are converted from the CSV file.
+    # XLSX needs openpyxl and is slow to write, so it stops at xlsx_limit;
+    # Feather and Parquet need pyarrow.
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for n in sizes:
+            for extension in ('.csv', '.tsv', '.xlsx', '.npz', '.npy', '.feather', '.parquet'):
+                path = os.path.join(directory, '{0}{1}'.format(n, extension))
+                try:
+                    if extension == '.xlsx':
+                        if n > xlsx_limit:
+                            continue
+                        _write_table(path, n, xlsx=True)
+                    elif extension in ('.csv', '.tsv'):
+                        _write_table(path, n)
+                    else:
+                        DataFiles.convert(os.path.join(directory, '{0}.csv'.format(n)), path, extension[1:])
+                except ImportError:
+                    continue
+                cases = {
+                    'eager' : lambda: Graphing.Graphing2D(path, headless=True),
+                    'lazy' : lambda: Graphing.Graphing2D(path, headless=True, lazy=True),
+                    'cached' : lambda: Graphing.Graphing2D(path, headless=True, cache=True)
+                }
+                for name, function in cases.items():
+                    results.setdefault(extension[1:] + ' ' + name, []).append((n, best_of(function, _repeat(n))))
+    for name, rows in results.items():
+        _print_times('add_data: ' + name, rows)
+    return results
+
+def bench_plotting(sizes=[10**3, 10**4, 10**5, 10**6]):
+    # add_* calls on a fresh headless Graphing2D; the figure is not rendered
+    rng = np.random.default_rng(0)
+    results = {}
+    for n in sizes:
+        x = np.linspace(0.1, 10, n)
+        y = np.exp(0.3*x) + rng.random(n)
+        errors = np.full((2, n), 0.1)
+        setup = lambda: Graphing.Graphing2D(x, y, *errors, headless=True)
+        cases = {
+            'add_plot' : lambda g: g.add_plot(),
+            'add_plot(decimate)' : lambda g: g.add_plot(decimate=True),
+            'add_scatter' : lambda g: g.add_scatter(),
+            'add_scatter(density)' : lambda g: g.add_scatter(density=True),
+            'add_scatter(density=hex)' : lambda g: g.add_scatter(density='hex'),
+            'add_plot(errorbars)' : lambda g: g.add_plot(0, 1, 2, 3, errorbars=True),
+            'add_linear_fit' : lambda g: g.add_linear_fit(),
+            'add_linear_fit(weighted)' : lambda g: g.add_linear_fit(0, 1, 2, 3, weighted=True),
+            'add_quadratic_fit' : lambda g: g.add_quadratic_fit(),
+            'add_exponential_fit' : lambda g: g.add_exponential_fit(),
+            'add_curve_fit(exponential)' : lambda g: g.add_curve_fit('exponential')
+        }
+        for name, function in cases.items():
+            if 'errorbars' in name and n > 10**5:
+                # one line collection per errorbar, not meant for this many points
+                continue
+            results.setdefault(name, []).append((n, best_of(function, _repeat(n), setup)))
+    for name, rows in results.items():
+        _print_times('plotting: ' + name, rows)
+    return results
+
+def bench_manage_kwargs(calls=[10**4, 10**5]):
+    # throughput of the option parsing shared by every add_* method
+    g = Graphing.Graphing2D([0.0, 1.0], [0.0, 1.0], headless=True)
+    cases = {
+        'none' : {},
+        'plot' : {'legend' : 'data', 'colour' : 'red', 'x_shift' : 1.0, 'linestyle' : '--', 'marker' : 'o'},
+        'fit' : {'customlegend' : 'run 1', 'colour' : 'blue', 'y_shift' : 2},
+        # built once and reused, only the per call part runs
+        'plot (PlotStyle)' : Graphing.PlotStyle(legend='data', colour='red', x_shift=1.0, linestyle='--', marker='o')
+    }
+    results = {}
+    for n in calls:
+        for name, kwargs in cases.items():
+            nkwargs = {'fit' : 'linear', 'm' : 1.0, 'b' : 2.0} if name == 'fit' else {}
+            def function():
+                for _ in range(n):
+                    g._manage_kwargs(kwargs, **nkwargs)
+                g._legends.clear()
+            results.setdefault(name, []).append((n, best_of(function)))
+    for name, rows in results.items():
+        _print_times('_manage_kwargs: ' + name, rows)
+    return results
+
+def bench_log(messages=[10**4, 10**5]):
+    # records per second into an in-memory sink, synchronous and asynchronous
+    cases = {
+        'text' : {},
+        'json' : {'format' : 'json'},
+        'async' : {'asynchronous' : True},
+        'filtered' : {'level' : WARNING},
+        'rate limited' : {'rate' : 100, 'burst' : 10}
+    }
+    results = {}
+    try:
+        for n in messages:
+            for name, options in cases.items():
+                def function():
+                    log.configure(level=options.get('level', INFO), sink=io.StringIO(), colour=False,
+                                  format=options.get('format', 'text'), asynchronous=options.get('asynchronous', False),
+                                  rate=options.get('rate', 0), burst=options.get('burst', 10), dedup=0)
+                    for i in range(n):
+                        log.info('sample {0} of {1}', i, n, run=1)
+                    log.flush()
+                results.setdefault(name, []).append((n, best_of(function)))
+            # time spent in the calling thread only: the asynchronous writer is
+            # flushed outside the timed part
+            def calls():
+                for i in range(n):
+                    log.info('sample {0} of {1}', i, n, run=1)
+            caller = []
+            for asynchronous in (False, True):
+                def setup():
+                    log.configure(level=INFO, sink=io.StringIO(), colour=False, format='text', asynchronous=asynchronous, rate=0, dedup=0)
+                def timed(_):
+                    calls()
+                caller.append(best_of(timed, setup=setup))
+                log.flush()
+            results.setdefault('async caller', []).append((n, caller[0], caller[1]))
+    finally:
+        log.configure(reset=True)
+    for name, rows in results.items():
+        if name == 'async caller':
+            _print_table('log: time in the calling thread, synchronous vs asynchronous', rows)
+        else:
+            _print_times('log: ' + name, rows)
+    return results
+
+# statements timed in a fresh interpreter by bench_import
+_IMPORTS = {
+    'Logging' : 'import Logging',
+    'EasyStats' : 'import EasyStats',
+    'Graphing' : 'import Graphing',
+    'Graphing + data' : 'import Graphing; Graphing.Graphing2D([1.0, 2.0, 3.0], [2.0, 4.1, 5.9])',
+    'Graphing + headless plot' : 'import Graphing; Graphing.Graphing2D([1.0, 2.0], [2.0, 4.0], headless=True).add_plot()',
+    'Graphing + pyplot' : 'import Graphing; Graphing.Graphing2D([1.0, 2.0], [2.0, 4.0]).add_plot()'
+}
+
+def bench_import(repeat=5):
+    # time of each statement in a new interpreter, where nothing is imported yet
+    directory = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, MPLBACKEND=os.environ.get('MPLBACKEND', 'Agg'))
+    def run(statement):
+        code = 'import time; _t = time.perf_counter(); {0}; print(time.perf_counter() - _t)'.format(statement)
+        return min(float(subprocess.run([sys.executable, '-c', code], cwd=directory, env=env, capture_output=True,
+                                        text=True, check=True).stdout) for _ in range(repeat))
+    results = {name : [(1, run(statement))] for name, statement in _IMPORTS.items()}
+    print('import time')
+    for name, rows in results.items():
+        print('{0:>26} {1:>10.4f} s'.format(name, rows[0][1]))
+    print()
+    return results
+
+def bench_batch(counts=[100, 1000, 10000], points=100):
+    # many short series: one add_plot per series against one add_series_batch,
+    # both rendered to a PNG in memory
+    x = np.linspace(0, 1, points)
+    style = Graphing.PlotStyle(colour='black')
+    results = {'series' : []}
+    for n in counts:
+        series = [(x, x * k) for k in range(n)]
+        def loop():
+            g = Graphing.Graphing2D(x, x, headless=True)
+            for k in range(n):
+                g.add_data(series[k][1])
+                g.add_plot(0, k + 2, style=style)
+            g.save(io.BytesIO(), format='png')
+        def batch():
+            g = Graphing.Graphing2D(x, x, headless=True)
+            g.add_series_batch(series, style=style)
+            g.save(io.BytesIO(), format='png')
+        results['series'].append((n, best_of(loop, 1), best_of(batch, 1)))
+    _print_table('add_plot per series vs add_series_batch (rows are series of {0} points)'.format(points), results['series'])
+    return results
+
+def bench_rolling(sizes=[10**4, 10**5, 10**6, 10**7], window=1000, legacy_limit=10**5):
+    # sliding linear fits (step 1): one LinearFit per window against RollingFit,
+    # and a SegmentedFit with one piece per window length
+    rng = np.random.default_rng(0)
+    results = {'RollingFit' : [], 'SegmentedFit' : []}
+    for n in sizes:
+        x = np.arange(n, dtype=np.float64)
+        y = 2*x + 1 + rng.normal(0, 0.1, n)
+        def legacy():
+            for i in range(n - window + 1):
+                EasyStats.LinearFit(x[i:i+window], y[i:i+window])
+        before = best_of(legacy, 1) if n <= legacy_limit else float('nan')
+        results['RollingFit'].append((n, before, best_of(lambda: EasyStats.RollingFit(x, y, window), _repeat(n))))
+        breakpoints = x[window::window]
+        results['SegmentedFit'].append((n, best_of(lambda: EasyStats.SegmentedFit(x, y, breakpoints), _repeat(n))))
+    _print_table('RollingFit vs LinearFit per window (window {0})'.format(window), results['RollingFit'])
+    _print_times('SegmentedFit ({0} samples per piece)'.format(window), results['SegmentedFit'])
+    return results
+
+BENCHMARKS = {
+    'import' : bench_import,
+    'transform' : bench_transform,
+    'ingest' : bench_ingest,
+    'fits' : bench_fits,
+    'rolling' : bench_rolling,
+    'files' : bench_files,
+    'plotting' : bench_plotting,
+    'manage_kwargs' : bench_manage_kwargs,
+    'batch' : bench_batch,
+    'log' : bench_log
+}
+
+# smaller sizes for a quick run, the groups not listed keep their defaults
+_QUICK = {
+    'transform' : {'sizes' : QUICK_SIZES},
+    'ingest' : {'sizes' : [10**5, 10**6]},
+    'fits' : {'sizes' : QUICK_SIZES},
+    'rolling' : {'sizes' : [10**4, 10**5], 'legacy_limit' : 10**4},
+    'files' : {'sizes' : [10**3, 10**4]},
+    'plotting' : {'sizes' : [10**3, 10**4]},
+    'manage_kwargs' : {'calls' : [10**4]},
+    'batch' : {'counts' : [100, 1000]},
+    'log' : {'messages' : [10**4]}
+}
+
+# what the first column (n) of the rows of a group counts, 'points' if not listed
+LABELS = {
+    'import' : 'cold imports',
+    'manage_kwargs' : 'calls',
+    'batch' : 'series',
+    'log' : 'records'
+}
+
+def run(groups=None, quick=False):
+    # {group : {case : [[n, seconds] or [n, before, after], ...]}}; timings that
+    # were skipped (NaN) are None so the results stay valid JSON
+    results = {}
+    for group in groups or BENCHMARKS:
+        options = _QUICK.get(group, {}) if quick else {}
+        results[group] = {case : [[None if v != v else v for v in row] for row in rows]
+                          for case, rows in BENCHMARKS[group](**options).items()}
+    return results
+
+def save_results(results, path):
+    out = {'meta' : _metadata(), 'labels' : {group : LABELS.get(group, 'points') for group in results}, 'results' : results}
+    with open(path, 'w') as f:
+        json.dump(out, f, indent=1, allow_nan=False)
+    return path
+
+def load_results(path):
+    with open(path) as f:
+        return json.load(f)['results']
+
+def compare(base, results, threshold=1.1):
+    # [(group, case, n, base seconds, new seconds), ...] for the rows that got
+    # more than threshold times slower; the last column of a row is its timing,
+    # rows without a timing (None) on either side are skipped
+    slower = []
+    for group, cases in results.items():
+        for case, rows in cases.items():
+            before = {row[0] : row[-1] for row in base.get(group, {}).get(case, [])}
+            for row in rows:
+                old = before.get(row[0])
+                if old is not None and row[-1] is not None and row[-1] > threshold * old:
+                    slower.append((group, case, row[0], old, row[-1]))
+    return slower
+
+def _metadata():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {'commit' : commit, 'time' : time.time(), 'python' : platform.python_version(),
+            'numpy' : np.__version__, 'machine' : platform.machine(), 'processor' : platform.processor()}
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmarks of the library')
+    parser.add_argument('groups', nargs='*', help='benchmark groups to run, out of {0} (all by default)'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('--quick', action='store_true', help='smaller sizes')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--compare', help='results file of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=1.1, help='slowdown ratio reported by --compare')
+    args = parser.parse_args()
+    for group in args.groups:
+        if not group in BENCHMARKS:
+            parser.error('unknown benchmark group "{0}"'.format(group))
+
+    results = run(args.groups, args.quick)
+    if args.json:
+        save_results(results, args.json)
+    if args.compare:
+        slower = compare(load_results(args.compare), results, args.threshold)
+        print('slower than {0}:'.format(args.compare) if slower else 'no regressions against {0}'.format(args.compare))
+        for group, case, n, old, new in slower:
+            print('  {0}: {1} (n={2}) {3:.5f} s -> {4:.5f} s ({5:.2f}x)'.format(group, case, n, old, new, new / old))
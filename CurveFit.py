@@ -0,0 +1,295 @@
+import numpy as np
+
+# Nonlinear curve fitting with pluggable models and robust losses.
+#
+#   fit, params, cov = CurveFit(x, y, 'gaussian', loss='huber')
+#
+# CurveFitter keeps the parameters of the last fit and starts the next one
+# from them, so refitting slightly changed data takes a few iterations.
+
+class Model:
+    # function(x, p) -> y, jacobian(x, p) -> (N, len(p)) array of d function / d p,
+    # guess(x, y) -> initial parameters
+    # normalize(p) -> equivalent parameters in canonical form (optional)
+    def __init__(self, name, parameters, function, jacobian, guess, normalize=None):
+        self.name = name
+        self.parameters = parameters
+        self.function = function
+        self.jacobian = jacobian
+        self.guess = guess
+        self.normalize = normalize
+
+def _exponential(x, p):
+    a, b, c = p
+    return a*np.exp(b*x) + c
+
+def _exponential_jacobian(x, p):
+    a, b, c = p
+    e = np.exp(b*x)
+    return np.column_stack([e, a*x*e, np.ones_like(x)])
+
+def _exponential_guess(x, y):
+    # a*exp(b*x) + c is convex for a > 0 (c below the data) and concave for
+    # a < 0 (c above it, charging/saturating curves): both are tried and the
+    # guess closer to the data is kept
+    pad = 0.01*(np.ptp(y) + 1)
+    best, best_cost = None, np.inf
+    for sign, c in ((1.0, y.min() - pad), (-1.0, y.max() + pad)):
+        b, log_a = np.polyfit(x, np.log(sign*(y - c)), 1)
+        p = np.array([sign*np.exp(log_a), b, c])
+        with np.errstate(over='ignore', invalid='ignore'):
+            cost = np.sum((y - _exponential(x, p))**2)
+        if best is None or cost < best_cost:
+            best, best_cost = p, cost
+    return best
+
+def _power(x, p):
+    a, b = p
+    return a*x**b
+
+def _power_jacobian(x, p):
+    a, b = p
+    xb = x**b
+    return np.column_stack([xb, a*xb*np.log(x)])
+
+def _power_guess(x, y):
+    if np.any(x <= 0):
+        raise ValueError('power law fits need x > 0')
+    sign = 1.0 if np.median(y) >= 0 else -1.0
+    ok = sign*y > 0
+    b, log_a = np.polyfit(np.log(x[ok]), np.log(sign*y[ok]), 1)
+    return np.array([sign*np.exp(log_a), b])
+
+def _gaussian(x, p):
+    a, mu, sigma, c = p
+    return a*np.exp(-0.5*((x - mu)/sigma)**2) + c
+
+def _gaussian_jacobian(x, p):
+    a, mu, sigma, c = p
+    d = (x - mu)/sigma
+    g = np.exp(-0.5*d*d)
+    return np.column_stack([g, a*g*d/sigma, a*g*d*d/sigma, np.ones_like(x)])
+
+def _gaussian_guess(x, y):
+    # peak of a moving average so single outliers do not pick the centre
+    order = np.argsort(x, kind='stable')
+    xs = x[order]
+    window = max(len(x)//50, 1)
+    smooth = np.convolve(y[order], np.ones(window)/window, mode='same')
+    c = np.median(smooth)
+    peak = np.argmax(np.abs(smooth - c))
+    a = smooth[peak] - c
+    w = np.clip((smooth - c)/a, 0, None)
+    sigma = np.sqrt(np.sum(w*(xs - xs[peak])**2) / max(np.sum(w), np.finfo(np.float64).tiny))
+    return np.array([a, xs[peak], sigma if sigma > 0 else np.ptp(x)/4 or 1.0, c])
+
+def _gaussian_normalize(p):
+    return np.array([p[0], p[1], abs(p[2]), p[3]])
+
+def _logistic(z):
+    # exp overflows to inf far from the centre, where 1/(1 + inf) = 0 is right
+    with np.errstate(over='ignore'):
+        return 1/(1 + np.exp(-z))
+
+def _sigmoid(x, p):
+    a, k, x0, c = p
+    return a*_logistic(k*(x - x0)) + c
+
+def _sigmoid_jacobian(x, p):
+    a, k, x0, c = p
+    s = _logistic(k*(x - x0))
+    ds = s*(1 - s)
+    return np.column_stack([s, a*ds*(x - x0), -a*ds*k, np.ones_like(x)])
+
+def _sigmoid_guess(x, y):
+    c = y.min()
+    a = np.ptp(y)
+    x0 = x[np.argmin(np.abs(y - (c + a/2)))]
+    k = 8/(np.ptp(x) or 1.0)
+    if np.corrcoef(x, y)[0, 1] < 0:
+        k = -k
+    return np.array([a, k, x0, c])
+
+MODELS = {
+    'exponential' : Model('exponential', ['a', 'b', 'c'], _exponential, _exponential_jacobian, _exponential_guess),
+    'power' : Model('power', ['a', 'b'], _power, _power_jacobian, _power_guess),
+    'gaussian' : Model('gaussian', ['a', 'mu', 'sigma', 'c'], _gaussian, _gaussian_jacobian, _gaussian_guess, _gaussian_normalize),
+    'sigmoid' : Model('sigmoid', ['a', 'k', 'x0', 'c'], _sigmoid, _sigmoid_jacobian, _sigmoid_guess)
+}
+LOSSES = ['linear', 'huber', 'ransac']
+
+def register_model(model):
+    MODELS[model.name] = model
+
+def CurveFit(x, y, model, p0=None, loss='linear', sigma=None, **options):
+    # returns the fitted values, the parameters and their covariance
+    return CurveFitter(model, loss, **options).fit(x, y, sigma, p0)
+
+class CurveFitter:
+    # options: max_iter (Levenberg-Marquardt iterations), tol (relative step size
+    # to stop at), huber_delta (in units of the robust residual scale),
+    # ransac_trials, ransac_threshold (absolute inlier residual, 2.5 robust
+    # scales by default), seed
+    def __init__(self, model, loss='linear', warm_start=True, max_iter=200, tol=1e-10,
+                 huber_delta=1.345, ransac_trials=100, ransac_threshold=None, seed=0):
+        self.model = MODELS[model] if isinstance(model, str) else model
+        if not loss in LOSSES:
+            raise ValueError('unknown loss "{0}", use one of {1}'.format(loss, LOSSES))
+        self.loss = loss
+        self.warm_start = warm_start
+        self.max_iter = max_iter
+        self.tol = tol
+        self.huber_delta = huber_delta
+        self.ransac_trials = ransac_trials
+        self.ransac_threshold = ransac_threshold
+        self.seed = seed
+        self.params = None
+        self.iterations = 0
+        self.inliers = None
+        # robust residual scale of the last huber/ransac fit
+        self.scale = None
+
+    def fit(self, x, y, sigma=None, p0=None):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        w = np.ones_like(x) if sigma is None else 1/np.broadcast_to(np.asarray(sigma, dtype=np.float64), x.shape)**2
+
+        # a warm start also reuses the residual scale and the RANSAC consensus set
+        warm = p0 is None and self.warm_start and self.params is not None
+        if warm:
+            p0 = self.params
+        p = self.model.guess(x, y) if p0 is None else np.array(p0, dtype=np.float64)
+        scale = self.scale if warm else None
+        previous = self.inliers if warm else None
+
+        self.inliers = None
+        self.iterations = 0
+        if self.loss == 'ransac':
+            p = self._ransac(x, y, w, p, scale, previous)
+        elif self.loss == 'huber':
+            p = self._huber(x, y, w, p, scale)
+        else:
+            p = self._levenberg_marquardt(x, y, w, p)
+        if self.model.normalize is not None:
+            p = self.model.normalize(p)
+
+        fit = self.model.function(x, p)
+        cov = self._covariance(x, y, w, p)
+        self.params = p
+        return fit, p, cov
+
+    def _levenberg_marquardt(self, x, y, w, p, huber=False, max_iter=None, scale=None):
+        model = self.model
+        lam = 1e-3
+        r = y - model.function(x, p)
+        # the Huber threshold is fixed per solve so the losses stay comparable,
+        # from the given residual scale or else the one of the starting point
+        if huber:
+            k = self.huber_delta * (_robust_scale(r*np.sqrt(w)) if scale is None else scale)
+        else:
+            k = None
+        weights, cost = self._weights(r, w, k)
+        for _ in range(self.max_iter if max_iter is None else max_iter):
+            self.iterations += 1
+            J = model.jacobian(x, p)
+            Jw = J * weights[:, None]
+            A = J.T @ Jw
+            g = Jw.T @ r
+            damping = np.diag(np.diag(A)) + np.eye(len(p)) * np.finfo(np.float64).eps
+            while True:
+                try:
+                    step = np.linalg.solve(A + lam*damping, g)
+                except np.linalg.LinAlgError:
+                    step = None
+                if step is not None:
+                    with np.errstate(over='ignore', invalid='ignore'):
+                        p_new = p + step
+                        r_new = y - model.function(x, p_new)
+                    weights_new, cost_new = self._weights(r_new, w, k)
+                    if cost_new < cost:
+                        break
+                lam *= 10
+                if lam > 1e12:
+                    return p
+            p, r, weights, cost = p_new, r_new, weights_new, cost_new
+            lam = max(lam/10, 1e-12)
+            if np.all(np.abs(step) <= self.tol*(np.abs(p) + self.tol)):
+                break
+        return p
+
+    def _huber(self, x, y, w, p, scale=None, passes=5):
+        # the residual scale of the starting point overestimates the noise, so the
+        # solve is repeated with the scale of the fitted residuals until it settles;
+        # a warm start begins with the scale of the previous fit
+        for _ in range(passes):
+            p = self._levenberg_marquardt(x, y, w, p, huber=True, scale=scale)
+            new_scale = _robust_scale((y - self.model.function(x, p))*np.sqrt(w))
+            if scale is not None and abs(new_scale - scale) <= 0.01*scale:
+                break
+            scale = new_scale
+        self.scale = new_scale
+        return p
+
+    @staticmethod
+    def _weights(r, w, k=None):
+        # IRLS weights and the loss for the residuals r, Huber with threshold k if given
+        if not np.all(np.isfinite(r)):
+            return w, np.inf
+        if k is None:
+            with np.errstate(over='ignore'):
+                return w, np.sum(w*r*r)
+        rw = np.abs(r)*np.sqrt(w)
+        big = rw > k
+        loss = np.where(big, k*(2*rw - k), rw*rw)
+        weights = np.where(big, w*k/np.maximum(rw, k), w)
+        return weights, np.sum(loss)
+
+    def _ransac(self, x, y, w, p, scale=None, previous=None):
+        # scale, previous: residual scale and inlier mask of the previous fit (warm start)
+        rng = np.random.default_rng(self.seed)
+        k = len(p)
+        threshold = self.ransac_threshold
+        if threshold is None:
+            if scale is None:
+                # the Huber fit gives the residual scale and a start close to the inliers
+                p = self._huber(x, y, w, p)
+                scale = _robust_scale(y - self.model.function(x, p))
+            threshold = 2.5 * scale
+        best, best_count = p, -1
+        trials = self.ransac_trials
+        if previous is not None and len(previous) == len(x):
+            # the previous consensus set refitted; no resampling while it still holds
+            best = self._levenberg_marquardt(x[previous], y[previous], w[previous], p)
+            with np.errstate(over='ignore', invalid='ignore'):
+                best_count = np.count_nonzero(np.abs(y - self.model.function(x, best)) < threshold)
+            if best_count >= np.count_nonzero(previous):
+                trials = 0
+        for _ in range(trials):
+            subset = rng.choice(len(x), size=min(len(x), 2*k), replace=False)
+            # a minimal sample only needs a rough fit, the consensus set is refined below
+            candidate = self._levenberg_marquardt(x[subset], y[subset], w[subset], p, max_iter=20)
+            with np.errstate(over='ignore', invalid='ignore'):
+                count = np.count_nonzero(np.abs(y - self.model.function(x, candidate)) < threshold)
+            if count > best_count:
+                best, best_count = candidate, count
+        with np.errstate(over='ignore', invalid='ignore'):
+            self.inliers = np.abs(y - self.model.function(x, best)) < threshold
+        p = self._levenberg_marquardt(x[self.inliers], y[self.inliers], w[self.inliers], best)
+        self.scale = _robust_scale(y - self.model.function(x, p))
+        return p
+
+    def _covariance(self, x, y, w, p):
+        if self.inliers is not None:
+            x, y, w = x[self.inliers], y[self.inliers], w[self.inliers]
+        J = self.model.jacobian(x, p)
+        r = y - self.model.function(x, p)
+        dof = max(len(x) - len(p), 1)
+        try:
+            return np.linalg.inv(J.T @ (J * w[:, None])) * (np.sum(w*r*r) / dof)
+        except np.linalg.LinAlgError:
+            return np.full((len(p), len(p)), np.inf)
+
+def _robust_scale(r):
+    # median absolute deviation scaled to the standard deviation of a normal distribution
+    scale = 1.4826 * np.median(np.abs(r - np.median(r)))
+    return scale if scale > 0 else np.finfo(np.float64).eps
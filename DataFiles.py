@@ -0,0 +1,419 @@
+import os
+import ast
+import struct
+import zipfile
+from urllib.parse import quote
+import numpy as np
+
+# Readers for the tabular files accepted by Graphing2D.add_data. Columns are
+# read on demand (only the requested ones, with an explicit dtype) and can be
+# cached next to the source as .npy files that are memory-mapped on reload.
+# pandas is imported on the first read, columns served from the cache never need it.
+#
+# Besides the text formats (.csv with ';', .tsv, .xlsx) the binary columnar
+# formats .npy, .npz, Feather and Parquet are read natively; Feather and
+# Parquet need pyarrow. The format is taken from the extension, or sniffed from
+# the first bytes of the file. A selection of rows is pushed down to the
+# reader where the format allows it: a row range (start, stop) and a list of
+# conditions [(column, op, value), ...] that all have to hold.
+
+_SEPARATORS = {'csv' : ';', 'tsv' : '\t'}
+_FORMATS = {
+    '.csv' : 'csv',
+    '.tsv' : 'tsv',
+    '.xlsx' : 'xlsx',
+    '.npy' : 'npy',
+    '.npz' : 'npz',
+    '.feather' : 'feather',
+    '.arrow' : 'feather',
+    '.parquet' : 'parquet',
+    '.pq' : 'parquet'
+}
+_OPERATORS = {
+    '==' : np.equal,
+    '!=' : np.not_equal,
+    '<' : np.less,
+    '<=' : np.less_equal,
+    '>' : np.greater,
+    '>=' : np.greater_equal,
+    'in' : lambda column, values: np.isin(column, values),
+    'not in' : lambda column, values: ~np.isin(column, values)
+}
+
+class FileColumn:
+    # placeholder for a column that has not been read from its file yet (dtype
+    # None keeps the dtype of the file)
+    # rows and where select the rows to read, see read_columns
+    def __init__(self, path, name, dtype=None, cache=False, rows=None, where=None):
+        self.path = path
+        self.name = name
+        self.dtype = dtype
+        self.cache = cache
+        self.rows = _as_rows(rows)
+        self.where = _as_where(where)
+
+def file_format(path):
+    # 'csv', 'tsv', 'xlsx', 'npy', 'npz', 'feather', 'parquet' or None
+    _format = _FORMATS.get(os.path.splitext(path)[1].lower())
+    return _format if _format is not None else _sniff(path)
+
+def is_supported(path):
+    return file_format(path) is not None
+
+def read_headers(path):
+    _format = file_format(path)
+    if _format == 'npy':
+        return list(_npy_columns(np.load(path, mmap_mode='r')))
+    if _format == 'npz':
+        with zipfile.ZipFile(path) as zf:
+            return [name[:-4] for name in zf.namelist() if name.endswith('.npy')]
+    if _format == 'feather':
+        import pyarrow as pa
+        with pa.memory_map(path) as source:
+            return list(pa.ipc.open_file(source).schema.names)
+    if _format == 'parquet':
+        import pyarrow.parquet as pq
+        return list(pq.read_schema(path).names)
+    import pandas as pd
+    if _format == 'xlsx':
+        return list(pd.read_excel(path, nrows=0).columns)
+    return list(pd.read_csv(path, sep=_separator(path), nrows=0).columns)
+
+def read_columns(path, names=None, dtype=None, cache=False, rows=None, where=None):
+    # returns {name : ndarray} for the requested columns only (every column if
+    # names is None). dtype may be a {name : dtype} dict; None keeps the dtype
+    # of the file. rows: (start, stop) range of rows (stop None for the end),
+    # where: [(column, op, value), ...] with op one of _OPERATORS, applied to
+    # the rows of the range. The cache always holds whole columns.
+    _format = file_format(path)
+    if _format is None:
+        raise ValueError('unsupported file "{0}"'.format(path))
+    rows = _as_rows(rows)
+    where = _as_where(where)
+    if names is None and (cache or where):
+        names = read_headers(path)
+    wanted = names
+    dtypes = None
+    if names is not None:
+        names = list(names)
+        # columns only needed to evaluate the conditions are read with the file's dtype
+        wanted = names + [column for column in dict.fromkeys(c for c, _, _ in where) if not column in names]
+        dtypes = {name : _dtype(dtype, name) if name in names else None for name in wanted}
+
+    if cache:
+        columns = {}
+        for name in wanted:
+            column = _load_cached(path, name, dtypes[name])
+            if column is not None:
+                columns[name] = column
+        missing = [name for name in wanted if not name in columns]
+        if missing:
+            read = _READERS[_format](path, missing, {name : dtypes[name] for name in missing}, None, ())
+            for name in missing:
+                columns[name] = _store_cached(path, name, _cast(read[name], dtypes[name]))
+        if rows is not None:
+            columns = {name : column[rows[0]:rows[1]] for name, column in columns.items()}
+    else:
+        columns = _READERS[_format](path, wanted, dtypes, rows, where)
+
+    if where:
+        mask = _mask(columns, where)
+        columns = {name : column[mask] for name, column in columns.items()}
+    if names is None:
+        return {name : _cast(column, _dtype(dtype, name)) for name, column in columns.items()}
+    return {name : _cast(columns[name], dtypes[name]) for name in names}
+
+def convert(path, out=None, format='npz', columns=None, dtype=None):
+    # One-shot conversion of a file (typically a CSV/TSV/XLSX archive) into a
+    # binary columnar format: 'npz' (uncompressed, one member per column, no
+    # extra dependency), 'npy' (structured array, memory-mapped on read),
+    # 'feather' or 'parquet' (pyarrow). Returns the written path.
+    if not format in ('npz', 'npy', 'feather', 'parquet'):
+        raise ValueError('unknown format "{0}", use "npz", "npy", "feather" or "parquet"'.format(format))
+    if out is None:
+        out = os.path.splitext(path)[0] + '.' + format
+    data = {str(name) : _storable(column) for name, column in read_columns(path, columns, dtype).items()}
+
+    if format == 'npz':
+        with open(out, 'wb') as f:
+            np.savez(f, **data)
+    elif format == 'npy':
+        n = len(next(iter(data.values()))) if data else 0
+        table = np.empty(n, dtype=[(name, column.dtype) for name, column in data.items()])
+        for name, column in data.items():
+            table[name] = column
+        with open(out, 'wb') as f:
+            np.save(f, table)
+    else:
+        import pyarrow as pa
+        table = pa.table(data)
+        if format == 'feather':
+            import pyarrow.feather as feather
+            # uncompressed, so reads can be memory-mapped
+            feather.write_feather(table, out, compression='uncompressed')
+        else:
+            import pyarrow.parquet as pq
+            pq.write_table(table, out)
+    return out
+
+def cache_path(path, name):
+    head, tail = os.path.split(path)
+    return os.path.join(head, '.' + tail + '.cache', quote(str(name), safe='') + '.npy')
+
+def _separator(path):
+    _format = file_format(path)
+    if _format in _SEPARATORS:
+        return _SEPARATORS[_format]
+    raise ValueError('unsupported file "{0}"'.format(path))
+
+def _sniff(path):
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(8)
+    except OSError:
+        return None
+    if head.startswith(b'\x93NUMPY'):
+        return 'npy'
+    if head.startswith(b'PAR1'):
+        return 'parquet'
+    if head.startswith(b'ARROW1'):
+        return 'feather'
+    if head.startswith(b'PK\x03\x04'):
+        # .npz and .xlsx are both zip archives
+        try:
+            with zipfile.ZipFile(path) as zf:
+                members = zf.namelist()
+        except (OSError, zipfile.BadZipFile):
+            return None
+        if '[Content_Types].xml' in members:
+            return 'xlsx'
+        if members and all(name.endswith('.npy') for name in members):
+            return 'npz'
+    return None
+
+def _as_rows(rows):
+    if rows is None:
+        return None
+    if isinstance(rows, slice):
+        if rows.step not in (None, 1):
+            raise ValueError('row ranges cannot have a step')
+        rows = (rows.start, rows.stop)
+    start, stop = rows
+    start = 0 if start is None else int(start)
+    stop = None if stop is None else int(stop)
+    if start < 0 or (stop is not None and stop < start):
+        raise ValueError('rows must be a (start, stop) range with 0 <= start <= stop')
+    return (start, stop)
+
+def _as_where(where):
+    # hashable tuple of (column, op, value) conditions
+    if where is None:
+        return ()
+    conditions = []
+    for column, op, value in where:
+        if not op in _OPERATORS:
+            raise ValueError('unknown operator "{0}", use one of {1}'.format(op, list(_OPERATORS)))
+        if op in ('in', 'not in'):
+            value = tuple(value)
+        conditions.append((column, op, value))
+    return tuple(conditions)
+
+def _mask(columns, where):
+    mask = None
+    for column, op, value in where:
+        condition = _OPERATORS[op](np.asarray(columns[column]), value)
+        mask = condition if mask is None else mask & condition
+    return mask
+
+def _dtype(dtype, name):
+    if isinstance(dtype, dict):
+        dtype = dtype.get(name)
+    return None if dtype is None else np.dtype(dtype)
+
+def _cast(column, dtype):
+    column = np.asarray(column)
+    if dtype is None or column.dtype == dtype:
+        return column
+    return column.astype(dtype)
+
+def _storable(column):
+    # object columns (strings read by pandas) as fixed width unicode
+    column = np.asarray(column)
+    return column.astype(str) if column.dtype.hasobject else column
+
+def _stop(rows, n):
+    return n if rows is None or rows[1] is None else min(rows[1], n)
+
+# Readers: (path, names or None, {name : dtype or None} or None, rows, where)
+# -> {name : ndarray}. The conditions are applied by read_columns afterwards,
+# a reader only uses them to skip data it does not have to read.
+
+def _read_text(path, names, dtypes, rows, where):
+    import pandas as pd
+    options = {}
+    if names is not None:
+        options['usecols'] = names
+    if dtypes:
+        options['dtype'] = {name : dtype for name, dtype in dtypes.items() if dtype is not None}
+    if rows is not None:
+        if rows[0]:
+            options['skiprows'] = range(1, rows[0] + 1)
+        if rows[1] is not None:
+            options['nrows'] = rows[1] - rows[0]
+    if file_format(path) == 'xlsx':
+        _file = pd.read_excel(path, **options)
+    else:
+        _file = pd.read_csv(path, sep=_separator(path), **options)
+    return {name : _file[name].to_numpy() for name in (_file.columns if names is None else names)}
+
+def _npy_columns(table):
+    # structured arrays have a column per field, 2-D arrays one per row (like
+    # the 2-D arrays passed to add_data) and 1-D arrays are a single column
+    if table.dtype.names is not None:
+        return {name : table[name] for name in table.dtype.names}
+    if table.ndim == 2:
+        return {str(i) : table[i] for i in range(table.shape[0])}
+    return {'0' : table}
+
+def _read_npy(path, names, dtypes, rows, where):
+    # memory-mapped, only the selected rows of the requested columns are touched
+    columns = _npy_columns(np.load(path, mmap_mode='r'))
+    start, stop = (0, None) if rows is None else rows
+    return {name : columns[name][start:stop] for name in (columns if names is None else names)}
+
+def _read_npz(path, names, dtypes, rows, where):
+    with zipfile.ZipFile(path) as zf:
+        if names is None:
+            names = [name[:-4] for name in zf.namelist() if name.endswith('.npy')]
+        return {name : _read_npz_member(zf, name + '.npy', rows) for name in names}
+
+def _read_npz_member(zf, member, rows):
+    # reads only the rows of the range: the member is an .npy file whose data
+    # follows the header, and seeking in a stored (uncompressed) member is cheap
+    with zf.open(member) as f:
+        shape, fortran_order, dtype = _read_npy_header(f, np.lib.format.read_magic(f))
+        if len(shape) != 1 or dtype.hasobject or rows is None:
+            f.seek(0)
+            column = np.lib.format.read_array(f)
+            return column if rows is None else column[rows[0]:rows[1]]
+        start = min(rows[0], shape[0])
+        count = _stop(rows, shape[0]) - start
+        f.seek(f.tell() + start * dtype.itemsize)
+        return np.frombuffer(f.read(count * dtype.itemsize), dtype=dtype, count=count)
+
+def _read_npy_header(f, version):
+    # (shape, fortran_order, dtype) of an .npy file positioned after its magic.
+    # Version 3.0 is 2.0 with a utf-8 header, numpy writes it for unicode field names.
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    if version == (2, 0):
+        return np.lib.format.read_array_header_2_0(f)
+    if version != (3, 0):
+        raise ValueError('unsupported .npy format version {0}.{1}'.format(*version))
+    length, = struct.unpack('<I', f.read(4))
+    header = ast.literal_eval(f.read(length).decode('utf-8'))
+    return tuple(header['shape']), header['fortran_order'], np.lib.format.descr_to_dtype(header['descr'])
+
+def _read_feather(path, names, dtypes, rows, where):
+    # uncompressed Feather files are memory-mapped, so slicing reads only the range
+    import pyarrow.feather as feather
+    table = feather.read_table(path, columns=names, memory_map=True)
+    if rows is not None:
+        start = min(rows[0], table.num_rows)
+        table = table.slice(start, _stop(rows, table.num_rows) - start)
+    return {name : table.column(name).to_numpy() for name in table.column_names}
+
+def _read_parquet(path, names, dtypes, rows, where):
+    # Only the row groups that overlap the row range and whose min/max
+    # statistics do not rule out the conditions are read.
+    import pyarrow.parquet as pq
+    parquet = pq.ParquetFile(path)
+    metadata = parquet.metadata
+    schema = parquet.schema_arrow
+    if names is None:
+        names = list(schema.names)
+    stop = _stop(rows, metadata.num_rows)
+    start = 0 if rows is None else min(rows[0], stop)
+
+    pieces = {name : [] for name in names}
+    offset = 0
+    for i in range(metadata.num_row_groups):
+        group = metadata.row_group(i)
+        first, last = offset, offset + group.num_rows
+        offset = last
+        if last <= start or first >= stop or _excluded(group, schema, where):
+            continue
+        table = parquet.read_row_group(i, columns=names)
+        table = table.slice(max(start - first, 0), min(stop, last) - max(start, first))
+        for name in names:
+            pieces[name].append(table.column(name).to_numpy())
+    return {name : np.concatenate(chunks) if chunks else np.empty(0, dtype=schema.field(name).type.to_pandas_dtype())
+            for name, chunks in pieces.items()}
+
+def _excluded(group, schema, where):
+    # True when the statistics of a row group show that no row can satisfy all conditions
+    for column, op, value in where:
+        statistics = group.column(schema.get_field_index(column)).statistics
+        if statistics is None or not statistics.has_min_max:
+            continue
+        low, high = statistics.min, statistics.max
+        try:
+            if op == '==' and (value < low or value > high):
+                return True
+            if op == '<' and low >= value:
+                return True
+            if op == '<=' and low > value:
+                return True
+            if op == '>' and high <= value:
+                return True
+            if op == '>=' and high < value:
+                return True
+            if op == 'in' and all(v < low or v > high for v in value):
+                return True
+        except TypeError:
+            # value not comparable with the column
+            continue
+    return False
+
+_READERS = {
+    'csv' : _read_text,
+    'tsv' : _read_text,
+    'xlsx' : _read_text,
+    'npy' : _read_npy,
+    'npz' : _read_npz,
+    'feather' : _read_feather,
+    'parquet' : _read_parquet
+}
+
+def _load_cached(path, name, dtype):
+    _cache_path = cache_path(path, name)
+    try:
+        if os.path.getmtime(_cache_path) < os.path.getmtime(path):
+            return None
+        column = np.load(_cache_path, mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+    if dtype is not None and column.dtype != dtype:
+        return None
+    return column
+
+def _store_cached(path, name, column):
+    if column.dtype.hasobject:
+        return column
+    _cache_path = cache_path(path, name)
+    try:
+        os.makedirs(os.path.dirname(_cache_path), exist_ok=True)
+        np.save(_cache_path, column)
+    except OSError:
+        # read-only location, keep the in-memory copy
+        return column
+    return np.load(_cache_path, mmap_mode='r')
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='Converts CSV/TSV/XLSX files into a binary columnar format')
+    parser.add_argument('paths', nargs='+', help='files to convert, written next to the source')
+    parser.add_argument('--format', default='npz', choices=['npz', 'npy', 'feather', 'parquet'])
+    args = parser.parse_args()
+    for path in args.paths:
+        print(convert(path, format=args.format))
@@ -0,0 +1,93 @@
+import numpy as np
+from DataFiles import FileColumn, read_columns
+
+class DataTable:
+    # Column store used by Graphing2D. Columns are kept as separate arrays
+    # (struct of arrays); a 2-D block added with extend() stays one contiguous
+    # array and its columns are views of its rows. Names and indices are mapped
+    # both ways, so lookups are O(1) in either direction. Columns without a name
+    # are called after their index. When two columns share a name, the name
+    # refers to the most recently added one (the earlier one keeps its index).
+    def __init__(self):
+        self._columns = []
+        self._names = []
+        self._index = {}
+        # growable backing buffers of the columns extended with extend_column
+        self._buffers = {}
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __getitem__(self, key):
+        return self._columns[self.index(key)]
+
+    def __setitem__(self, key, column):
+        i = self.index(key)
+        self._columns[i] = column
+        self._buffers.pop(i, None)
+
+    def append(self, column, name=None):
+        i = len(self._columns)
+        name = str(i) if name is None else name
+        self._columns.append(column)
+        self._names.append(name)
+        self._index[name] = i
+        return i
+
+    def extend(self, block, names=None):
+        # block: 2-D array with one column per row
+        block = np.asarray(block)
+        if names is None:
+            names = [None] * block.shape[0]
+        return [self.append(block[j], name) for j, name in enumerate(names)]
+
+    def extend_column(self, key, values):
+        # appends values to a column in amortized O(len(values)): the column is a
+        # view of a buffer that doubles its capacity when it runs out of room
+        i = self.index(key)
+        column = np.asarray(self._columns[i])
+        values = np.asarray(values).ravel()
+        n = len(column)
+        dtype = np.result_type(column, values)
+        buffer = self._buffers.get(i)
+        if buffer is None or buffer.dtype != dtype or n + len(values) > len(buffer):
+            buffer = np.empty(max(16, 2 * (n + len(values))), dtype=dtype)
+            buffer[:n] = column
+            self._buffers[i] = buffer
+        buffer[n:n+len(values)] = values
+        self._columns[i] = buffer[:n+len(values)]
+        return self._columns[i]
+
+    def index(self, key):
+        if isinstance(key, str):
+            try:
+                return self._index[key]
+            except KeyError:
+                raise KeyError('no column named "{0}"'.format(key)) from None
+        if isinstance(key, (int, np.integer)) and not isinstance(key, bool):
+            if not -len(self._columns) <= key < len(self._columns):
+                raise IndexError('column {0} out of range'.format(key))
+            return int(key) % len(self._columns)
+        raise TypeError('columns are looked up by name or index, not {0}'.format(type(key).__name__))
+
+    def name(self, i):
+        return self._names[i]
+
+    def names(self):
+        return list(self._names)
+
+    def load(self, indices):
+        # reads the pending FileColumn placeholders among indices, one read per file
+        pending = {}
+        for i in indices:
+            if i is None or not isinstance(self._columns[i], FileColumn):
+                continue
+            column = self._columns[i]
+            pending.setdefault((column.path, column.cache, column.rows, column.where), []).append(i)
+
+        for (path, cache, rows, where), _indices in pending.items():
+            names = [self._columns[i].name for i in _indices]
+            dtypes = {self._columns[i].name : self._columns[i].dtype for i in _indices}
+            columns = read_columns(path, names, dtypes, cache, rows, where)
+            for i in _indices:
+                self[i] = columns[self._columns[i].name]
@@ -1,51 +1,671 @@
+import os
+import hashlib
+import tempfile
+from collections import OrderedDict
+from functools import partial
+from math import comb
 import numpy as np
 
+# Every fit accepts either a single series y of shape (N,) or a stack of series
+# Y of shape (K, N) sharing the same x. Stacks are fitted in one solve and
+# return one row of fitted values (and of coefficients) per series.
+
+class FitCache:
+    # Memoizes fit coefficients keyed on a hash of the x/y buffers, the fit kind
+    # and the degree, in a bounded LRU and optionally in a directory of .npy files.
+    # The module-level fit_cache starts disabled (maxsize=0 and no directory);
+    # turn it on with fit_cache.configure(maxsize=256, directory=None).
+    def __init__(self, maxsize=256, directory=None):
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.configure(maxsize, directory)
+
+    def configure(self, maxsize=256, directory=None):
+        self.maxsize = maxsize
+        self.directory = directory
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+        while len(self._entries) > max(maxsize, 0):
+            self._entries.popitem(last=False)
+
+    @property
+    def enabled(self):
+        return self.maxsize > 0 or self.directory is not None
+
+    def key(self, kind, degree, x, y):
+        h = hashlib.blake2b(digest_size=16)
+        h.update('{0}:{1}'.format(kind, degree).encode())
+        for a in (x, y):
+            a = np.ascontiguousarray(a)
+            h.update('{0}{1}'.format(a.dtype.str, a.shape).encode())
+            h.update(a)
+        return h.hexdigest()
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key].copy()
+        if self.directory is not None:
+            try:
+                poly = np.load(self._path(key))
+            except (OSError, ValueError, EOFError):
+                # missing, or not a complete .npy file: a miss
+                poly = None
+            if poly is not None:
+                self._remember(key, poly)
+                self.hits += 1
+                return poly.copy()
+        self.misses += 1
+        return None
+
+    def put(self, key, poly):
+        poly = np.array(poly)
+        self._remember(key, poly)
+        if self.directory is not None:
+            # written to a temporary file and renamed, so readers (other
+            # processes sharing the directory) never see a partial entry
+            try:
+                fd, tmp = tempfile.mkstemp(suffix='.tmp', prefix=key, dir=self.directory)
+            except OSError:
+                return
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    np.save(f, poly)
+                os.replace(tmp, self._path(key))
+            except OSError:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        return {'hits' : self.hits, 'misses' : self.misses, 'size' : len(self._entries),
+                'maxsize' : self.maxsize, 'directory' : self.directory}
+
+    def _remember(self, key, poly):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = poly
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+fit_cache = FitCache(maxsize=0)
+
 def LinearFitCasero(x, y):
     # https://en.wikipedia.org/wiki/Simple_linear_regression
-    x_avg = _average(x)
-    y_avg = _average(y)
+    x, y = _as_xy(x, y)
 
-    m_sum_0_x = [(x_i - x_avg) for x_i in x]
-    m_sum_0_y = [(y_i - y_avg) for y_i in y]
-    m_sum_0 = 0
-    m_sum_1 = 0
-    for i in range(len(x)):
-        m_sum_0 += m_sum_0_x[i] * m_sum_0_y[i]
-        m_sum_1 += m_sum_0_x[i]**2
+    def solve():
+        x_avg = _average(x)
+        y_avg = _average(y)
 
-    m = m_sum_0/m_sum_1
-    b = y_avg-m*x_avg
+        dx = x - x_avg
+        m = _dot_product(y, dx) / _dot_product(dx, dx)
+        b = y_avg - m*x_avg
+        return np.stack([m, b], axis=-1)
 
-    return [m*x_i + b for x_i in x], [m, b]
+    poly = _cached('casero', 1, x, y, solve)
+    return PolyVal(poly, x), poly
 
 def LinearFit(x, y):
-    poly = np.polyfit(x, y, 1)
-    return [poly[0]*x_i + poly[1] for x_i in x], poly
+    return NRankFit(x, y, 1)
 
 def LinearFitOrigin(x, y):
-    m = _dot_product(y, x) / _dot_product(x, x)
-    return [m*x_i for x_i in x], [m, 0]
+    x, y = _as_xy(x, y)
+
+    def solve():
+        m = _dot_product(y, x) / _dot_product(x, x)
+        return np.stack([m, np.zeros_like(m)], axis=-1)
+
+    poly = _cached('origin', 1, x, y, solve)
+    return PolyVal(poly, x), poly
 
 def QuadraticFit(x, y):
-    poly = np.polyfit(x, y, 2)
-    return [poly[0]*x_i**2 + poly[1]*x_i + poly[2] for x_i in x], [poly[0], poly[1], poly[2]]
-
-def NRankFit(x, y, n):
-    poly = np.polyfit(x, y, n)
-    fit = []
-    for x_i in x:
-        res = 0
-        for i in range(n+1):
-            res += poly[i] * x_i**(n-i)
-        fit.append(res)
-    return fit, poly
+    return NRankFit(x, y, 2)
+
+def NRankFit(x, y, n, basis='power', max_degree=20):
+    x, y = _as_xy(x, y)
+    poly = PolyFit(x, y, n, basis, max_degree)
+    return PolyVal(poly, x), poly
+
+def PolyFit(x, y, n, basis='power', max_degree=20):
+    # coefficients only. With basis='power' they are the coefficients of the
+    # powers of x, highest first like np.polyfit. basis='chebyshev' or 'legendre'
+    # maps x onto [-1, 1] and solves by QR in that basis, which stays well
+    # conditioned at high degrees and for large offsets of x (timestamps); it
+    # returns an OrthoPoly. With an orthogonal basis n='auto' picks the degree
+    # up to max_degree with the lowest leave-one-out error (one degree for the
+    # whole stack of series).
+    x, y = _as_xy(x, y)
+    if basis == 'power':
+        if n == 'auto':
+            raise ValueError('n="auto" needs basis="chebyshev" or "legendre"')
+        return _cached('poly', n, x, y, lambda: _lstsq(np.vander(x, n+1), y))
+    if not basis in _BASES:
+        raise ValueError('unknown basis {0!r}, use "power" or one of {1}'.format(basis, list(_BASES)))
+    offset, scale = _domain(x)
+    t = (x - offset) / scale
+    if n == 'auto':
+        degree = min(max_degree, len(x) - 2)
+        coef = _cached(basis, 'auto{0}'.format(degree), x, y, lambda: _orthogonal_lstsq(_BASES[basis][0](t, degree), y, True))
+    else:
+        coef = _cached(basis, n, x, y, lambda: _orthogonal_lstsq(_BASES[basis][0](t, n), y))
+    return OrthoPoly(coef, basis, offset, scale)
+
+def WeightedLinearFit(x, y, y_error=None, x_error=None, absolute_sigma=True):
+    return WeightedNRankFit(x, y, 1, y_error, x_error, absolute_sigma)
+
+def WeightedQuadraticFit(x, y, y_error=None, x_error=None, absolute_sigma=True):
+    return WeightedNRankFit(x, y, 2, y_error, x_error, absolute_sigma)
+
+def WeightedNRankFit(x, y, n, y_error=None, x_error=None, absolute_sigma=True, max_iter=100, tol=1e-8):
+    # Weighted least squares with weights 1/y_error^2. Returns the fit, the
+    # coefficients and their covariance matrix, of shape (n+1, n+1) or
+    # (K, n+1, n+1) for a stack of K series.
+    # With x_error the fit becomes an orthogonal distance regression: the x
+    # positions are fitted too, and each Gauss-Newton step eliminates them
+    # analytically (Boggs, Byrd & Schnabel 1987), leaving a weighted solve with
+    # the effective variance y_error^2 + (p'(x) x_error)^2.
+    # absolute_sigma=False treats the errors as relative and scales the
+    # covariance by the reduced chi squared.
+    x, y = _as_xy(x, y)
+    if x_error is not None and y.ndim != 1:
+        raise ValueError('x errors are only supported for a single series')
+    var = _variance(y_error, x, 1.0)
+    poly, cov = _weighted_lstsq(np.vander(x, n+1), y, var)
+    residual = None
+
+    if x_error is not None:
+        var_y = _variance(y_error, x, 0.0)
+        var_x = _variance(x_error, x, 0.0)
+        delta = np.zeros_like(x)
+        for _ in range(max_iter):
+            xs = x + delta
+            slope = PolyVal(poly[:-1] * np.arange(n, 0, -1), xs)
+            e = y - PolyVal(poly, xs)
+            var = np.maximum(var_y + slope*slope*var_x, np.finfo(np.float64).tiny)
+            residual = e + slope*delta
+            V = np.vander(xs, n+1)
+            step, cov = _weighted_lstsq(V, residual, var)
+            poly = poly + step
+            u = e - V @ step
+            delta_step = (slope*u*var_x - delta*var_y) / var
+            delta = delta + delta_step
+            if np.all(np.abs(step) <= tol * (np.abs(poly) + tol)) and np.all(np.abs(delta_step) <= tol * (np.abs(xs) + tol)):
+                break
+
+    fit = PolyVal(poly, x)
+    if not absolute_sigma:
+        if residual is None:
+            residual = y - fit
+        chi2 = np.sum(residual**2 / var, axis=-1) / max(len(x) - n - 1, 1)
+        cov = cov * np.asarray(chi2)[..., None, None]
+    elif y.ndim == 2:
+        # the errors are shared by the whole stack, and so is the absolute covariance
+        cov = np.repeat(cov[None], y.shape[0], axis=0)
+    return fit, poly, cov
+
+def PolyVal(poly, x):
+    # Horner's scheme, vectorized over x and over every series in the stack
+    # (Clenshaw's recurrence for an OrthoPoly)
+    if isinstance(poly, OrthoPoly):
+        return poly(x)
+    poly = np.asarray(poly)
+    x = np.asarray(x)
+    fit = np.zeros(poly.shape[:-1] + x.shape)
+    for i in range(poly.shape[-1]):
+        fit *= x
+        fit += poly[..., i, None]
+    return fit
+
+class OrthoPoly:
+    # Polynomial in a Chebyshev or Legendre basis of t = (x - offset) / scale.
+    # coef has shape (degree+1,) or (K, degree+1), lowest degree first.
+    def __init__(self, coef, basis, offset, scale):
+        self.coef = np.asarray(coef)
+        self.basis = basis
+        self.offset = offset
+        self.scale = scale
+
+    @property
+    def degree(self):
+        return self.coef.shape[-1] - 1
+
+    def __call__(self, x):
+        t = (np.asarray(x, dtype=np.float64) - self.offset) / self.scale
+        return _BASES[self.basis][1](t, self.coef.T)
+
+    def power(self):
+        # coefficients of the powers of x, highest first (for PolyVal/np.polyval);
+        # at high degrees these lose the conditioning the orthogonal basis has
+        kind = np.polynomial.Chebyshev if self.basis == 'chebyshev' else np.polynomial.Legendre
+        domain = [self.offset - self.scale, self.offset + self.scale]
+        rows = []
+        for c in np.atleast_2d(self.coef):
+            p = kind(c, domain=domain).convert(kind=np.polynomial.Polynomial).coef
+            rows.append(np.pad(p, (0, len(c) - len(p)))[::-1])
+        return np.array(rows).reshape(self.coef.shape)
+
+class LocalPoly:
+    # One polynomial per window or piece of a RollingFit/SegmentedFit, each in
+    # its own coordinate t = (x - offset[i]) / scale[i] so the fits stay exact
+    # far from x = 0. coef has shape (M, degree+1) or (K, M, degree+1), lowest
+    # degree first.
+    def __init__(self, coef, offset, scale):
+        self.coef = np.asarray(coef)
+        self.offset = np.asarray(offset)
+        self.scale = np.asarray(scale)
+
+    @property
+    def degree(self):
+        return self.coef.shape[-1] - 1
+
+    def __len__(self):
+        return self.coef.shape[-2]
+
+    def __call__(self, x):
+        # evaluates local fit i at x[i]; x has shape (M,) or (M, P) for P points per fit
+        x = np.asarray(x, dtype=np.float64)
+        extra = (1,) * (x.ndim - 1)
+        t = (x - self.offset.reshape((-1,) + extra)) / self.scale.reshape((-1,) + extra)
+        coef = self.coef.reshape(self.coef.shape[:-1] + extra + self.coef.shape[-1:])
+        fit = np.zeros(self.coef.shape[:-1] + x.shape[1:])
+        for k in range(self.degree, -1, -1):
+            fit = fit*t + coef[..., k]
+        return fit
+
+    def power(self):
+        # coefficients of the powers of x, highest first, one row per local fit
+        # (for PolyVal/np.polyval); far from x = 0 these lose the precision the
+        # local coordinates have, except for the slope of a linear fit
+        poly = np.zeros_like(self.coef)
+        for k in range(self.degree + 1):
+            ck = self.coef[..., k] / self.scale**k
+            for j in range(k + 1):
+                poly[..., j] += comb(k, j) * (-self.offset)**(k - j) * ck
+        return poly[..., ::-1]
+
+class OnlineLinearFit:
+    # Incremental simple linear regression. Keeps only the count, the means and
+    # the centred sums of squares/products, so memory is O(1) in the number of
+    # samples. Chunks are combined with the pairwise update of Chan et al.
+    # https://en.wikipedia.org/wiki/Algorithms_for_calculating_variance#Parallel_algorithm
+    def __init__(self):
+        self.n = 0
+        self._x_avg = 0.0
+        self._y_avg = 0.0
+        self._sxx = 0.0
+        self._syy = 0.0
+        self._sxy = 0.0
+
+    def update(self, x_chunk, y_chunk):
+        x, y = _as_xy(np.atleast_1d(x_chunk), np.atleast_1d(y_chunk))
+        if x.shape[0] == 0:
+            return self
+        dx = x - _average(x)
+        dy = y - _average(y)[..., None]
+        chunk = OnlineLinearFit()
+        chunk.n = x.shape[0]
+        chunk._x_avg = _average(x)
+        chunk._y_avg = _average(y)
+        chunk._sxx = _dot_product(dx, dx)
+        chunk._syy = np.sum(dy*dy, axis=-1)
+        chunk._sxy = _dot_product(dy, dx)
+        return self.merge(chunk)
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        n = self.n + other.n
+        d_x = other._x_avg - self._x_avg
+        d_y = other._y_avg - self._y_avg
+        w = self.n * other.n / n
+        self._x_avg = self._x_avg + d_x * other.n / n
+        self._y_avg = self._y_avg + d_y * other.n / n
+        self._sxx = self._sxx + other._sxx + d_x*d_x*w
+        self._syy = self._syy + other._syy + d_y*d_y*w
+        self._sxy = self._sxy + other._sxy + d_x*d_y*w
+        self.n = n
+        return self
+
+    def result(self):
+        # returns [m, b], r squared and the standard errors [se_m, se_b]
+        if self.n < 2:
+            raise ValueError('at least two samples are needed for a linear fit')
+        m = self._sxy / self._sxx
+        b = self._y_avg - m*self._x_avg
+        sse = np.maximum(self._syy - m*self._sxy, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            r2 = 1 - sse/self._syy
+            s2 = sse / (self.n - 2)
+        se_m = np.sqrt(s2 / self._sxx)
+        se_b = np.sqrt(s2 * (1/self.n + self._x_avg**2/self._sxx))
+        return np.stack([m, b], axis=-1), r2, np.stack([se_m, se_b], axis=-1)
+
+# samples of x per chunk of blocks summed at once by RollingFit
+_ROLLING_CHUNK = 2**20
+
+def RollingFit(x, y, window, step=1, n=1):
+    # Polynomial fits of degree n over sliding windows of `window` consecutive
+    # samples, one window every `step` samples. Returns the index of the first
+    # sample of every window and a LocalPoly with one polynomial per window;
+    # window i covers x[start[i]:start[i]+window]. The normal equations of all
+    # windows are differences of cumulative sums of x^k and x^k*y, so the cost
+    # is O(N) whatever the window. Meant for low degrees, the normal equations
+    # square the condition number.
+    x, y = _as_xy(x, y)
+    N = x.shape[0]
+    if not isinstance(window, (int, np.integer)) or not n < window <= N:
+        raise ValueError('window must be an integer between n+1 and the number of samples')
+    if not isinstance(step, (int, np.integer)) or step < 1:
+        raise ValueError('step must be a positive integer')
+    start = np.arange(0, N - window + 1, step)
+    ys = y.reshape(-1, N)
+
+    # The sums restart every block of windows, relative to the first x of the
+    # block and scaled by its span: running sums over the whole series would
+    # cancel catastrophically for windows narrow compared to x (timestamps).
+    # A block holds a whole number of windows, so the window sums of all
+    # blocks are two strided slices of the running sums.
+    per_block = -(-window // step)
+    block = per_block * step
+    length = block - step + window
+    x_blocks = np.lib.stride_tricks.sliding_window_view(np.concatenate([x, np.full(block, x[-1])]), length)
+    y_blocks = np.lib.stride_tricks.sliding_window_view(np.concatenate([ys, np.repeat(ys[:, -1:], block, axis=1)], axis=1), length, axis=-1)
+    n_blocks = -(-len(start) // per_block)
+    per_chunk = max(_ROLLING_CHUNK // length, 1)
+
+    coef = np.empty((len(start), n+1, ys.shape[0]))
+    offset = np.empty(len(start))
+    scale = np.empty(len(start))
+    for b in range(0, n_blocks, per_chunk):
+        X = x_blocks[b*block:(b + per_chunk)*block:block]
+        Y = y_blocks[:, b*block:(b + per_chunk)*block:block]
+        lo = X[:, 0]
+        span = np.ptp(X, axis=1)
+        span[span == 0] = 1
+        t = (X - lo[:, None]) / span[:, None]
+
+        # P[k] and Q[k] are the running sums of t^k and t^k*y, with a leading 0
+        P = np.zeros((2*n + 1,) + X.shape[:-1] + (length + 1,))
+        Q = np.zeros((n + 1,) + Y.shape[:-1] + (length + 1,))
+        tk = np.ones_like(t)
+        for k in range(2*n + 1):
+            np.cumsum(tk, axis=-1, out=P[k, ..., 1:])
+            if k <= n:
+                np.cumsum(tk*Y, axis=-1, out=Q[k, ..., 1:])
+            tk *= t
+
+        first = b*per_block
+        count = min(len(X)*per_block, len(start) - first)
+        ends = slice(window, window + block - step + 1, step)
+        starts = slice(0, block - step + 1, step)
+        P = (P[..., ends] - P[..., starts]).reshape(2*n + 1, -1)[:, :count]
+        Q = (Q[..., ends] - Q[..., starts]).reshape(n + 1, ys.shape[0], -1)[..., :count]
+        done = slice(first, first + count)
+        coef[done] = _hankel_solve(P, Q)
+        offset[done] = np.repeat(lo, per_block)[:count]
+        scale[done] = np.repeat(span, per_block)[:count]
+
+    coef = np.moveaxis(coef, -1, 0)
+    return start, LocalPoly(coef[0] if y.ndim == 1 else coef, offset, scale)
+
+def SegmentedFit(x, y, breakpoints, n=1):
+    # Independent polynomial fits of degree n on the pieces of x between
+    # consecutive breakpoints (in units of x, which must be sorted): piece i
+    # covers edges[i] <= x < edges[i+1] with edges = [-inf, *breakpoints, inf].
+    # Returns the fitted values and a LocalPoly with one polynomial per piece.
+    # Pieces with fewer than n+1 samples get NaN coefficients. The per piece sums are
+    # accumulated with np.bincount in a single O(N) pass.
+    x, y = _as_xy(x, y)
+    N = x.shape[0]
+    breakpoints = np.atleast_1d(np.asarray(breakpoints, dtype=np.float64))
+    if breakpoints.ndim != 1 or np.any(np.diff(breakpoints) <= 0):
+        raise ValueError('breakpoints must be a strictly increasing list of x values')
+    if np.any(np.diff(x) < 0):
+        raise ValueError('x must be sorted for a segmented fit')
+    ys = y.reshape(-1, N)
+
+    bounds = np.concatenate([[0], np.searchsorted(x, breakpoints), [N]])
+    counts = np.diff(bounds)
+    pieces = len(counts)
+    piece = np.repeat(np.arange(pieces), counts)
+    # each piece in its own [0, 1] coordinate, like the blocks of RollingFit
+    lo = x[np.minimum(bounds[:-1], N - 1)] if N else np.zeros(pieces)
+    span = x[np.maximum(bounds[1:] - 1, 0)] - lo if N else np.ones(pieces)
+    span[span <= 0] = 1
+    t = (x - lo[piece]) / span[piece]
+
+    P = np.empty((2*n + 1, pieces))
+    Q = np.empty((n + 1, ys.shape[0], pieces))
+    tk = np.ones_like(t)
+    for k in range(2*n + 1):
+        P[k] = np.bincount(piece, tk, pieces)
+        if k <= n:
+            for row in range(ys.shape[0]):
+                Q[k, row] = np.bincount(piece, tk*ys[row], pieces)
+        tk *= t
+    coef = _hankel_solve(P, Q)
+    coef[counts <= n] = np.nan
+
+    fit = coef[piece, n]
+    for k in range(n - 1, -1, -1):
+        fit = fit*t[:, None] + coef[piece, k]
+    coef = np.moveaxis(coef, -1, 0)
+    if y.ndim == 1:
+        return fit[:, 0], LocalPoly(coef[0], lo, span)
+    return fit.T, LocalPoly(coef, lo, span)
+
+_FITS = {
+    'linear' : LinearFit,
+    'casero' : LinearFitCasero,
+    'origin' : LinearFitOrigin,
+    'quadratic' : QuadraticFit
+}
+
+def FitMany(datasets, kind='linear', workers=None):
+    # Fits every (x, y) pair in datasets and returns the [(fit, poly), ...] list
+    # in the same order. kind is one of _FITS or an int for NRankFit.
+    # With workers > 1 the datasets are sharded over a process pool; all x/y
+    # arrays are packed into one shared memory block and the workers write the
+    # fitted values into a second one, so only offsets and coefficients are pickled.
+    _get_fit(kind)
+    datasets = [_as_xy(x, y) for x, y in datasets]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(datasets))
+    if workers <= 1:
+        return [_get_fit(kind)(x, y) for x, y in datasets]
+
+    from concurrent.futures import ProcessPoolExecutor
+    from multiprocessing import shared_memory
+
+    spans = []
+    in_size = out_size = 0
+    for x, y in datasets:
+        spans.append((in_size, x.size, in_size + x.size, y.shape, out_size))
+        in_size += x.size + y.size
+        out_size += y.size
+
+    shm_in = shared_memory.SharedMemory(create=True, size=max(in_size, 1) * 8)
+    try:
+        shm_out = shared_memory.SharedMemory(create=True, size=max(out_size, 1) * 8)
+        try:
+            buf_in = np.ndarray((in_size,), dtype=np.float64, buffer=shm_in.buf)
+            for (x_off, n, y_off, y_shape, _), (x, y) in zip(spans, datasets):
+                buf_in[x_off:x_off+n] = x
+                buf_in[y_off:y_off+y.size] = y.ravel()
+            del buf_in
+
+            # a few shards per worker keeps the pool busy when dataset sizes vary
+            n_shards = min(len(spans), workers * 4)
+            shards = [spans[i::n_shards] for i in range(n_shards)]
+            polys = [None] * len(spans)
+            order = [range(i, len(spans), n_shards) for i in range(n_shards)]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                args = [(shm_in.name, in_size, shm_out.name, out_size, kind, shard) for shard in shards]
+                for idx, shard_polys in zip(order, pool.map(_fit_shard, args)):
+                    for i, poly in zip(idx, shard_polys):
+                        polys[i] = poly
+
+            fits = np.ndarray((out_size,), dtype=np.float64, buffer=shm_out.buf).copy()
+        finally:
+            shm_out.close()
+            shm_out.unlink()
+    finally:
+        # also when the second block cannot be created (e.g. /dev/shm is full)
+        shm_in.close()
+        shm_in.unlink()
+
+    return [(fits[out_off:out_off+int(np.prod(y_shape))].reshape(y_shape), poly)
+            for (_, _, _, y_shape, out_off), poly in zip(spans, polys)]
 
 # helper internal functions
+def _get_fit(kind):
+    if isinstance(kind, (int, np.integer)) and not isinstance(kind, bool):
+        return partial(NRankFit, n=int(kind))
+    if kind in _FITS:
+        return _FITS[kind]
+    raise ValueError('unknown fit kind {0!r}'.format(kind))
+
+def _fit_shard(args):
+    from multiprocessing import shared_memory
+    in_name, in_size, out_name, out_size, kind, spans = args
+    fit_function = _get_fit(kind)
+    shm_in = shared_memory.SharedMemory(name=in_name)
+    shm_out = shared_memory.SharedMemory(name=out_name)
+    try:
+        buf_in = np.ndarray((in_size,), dtype=np.float64, buffer=shm_in.buf)
+        buf_out = np.ndarray((out_size,), dtype=np.float64, buffer=shm_out.buf)
+        polys = []
+        for x_off, n, y_off, y_shape, out_off in spans:
+            size = int(np.prod(y_shape))
+            fit, poly = fit_function(buf_in[x_off:x_off+n], buf_in[y_off:y_off+size].reshape(y_shape))
+            buf_out[out_off:out_off+size] = fit.ravel()
+            polys.append(poly)
+        del buf_in, buf_out
+    finally:
+        shm_in.close()
+        shm_out.close()
+    return polys
+
+def _cached(kind, degree, x, y, solve):
+    if not fit_cache.enabled:
+        return solve()
+    key = fit_cache.key(kind, degree, x, y)
+    poly = fit_cache.get(key)
+    if poly is None:
+        poly = solve()
+        fit_cache.put(key, poly)
+    return poly
+
+def _as_xy(x, y):
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if x.ndim != 1 or y.ndim not in (1, 2) or y.shape[-1] != x.shape[0]:
+        raise ValueError('y must have shape (N,) or (K, N) for an x of shape (N,)')
+    return x, y
+
+def _lstsq(A, y):
+    # same column scaling as np.polyfit to keep the Vandermonde well conditioned,
+    # but a single solve for the whole stack of series
+    scale = np.sqrt((A*A).sum(axis=0))
+    scale[scale == 0] = 1
+    poly = np.linalg.lstsq(A / scale, y.T, rcond=None)[0]
+    return poly.T / scale
+
+# basis: (Vandermonde-like matrix, Clenshaw evaluation)
+_BASES = {
+    'chebyshev' : (np.polynomial.chebyshev.chebvander, np.polynomial.chebyshev.chebval),
+    'legendre' : (np.polynomial.legendre.legvander, np.polynomial.legendre.legval)
+}
+
+def _domain(x):
+    # offset and scale mapping x onto [-1, 1]
+    lo, hi = (x.min(), x.max()) if x.size else (0.0, 0.0)
+    scale = (hi - lo) / 2
+    return (hi + lo) / 2, scale if scale > 0 else 1.0
+
+def _orthogonal_lstsq(V, y, select=False):
+    # QR solve in an orthogonal basis. The columns of V go up in degree, so the
+    # leading d+1 columns of Q and block of R are the factorization of the
+    # degree d fit: every candidate degree reuses the same QR.
+    Q, R = np.linalg.qr(V)
+    z = Q.T @ y.T
+    n = _loo_degree(Q, z, y.T) if select else V.shape[1] - 1
+    return np.linalg.solve(R[:n+1, :n+1], z[:n+1]).T
+
+def _loo_degree(Q, z, y):
+    # degree with the lowest PRESS (leave-one-out squared error). The fit and the
+    # leverages h (diagonal of the hat matrix) of degree d are cumulative sums
+    # over the columns of Q, and the leave-one-out residual is e / (1 - h).
+    fit = np.zeros_like(y)
+    h = np.zeros(len(y))
+    best, best_press = 0, np.inf
+    for d in range(Q.shape[1]):
+        q = Q[:, d]
+        fit += np.multiply.outer(q, z[d])
+        h += q*q
+        with np.errstate(divide='ignore', invalid='ignore'):
+            e = (y - fit) / (1 - h).reshape((-1,) + (1,)*(y.ndim - 1))
+            press = np.sum(e*e)
+        if press < best_press:
+            best, best_press = d, press
+    return best
+
+def _hankel_solve(P, Q):
+    # Solves the normal equations sum_j P[i+j] c_j = Q[i] of many local fits at
+    # once. P: (2n+1, M) sums of t^k, Q: (n+1, K, M) sums of t^k*y. Returns the
+    # coefficients of the powers of t, lowest first, shape (M, n+1, K).
+    n = Q.shape[0] - 1
+    if n == 1:
+        # Cramer's rule, a batched LAPACK solve is slow for millions of 2x2 systems
+        det = P[0]*P[2] - P[1]*P[1]
+        if np.all(det != 0):
+            return np.stack([P[2]*Q[0] - P[1]*Q[1], P[0]*Q[1] - P[1]*Q[0]]).transpose(2, 0, 1) / det[:, None, None]
+    i = np.arange(n + 1)
+    A = np.moveaxis(P[i[:, None] + i], -1, 0)
+    b = np.moveaxis(Q, -1, 0)
+    try:
+        return np.linalg.solve(A, b)
+    except np.linalg.LinAlgError:
+        # some window has fewer than n+1 distinct x, take the minimum norm solutions
+        return np.linalg.pinv(A) @ b
+
+def _variance(error, x, default):
+    if error is None:
+        return np.full(x.shape, default)
+    error = np.broadcast_to(np.asarray(error, dtype=np.float64), x.shape)
+    return error*error
+
+def _weighted_lstsq(A, y, var):
+    # QR solve of the whitened system, the covariance comes from the same factorization
+    # weights are normalized to at most 1 so tiny variances cannot overflow
+    w = 1 / np.sqrt(np.maximum(var, np.finfo(np.float64).tiny))
+    w_max = w.max()
+    w = w / w_max
+    Aw = A * w[:, None]
+    scale = np.sqrt((Aw*Aw).sum(axis=0))
+    scale[scale == 0] = 1
+    Q, R = np.linalg.qr(Aw / scale)
+    poly = np.linalg.solve(R, Q.T @ (y*w).T)
+    R_inv = np.linalg.inv(R)
+    cov = (R_inv @ R_inv.T) / np.outer(scale, scale) / (w_max*w_max)
+    return poly.T / scale, cov
+
 def _average(a):
-    return sum(a)/len(a)
+    return np.mean(a, axis=-1)
 
 def _dot_product(v, w):
-    dot = 0
-    for i in range(len(v)):
-        dot += v[i] * w[i]
-    return dot
+    return np.dot(v, w)
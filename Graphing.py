@@ -1,25 +1,142 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib import rcParams
+import os
+import time
+from contextlib import nullcontext
 import numpy as np
 from Logging import log
+from EasyStats import OnlineLinearFit, PolyFit, PolyVal, RollingFit, SegmentedFit, WeightedNRankFit
+from CurveFit import CurveFitter, MODELS
+from DataFiles import FileColumn, is_supported, read_columns, read_headers
+from DataTable import DataTable
+
+# pandas and matplotlib take most of the import time, so they are imported
+# where they are first needed: pandas when a file is read, matplotlib when
+# something is drawn.
 
 _COLOURS = ['blue', 'red', 'orange', 'black', 'green', 'cyan', 'yellow', 'magenta', 'white', 'b', 'g', 'r', 'c', 'm', 'k', 'w', '#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
 DEFAULT_COLORS = ['#1f77b4', '#ff7f0e', '#2ca02c', '#d62728', '#9467bd', '#8c564b', '#e377c2', '#7f7f7f', '#bcbd22', '#17becf']
 _ERRORBAR_OPTION_TYPES = {'ecolor' : '', 'elinewidth' : 0.0, 'capsize' : 0.0, 'capthick' : 0.0, 'barsabove' : False, 'lolims' : False, 'uplims' : False, 'xlolims' : False, 'xuplims' : False, 'errorevery' : 1}
-_PLOT_KWARGS = ['autoaxis', 'autolegend', 'legend', 'customlegend', 'colour', 'color', 'x_shift', 'y_shift', 'errorbars', 'marker', 'linestyle']
-_SCATTER_KWARGS = ['s']
+_PLOT_KWARGS = ['style', 'autoaxis', 'autolegend', 'legend', 'customlegend', 'colour', 'color', 'x_shift', 'y_shift', 'errorbars', 'marker', 'linestyle', 'decimate', 'live', 'refit_every', 'weighted']
+_DECIMATE_MODES = ['lttb', 'minmax']
+# scatter plots have no order along x, they are reduced on the pixel grid
+_SCATTER_DECIMATE_MODES = ['pixel']
+_SCATTER_KWARGS = ['s', 'density', 'bins', 'cmap']
+_DENSITY_MODES = ['hist', 'hex']
+# rows binned at a time by the density mode of add_scatter
+_DENSITY_CHUNK = 2**20
 _MARKER_STYLES = ['.', ',', 'o', 'v', '^', '<', '>', '1', '2', '3', '4', '8', 's', 'p', 'P', '*', 'h', 'H', '+', 'x', 'X', 'D', 'd', '|', '_', 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11] # or expression between $
 _LINE_STYLES = ['-', '--', '.', '-:', ':', 'solid', 'dotted', 'dashed', 'dashdot', (0, (1, 10)), (0, (1, 1)), (0, (5, 10)), (0, (5, 1)), (0, (3, 10, 1, 10)), (0, (3, 5, 1, 5)), (0, (3, 1, 1, 1)), (0, (3, 5, 1, 5, 1, 5)), (0, (3, 10, 1, 10, 1, 10)), (0, (3, 1, 1, 1, 1, 1))]
 
+# sets of the lists above for O(1) lookups
+_VALID_KWARGS = frozenset(_PLOT_KWARGS + _SCATTER_KWARGS)
+_COLOUR_SET = frozenset(_COLOURS)
+_MARKER_SET = frozenset(_MARKER_STYLES)
+_LINE_STYLE_SET = frozenset(_LINE_STYLES)
+
+_NUMBER_TYPES = (int, float, np.integer, np.floating)
+
+_NO_TIMING = nullcontext()
+
+class PlotStyle:
+    # The options of the add_* methods, checked once. A style can be built
+    # ahead and shared by many calls, which then skip the checks:
+    #   style = PlotStyle(colour='red', linestyle='--')
+    #   g.add_plot(0, 1, style=style)
+    # Keywords passed next to style= override its options.
+    __slots__ = ('options', 'autoaxis', 'legend', 'customlegend', 'autolegend', 'colour', 'x_shift', 'y_shift',
+                 'errorbars', 'marker', 's', 'linestyle')
+
+    def __init__(self, **options):
+        self.options = options
+        self.autoaxis = False
+        # legend texts, None when not given
+        self.legend = None
+        self.customlegend = None
+        self.autolegend = None
+        self.colour = DEFAULT_COLORS[0]
+        self.x_shift = 0
+        self.y_shift = 0
+        self.s = None
+        self.errorbars = False
+        self.marker = None
+        self.linestyle = 'solid'
+
+        # only the given options are visited, so the usual handful of keywords is cheap to check
+        for key, value in options.items():
+            if key == 'colour' or key == 'color':
+                if not isinstance(value, str):
+                    raise BadParameter
+                # 'colour' wins when both are given
+                if value in _COLOUR_SET and (key == 'colour' or not 'colour' in options):
+                    self.colour = value
+            elif key == 'legend':
+                self.legend = _checked(value, str)
+            elif key == 'autolegend':
+                self.autolegend = _checked(value, bool)
+            elif key == 'customlegend':
+                self.customlegend = _checked(value, str)
+            elif key == 'x_shift':
+                self.x_shift = _checked(value, _NUMBER_TYPES)
+            elif key == 'y_shift':
+                self.y_shift = _checked(value, _NUMBER_TYPES)
+            elif key == 'linestyle':
+                try:
+                    supported = value in _LINE_STYLE_SET
+                except TypeError:
+                    # unhashable, e.g. a dash pattern given as a list
+                    supported = False
+                if supported:
+                    self.linestyle = value
+                else:
+                    log.warning('Not supported linestyle!')
+            elif key == 'marker':
+                if not isinstance(value, (str, int)):
+                    raise BadParameter
+                if value in _MARKER_SET or (isinstance(value, str) and value.startswith('$') and value.endswith('$')):
+                    self.marker = value
+                else:
+                    log.warning('Not supported marker!')
+            elif key == 'errorbars':
+                self.errorbars = _checked(value, bool)
+            elif key == 'autoaxis':
+                self.autoaxis = _checked(value, bool)
+            elif key == 's':
+                self.s = _checked(value, _NUMBER_TYPES)
+            elif not key in _VALID_KWARGS:
+                log.warning('In "plotting": The passed key "{0}" is not valid', key)
+
+    # the raw options stay reachable like a dict, for the options read by the add_* methods themselves
+    def __contains__(self, key):
+        return key in self.options
+
+    def __getitem__(self, key):
+        return self.options[key]
+
+    def get(self, key, default=None):
+        return self.options.get(key, default)
+
+_DEFAULT_STYLE = PlotStyle()
+
+def _checked(value, types):
+    if not isinstance(value, types):
+        raise BadParameter
+    return value
+
 class Graphing2D:
-    def __init__(self, *args):    
-        self._data = []
-        self._headers = {}
+    def __init__(self, *args, headless=False, timing=False, **kwargs):    
+        # headless: draw on a private Agg figure instead of the pyplot one (for save/render_batch)
+        # timing: measure the time spent per stage, see set_timing
+        self._headless = headless
+        self._fig = None
+        self._ax = None
+        self._timings = None
+        self._timing_callback = None
+        if timing:
+            self.set_timing()
+        self._data = DataTable()
         self._working_headers = ['0', '1']
 
         for arg in args:
-            self.add_data(arg)
+            self.add_data(arg, **kwargs)
 
         self._legends = []
         self._x = 0
@@ -40,9 +157,28 @@ class Graphing2D:
             'errorevery' : 1
         }
 
+        # live series updated by append/refresh (see add_plot(live=True))
+        self._live = []
+        self._live_interval = 1 / 30
+        self._last_refresh = 0.0
+        self._background = None
+
+        # CurveFitter per (model, loss, x column, y column), each starts from its
+        # previous solution on the same columns
+        self._curve_fitters = {}
+
         self.set_working_data(0, 1)
 
-    def add_data(self, *args):
+    def add_data(self, *args, lazy=False, dtype=None, cache=False, columns=None, rows=None, where=None):
+        # files: .csv (';' separated), .tsv, .xlsx, .npy, .npz, .feather, .parquet
+        # lazy: only read a file's headers now, columns are read when set_working_data uses them
+        # dtype: dtype (or {header : dtype}) of the columns read, None keeps the dtypes of the file
+        # cache: keep the parsed columns as .npy files next to the source and memory-map them on reload
+        # columns: headers of the columns to take from the files (all by default)
+        # rows: (start, stop) range of rows to take from the files
+        # where: [(header, op, value), ...] conditions the rows taken from the files have to meet,
+        #        op is one of '==', '!=', '<', '<=', '>', '>=', 'in', 'not in'
+        # Binary formats read only the selected columns and rows where the format allows it.
         if not args:
             raise ParameterMissing
 
@@ -52,44 +188,61 @@ class Graphing2D:
             if isinstance(arg, str):
                 processed_args.append(arg)
             elif isinstance(arg, list) or isinstance(arg, np.ndarray):
-                if not False in [self._is_number(e) for e in arg]:
-                    # list of numbers
-                    processed_args.append(arg)
+                column = self._as_column(arg)
+                if column is not None:
+                    # list/array of numbers (or 2-D array of numbers)
+                    processed_args.append(column)
                 elif not False in [isinstance(e, list) or isinstance(e, np.ndarray) or isinstance(e, str) for e in arg]:
                     # list of lists or directories
                     for e in arg:
-                        processed_args.append(e)
+                        processed_args.append(e if isinstance(e, str) else self._as_column(e, required=True))
                 else:
-                    raise BadParameter
+                    raise BadParameter('add_data expects file paths, lists/arrays of numbers or lists of those')
+            else:
+                raise BadParameter('add_data does not accept {0}'.format(type(arg).__name__))
+
+        with self._stage('load'):
+            for arg in processed_args:
+                if isinstance(arg, str):
+                    if not is_supported(arg):
+                        raise BadParameter('unsupported file "{0}"'.format(arg))
+                    headers = None
+                    if lazy or cache or columns is not None:
+                        headers = read_headers(arg)
+                        if columns is not None:
+                            for h in columns:
+                                if not h in headers:
+                                    raise NonExistingData('no column "{0}" in "{1}"'.format(h, arg))
+                            headers = list(columns)
+                    try:
+                        if lazy or cache:
+                            _file = {h : FileColumn(arg, h, dtype.get(h) if isinstance(dtype, dict) else dtype, cache, rows, where) for h in headers}
+                        else:
+                            _file = read_columns(arg, headers, dtype, rows=rows, where=where)
+
+                        indices = []
+                        for h in _file:
+                            if isinstance(_file[h], FileColumn):
+                                indices.append(self._data.append(_file[h], h))
+                            else:
+                                indices.append(self._data.append(np.array(_file[h]), h))
+
+                        if cache and not lazy:
+                            self._data.load(indices)
+                    except ValueError as e:
+                        # e.g. a text column read with a numeric dtype
+                        raise BadParameter(str(e)) from None
+
+                elif isinstance(arg, np.ndarray) and arg.ndim == 2:
+                    # one column per row, kept as views of the contiguous block
+                    self._data.extend(arg)
+
+                elif isinstance(arg, np.ndarray):
+                    self._data.append(arg)
 
-        for arg in processed_args:
-            if isinstance(arg, str):
-                if arg.endswith('.csv'):
-                    _file = pd.read_csv(arg, sep=';')
-                elif arg.endswith('.tsv'):
-                    _file = pd.read_csv(arg, sep='\t')
-                elif arg.endswith('.xlsx'):
-                    _file = pd.read_excel(arg)
                 else:
                     raise BadParameter
 
-                i = 0
-                for h in _file:
-                    self._data.append(np.array(_file[h]))
-                    self._headers.update({h : i})
-                    i += 1
-
-            elif isinstance(arg, list) or isinstance(arg, np.ndarray):
-                if isinstance(arg, np.ndarray):
-                    self._data.append(arg)
-                else:
-                    self._data.append(np.array(arg))
-                for i in range(len(self._data[-1])):
-                    self._headers.update({str(i) : i})
-
-            else:
-                raise BadParameter
-
     def set_working_data(self, x_name, y_name, x_error_name=None, y_error_name=None):
         x = self._get_column_input(x_name)
         y = self._get_column_input(y_name)
@@ -107,8 +260,10 @@ class Graphing2D:
             if y_error >= len(self._data):
                 raise NonExistingData
             self._y_error = y_error
-        self._working_headers[0] = str(list(self._headers.keys())[self._x])
-        self._working_headers[1] = str(list(self._headers.keys())[self._y])
+        with self._stage('load'):
+            self._data.load([x, y, self._x_error, self._y_error])
+        self._working_headers[0] = str(self._data.name(self._x))
+        self._working_headers[1] = str(self._data.name(self._y))
 
     def set_working_error_data(self, x_error_name, y_error_name):
         x_error = self._get_column_input(x_error_name)
@@ -117,6 +272,8 @@ class Graphing2D:
             raise NonExistingData
         self._x_error = x_error
         self._y_error = y_error
+        with self._stage('load'):
+            self._data.load([x_error, y_error])
 
     def set_errorbars_options(self, **kwargs):
         for key in kwargs.keys():
@@ -133,161 +290,527 @@ class Graphing2D:
                     raise BadParameter
                 self._errorbar_options[key] = kwargs[key]
             else:
-                log.warning('In "set_errorbars_options": The passed key "{0}" is not valid'.format(key))
+                log.warning('In "set_errorbars_options": The passed key "{0}" is not valid', key)
 
     def add_plot(self, *args, **kwargs):
         # accepted kwargs
         # autolabel = bool
         # autolegend = bool
         # legend = string (is overrides autolegend)
+        # style = PlotStyle (see PlotStyle)
+        kwargs = self._resolve_style(kwargs)
 
         if args:
             self._manage_working_data_args(args)        
 
         # manage kwargs
         _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs)
-
-        X = [x + _x_shift for x in self._data[self._x]]
-        Y = [y + _y_shift for y in self._data[self._y]]
-
-        plt.plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
-        if _errorbars:
-            self._add_errorbars(X, Y) 
+        with self._stage('transform'):
+            _idx = self._manage_decimate(kwargs)
+            X = self._shifted(self._take(self._data[self._x], _idx), _x_shift)
+            Y = self._shifted(self._take(self._data[self._y], _idx), _y_shift)
+
+        with self._stage('artists'):
+            lines = self._axes().plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
+            if _errorbars:
+                self._add_errorbars(X, Y, _idx) 
+        if self._manage_live(kwargs):
+            self._add_live(lines[0], 'plot', _x_shift, _y_shift, decimate=self._decimate_mode(kwargs))
 
     def add_scatter(self, *args, **kwargs):
+        kwargs = self._resolve_style(kwargs)
 
         if args:
             self._manage_working_data_args(args) 
 
         # manage kwargs
         _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs, scatter=True)
-
-        X = [x + _x_shift for x in self._data[self._x]]
-        Y = [y + _y_shift for y in self._data[self._y]]
-
-        plt.scatter(X, Y, label=_finallegend, color=_colour, marker=_marker, s=_s)
-        if _errorbars:
-            self._add_errorbars(X, Y) 
+        _density = self._manage_density(kwargs)
+        if _density is not None:
+            if self._manage_live(kwargs):
+                raise BadParameter('density scatter plots cannot be live')
+            self._add_density(_density, self._manage_bins(kwargs, _density), kwargs.get('cmap', 'viridis'), _finallegend, _x_shift, _y_shift, _errorbars)
+            return
+
+        with self._stage('transform'):
+            _idx = self._manage_decimate(kwargs, scatter=True)
+            X = self._shifted(self._take(self._data[self._x], _idx), _x_shift)
+            Y = self._shifted(self._take(self._data[self._y], _idx), _y_shift)
+
+        with self._stage('artists'):
+            collection = self._axes().scatter(X, Y, label=_finallegend, color=_colour, marker=_marker, s=_s)
+            if _errorbars:
+                self._add_errorbars(X, Y, _idx) 
+        if self._manage_live(kwargs):
+            self._add_live(collection, 'scatter', _x_shift, _y_shift, decimate=self._decimate_mode(kwargs, scatter=True))
 
     def add_linear_fit(self, *args, **kwargs):
+        kwargs = self._resolve_style(kwargs)
 
         if args:
             self._manage_working_data_args(args)  
 
         # manage kwargs
-        m, b = np.polyfit(self._data[self._x], self._data[self._y], 1)
-
-        yf = np.array([m*x+b for x in self._data[self._x]])
+        x = np.asarray(self._data[self._x])
+        p, cov = self._fit(x, np.asarray(self._data[self._y]), 1, kwargs)
+        m, b = p
 
         _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs, fit='linear', m=m, b=b)
 
-        X = [x + _x_shift for x in self._data[self._x]]
-        Y = [y + _y_shift for y in yf]
+        with self._stage('transform'):
+            X = self._shifted(x, _x_shift)
+            Y = PolyVal([m, b + _y_shift], x)
 
-        plt.plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
-        if _errorbars:
-            self._add_errorbars(X, Y)
+        with self._stage('artists'):
+            lines = self._axes().plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
+            if _errorbars:
+                self._add_errorbars(X, Y)
+        if self._manage_live(kwargs):
+            fitter = OnlineLinearFit().update(x, self._data[self._y])
+            self._add_live(lines[0], 'linear', _x_shift, _y_shift, fitter, self._manage_refit_every(kwargs))
+        return p, cov
 
     def add_quadratic_fit(self, *args, **kwargs):
+        # live fits are only incremental for the linear and exponential fits
+        kwargs = self._resolve_style(kwargs)
+        if kwargs.get('live'):
+            raise BadParameter('"live" is not supported by add_quadratic_fit')
 
         if args:
             self._manage_working_data_args(args)  
 
         # manage kwargs
-        p = np.polyfit(self._data[self._x], self._data[self._y], 2)
-
-        yf = np.array([p[0]*(x**2) + p[1]*x + p[2] for x in self._data[self._x]])
+        x = np.asarray(self._data[self._x])
+        p, cov = self._fit(x, np.asarray(self._data[self._y]), 2, kwargs)
 
         _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs, fit='quadratic', a=p[0], b=p[1], c=p[2])
 
-        X = [x + _x_shift for x in self._data[self._x]]
-        Y = [y + _y_shift for y in yf]
+        with self._stage('transform'):
+            X = self._shifted(x, _x_shift)
+            Y = PolyVal([p[0], p[1], p[2] + _y_shift], x)
 
-        plt.plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
-        if _errorbars:
-            self._add_errorbars(X, Y)
+        with self._stage('artists'):
+            self._axes().plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
+            if _errorbars:
+                self._add_errorbars(X, Y)
+        return p, cov
 
     def add_exponential_fit(self, *args, **kwargs):
+        kwargs = self._resolve_style(kwargs)
 
         if args:
             self._manage_working_data_args(args) 
 
-        for y in self._data[self._y]:
-            if y <= 0:
-                raise NegativeLog
+        x = np.asarray(self._data[self._x])
+        y = np.asarray(self._data[self._y])
+        if np.any(y <= 0):
+            raise NegativeLog
 
         # manage kwargs
-        p = np.polyfit(self._data[self._x], np.log(self._data[self._y]), 1)
+        p, cov = self._fit(x, np.log(y), 1, kwargs, y)
 
-        yf = np.array([np.exp(p[1]) * np.exp(p[0]*x) for x in self._data[self._x]])
-        
         _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs, fit='exponential', k=np.exp(p[1]), gamma = p[0])
 
-        X = [x + _x_shift for x in self._data[self._x]]
-        Y = [y + _y_shift for y in yf]
+        with self._stage('transform'):
+            X = self._shifted(x, _x_shift)
+            Y = np.multiply(x, p[0], dtype=np.float64)
+            np.exp(Y, out=Y)
+            Y *= np.exp(p[1])
+            Y += _y_shift
+
+        with self._stage('artists'):
+            lines = self._axes().plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
+            if _errorbars:
+                self._add_errorbars(X, Y)
+        if self._manage_live(kwargs):
+            fitter = OnlineLinearFit().update(x, np.log(y))
+            self._add_live(lines[0], 'exponential', _x_shift, _y_shift, fitter, self._manage_refit_every(kwargs))
+        return p, cov
+
+    def add_curve_fit(self, model, *args, loss='linear', **kwargs):
+        # model: name in CurveFit.MODELS ('exponential', 'power', 'gaussian', 'sigmoid') or a CurveFit.Model
+        # loss: 'linear', 'huber' or 'ransac'
+        # Refits with the same model and loss on the same working columns start from the previous parameters.
+        kwargs = self._resolve_style(kwargs)
+        if kwargs.get('live'):
+            raise BadParameter('"live" is not supported by add_curve_fit')
+        if isinstance(model, str) and not model in MODELS:
+            raise BadParameter('unknown model "{0}", use one of {1}'.format(model, list(MODELS)))
+
+        if args:
+            self._manage_working_data_args(args)
+
+        x = np.asarray(self._data[self._x])
+        y = np.asarray(self._data[self._y])
+        sigma = None
+        if 'weighted' in kwargs:
+            if not isinstance(kwargs['weighted'], bool):
+                raise BadParameter
+            if kwargs['weighted']:
+                if self._y_error is None:
+                    raise NonExistingData('weighted curve fits need a y error column, see set_working_error_data')
+                sigma = np.asarray(self._data[self._y_error])
+
+        key = (model if isinstance(model, str) else model.name, loss, self._x, self._y)
+        fitter = self._curve_fitters.get(key)
+        if fitter is None:
+            try:
+                fitter = CurveFitter(model, loss)
+            except ValueError as e:
+                raise BadParameter(str(e)) from None
+            self._curve_fitters[key] = fitter
+        with self._stage('fit'):
+            Y, p, cov = fitter.fit(x, y, sigma)
+
+        _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs, fit='curve', model=fitter.model, p=p)
+
+        with self._stage('transform'):
+            X = self._shifted(x, _x_shift)
+            Y += _y_shift
+
+        with self._stage('artists'):
+            self._axes().plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
+            if _errorbars:
+                self._add_errorbars(X, Y)
+        return p, cov
+
+    def add_rolling_fit(self, window, *args, step=1, n=1, **kwargs):
+        # Polynomial fits of degree n over sliding windows of `window` samples,
+        # one every `step` samples (see EasyStats.RollingFit), drawn as one line
+        # through the value of every local fit at the centre of its window.
+        # Returns the first sample of every window and the EasyStats.LocalPoly.
+        kwargs = self._resolve_style(kwargs)
+        for k in ('errorbars', 'weighted', 'live'):
+            if kwargs.get(k):
+                raise BadParameter('"{0}" is not supported by add_rolling_fit'.format(k))
+
+        if args:
+            self._manage_working_data_args(args)
+
+        x = np.asarray(self._data[self._x])
+        with self._stage('fit'):
+            try:
+                start, poly = RollingFit(x, np.asarray(self._data[self._y]), window, step, n)
+            except ValueError as e:
+                raise BadParameter(str(e)) from None
+
+        _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs, fit='rolling', window=window, n=n)
+
+        with self._stage('transform'):
+            centre = (x[start] + x[start + window - 1]) / 2
+            Y = poly(centre)
+            Y += _y_shift
+            X = self._shifted(centre, _x_shift)
+
+        with self._stage('artists'):
+            self._axes().plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
+        return start, poly
+
+    def add_segmented_fit(self, breakpoints, *args, n=1, **kwargs):
+        # Independent polynomial fits of degree n between the breakpoints (x
+        # values, the x data must be sorted, see EasyStats.SegmentedFit), drawn as
+        # one line broken at every breakpoint. Returns the EasyStats.LocalPoly.
+        kwargs = self._resolve_style(kwargs)
+        for k in ('weighted', 'live'):
+            if kwargs.get(k):
+                raise BadParameter('"{0}" is not supported by add_segmented_fit'.format(k))
+
+        if args:
+            self._manage_working_data_args(args)
+
+        x = np.asarray(self._data[self._x])
+        with self._stage('fit'):
+            try:
+                Y, poly = SegmentedFit(x, np.asarray(self._data[self._y]), breakpoints, n)
+            except ValueError as e:
+                raise BadParameter(str(e)) from None
+
+        _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs, fit='segmented', pieces=len(poly), n=n)
+
+        with self._stage('transform'):
+            X = self._shifted(x, _x_shift)
+            Y += _y_shift
+            # a NaN at every breakpoint keeps the pieces from being joined
+            breaks = np.searchsorted(x, breakpoints)
+            X_broken = np.insert(np.asarray(X, dtype=np.float64), breaks, np.nan)
+            Y_broken = np.insert(Y, breaks, np.nan)
+
+        with self._stage('artists'):
+            self._axes().plot(X_broken, Y_broken, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
+            if _errorbars:
+                self._add_errorbars(X, Y)
+        return poly
+
+    def add_series_batch(self, series, style=None, colours=None, **kwargs):
+        # Draws many line series as one LineCollection, a single artist instead
+        # of one per add_plot call.
+        # series: [(x, y), ...] where x and y are column names/indices or lists/arrays of numbers
+        # colours: one colour per series (all in the style's colour by default)
+        # style/kwargs: options as for add_plot; markers, errorbars, decimate, density and live do not apply
+        if style is not None:
+            kwargs['style'] = style
+        kwargs = self._resolve_style(kwargs)
+        for k in ('errorbars', 'decimate', 'density', 'live', 'weighted'):
+            if kwargs.get(k):
+                raise BadParameter('"{0}" is not supported by add_series_batch'.format(k))
+        series = list(series)
+        if colours is not None:
+            colours = list(colours)
+            if len(colours) != len(series) or not all(isinstance(c, str) and c in _COLOUR_SET for c in colours):
+                raise BadParameter('colours needs one supported colour per series')
 
-        plt.plot(X, Y, label=_finallegend, color=_colour, marker=_marker, linestyle=_linestyle)
-        if _errorbars:
-            self._add_errorbars(X, Y)
+        _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs)
+
+        with self._stage('load'):
+            # the file columns of all series are read together, one read per file
+            pairs = [tuple(self._batch_column(c) for c in pair) for pair in series]
+            self._data.load([c for pair in pairs for c in pair if isinstance(c, int)])
+            pairs = [tuple(np.asarray(self._data[c]) if isinstance(c, int) else c for c in pair) for pair in pairs]
+
+        with self._stage('transform'):
+            segments = []
+            for x, y in pairs:
+                n = min(len(x), len(y))
+                segments.append(np.column_stack((self._shifted(x[:n], _x_shift), self._shifted(y[:n], _y_shift))))
+
+        with self._stage('artists'):
+            from matplotlib.collections import LineCollection
+            collection = LineCollection(segments, colors=_colour if colours is None else colours, linestyles=[_linestyle], label=_finallegend)
+            ax = self._axes()
+            ax.add_collection(collection)
+            ax.autoscale_view()
+
+    def _batch_column(self, column):
+        # index of a column of the table, or the values of a list/array
+        if isinstance(column, (list, np.ndarray)):
+            return self._as_column(column, required=True)
+        i = self._get_column_input(column)
+        if i >= len(self._data):
+            raise NonExistingData
+        return i
+
+    def append(self, column, values):
+        # appends values to a column; live series drawing it are updated on the next refresh()
+        i = self._get_column_input(column)
+        with self._stage('load'):
+            self._data.load([i])
+            self._data.extend_column(i, values)
+
+    def set_live_rate(self, max_fps):
+        # refresh() redraws at most max_fps times per second
+        if not self._is_number(max_fps) or max_fps <= 0:
+            raise BadParameter
+        self._live_interval = 1 / max_fps
+
+    def refresh(self, force=False):
+        # Redraws the live series. Only their artists are redrawn, blitted over a
+        # cached background, unless new data falls outside the current view (then
+        # the axes are rescaled and the figure drawn once). Calls closer together
+        # than the live rate are skipped unless force is True.
+        now = time.monotonic()
+        if not self._live or (not force and now - self._last_refresh < self._live_interval):
+            return False
+        self._last_refresh = now
+
+        ax = self._axes()
+        canvas = ax.figure.canvas
+        rescale = self._background is None
+        with self._stage('transform'):
+            for live in self._live:
+                x = np.asarray(self._data[live['x']])
+                y = np.asarray(self._data[live['y']])
+                n = min(len(x), len(y))
+                if live['fitter'] is not None:
+                    X, Y = self._refit_live(live, x, y, n)
+                else:
+                    # decimated again over the whole series, like add_plot/add_scatter did
+                    idx = self._decimate(live['decimate'], x[:n], y[:n])
+                    X = self._shifted(self._take(x[:n], idx), live['x_shift'])
+                    Y = self._shifted(self._take(y[:n], idx), live['y_shift'])
+                    if live['kind'] == 'scatter':
+                        live['artist'].set_offsets(np.column_stack([X, Y]))
+                    else:
+                        live['artist'].set_data(X, Y)
+                    # the view only has to grow for the new samples
+                    X = self._shifted(x[live['drawn']:n], live['x_shift'])
+                    Y = self._shifted(y[live['drawn']:n], live['y_shift'])
+                    live['drawn'] = n
+                if not rescale and len(X) and self._out_of_view(ax, X, Y):
+                    rescale = True
+
+        with self._stage('render'):
+            if rescale:
+                ax.relim()
+                for live in self._live:
+                    if live['kind'] == 'scatter':
+                        ax.update_datalim(live['artist'].get_offsets())
+                ax.autoscale_view()
+                canvas.draw()
+                self._background = canvas.copy_from_bbox(ax.bbox)
+            canvas.restore_region(self._background)
+            for live in self._live:
+                ax.draw_artist(live['artist'])
+            canvas.blit(ax.bbox)
+            canvas.flush_events()
+        return True
+
+    def stream(self, source, columns, max_fps=None):
+        # source yields one chunk of values per column in columns, e.g. (x_values, y_values)
+        if max_fps is not None:
+            self.set_live_rate(max_fps)
+        for chunk in source:
+            for column, values in zip(columns, chunk):
+                self.append(column, values)
+            self.refresh()
+        self.refresh(force=True)
+
+    async def astream(self, source, columns, max_fps=None):
+        # like stream, for an asynchronous iterator
+        if max_fps is not None:
+            self.set_live_rate(max_fps)
+        async for chunk in source:
+            for column, values in zip(columns, chunk):
+                self.append(column, values)
+            self.refresh()
+        self.refresh(force=True)
+
+    def stop_live(self):
+        # turns the live series back into regular artists
+        for live in self._live:
+            live['artist'].set_animated(False)
+        self._live = []
+        self._background = None
+
+    def set_timing(self, enabled=True, callback=None):
+        # Opt-in profiling: time spent in the 'load', 'fit', 'transform',
+        # 'artists' (creating the matplotlib artists) and 'render' (drawing the
+        # figure in save and refresh) stages is accumulated per stage (see
+        # timings) and passed to callback(stage, seconds) after every timed
+        # step. Off by default.
+        self._timings = {} if enabled else None
+        self._timing_callback = callback if enabled else None
+
+    def timings(self, reset=False):
+        # {stage : (calls, total seconds)} since timing was enabled or last reset
+        if self._timings is None:
+            return {}
+        timings = dict(self._timings)
+        if reset:
+            self._timings.clear()
+        return timings
 
     def add_marker(self, x_pos, y_pos, **kwargs):
         # to date only args supported is style (shape)
-        _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(kwargs, scatter=True)
+        _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle = self._manage_kwargs(self._resolve_style(kwargs), scatter=True)
         
         x = x_pos + _x_shift
         y = y_pos + _y_shift
 
-        plt.scatter(x, y, marker=_marker, label=_finallegend, color=_colour, s=_s)
+        self._axes().scatter(x, y, marker=_marker, label=_finallegend, color=_colour, s=_s)
 
     def set_title(self, title):
         if not isinstance(title, str):
             raise BadParameter
-        plt.title(title)
+        self._axes().set_title(title)
 
     def set_labels(self, x_label, y_label):
         if not (isinstance(x_label, str) and isinstance(x_label, str)):
             raise BadParameter
         
-        plt.xlabel(x_label)
-        plt.ylabel(y_label)
-
-    def _add_errorbars(self, X, Y):
-        XError = self._data[self._x_error]
-        YError = self._data[self._y_error]
-        plt.errorbar(X, Y, XError, YError, ecolor=self._errorbar_options['ecolor'], elinewidth=self._errorbar_options['elinewidth'],
+        self._axes().set_xlabel(x_label)
+        self._axes().set_ylabel(y_label)
+
+    def _add_errorbars(self, X, Y, idx=None, errors=None, **kwargs):
+        # errors: (x errors, y errors) instead of the working error columns
+        if errors is None:
+            XError = self._take(self._data[self._x_error], idx)
+            YError = self._take(self._data[self._y_error], idx)
+        else:
+            XError, YError = errors
+        self._axes().errorbar(X, Y, XError, YError, ecolor=self._errorbar_options['ecolor'], elinewidth=self._errorbar_options['elinewidth'],
             capsize=self._errorbar_options['capsize'], barsabove=self._errorbar_options['barsabove'], lolims=self._errorbar_options['lolims'],
             uplims=self._errorbar_options['uplims'], xlolims=self._errorbar_options['xlolims'], xuplims=self._errorbar_options['xuplims'],
-            errorevery=self._errorbar_options['errorevery'], capthick=self._errorbar_options['capthick'])
+            errorevery=self._errorbar_options['errorevery'], capthick=self._errorbar_options['capthick'], **kwargs)
+
+    def _add_density(self, mode, bins, cmap, label, x_shift, y_shift, errorbars):
+        # Draws the point density of the working data as one artist: an image
+        # for mode 'hist', one collection of hexagons for 'hex'. Empty bins stay
+        # transparent and the colours are on a log scale. With errorbars every
+        # occupied bin gets one errorbar at the mean of its points, with the
+        # error of that mean.
+        errors = (self._data[self._x_error], self._data[self._y_error]) if errorbars else None
+        with self._stage('transform'):
+            grid = _density_grid(self._data[self._x], self._data[self._y], bins, mode == 'hex', errors, _DENSITY_CHUNK)
+
+        from matplotlib.colors import LogNorm
+        counts = grid['counts']
+        norm = LogNorm(vmin=1, vmax=max(counts.max(), 1))
+        x_low, x_high, y_low, y_high = grid['extent']
+        with self._stage('artists'):
+            ax = self._axes()
+            if mode == 'hist':
+                image = np.ma.masked_equal(counts.reshape(bins[1], bins[0]), 0)
+                image = ax.imshow(image, origin='lower', extent=(x_low + x_shift, x_high + x_shift, y_low + y_shift, y_high + y_shift),
+                                  aspect='auto', interpolation='nearest', cmap=cmap, norm=norm, label=label)
+                if not label.startswith('_'):
+                    # legends have no entry for images, an empty patch in the colour map stands in for it
+                    from matplotlib.patches import Rectangle
+                    ax.add_patch(Rectangle((x_low + x_shift, y_low + y_shift), 0, 0, facecolor=image.cmap(0.5), edgecolor='none', label=label))
+            else:
+                from matplotlib.collections import PolyCollection
+                occupied = counts > 0
+                centres = grid['centres'][occupied] + (x_shift, y_shift)
+                sx, sy = grid['spacing']
+                hexagon = np.array([[0.5, -0.5], [0.5, 0.5], [0, 1], [-0.5, 0.5], [-0.5, -0.5], [0, -1]]) * (sx, sy / 3)
+                collection = PolyCollection([hexagon], offsets=centres, offset_transform=ax.transData, cmap=cmap, norm=norm, edgecolors='face', label=label)
+                collection.set_array(counts[occupied])
+                ax.add_collection(collection)
+                ax.update_datalim(centres)
+                ax.autoscale_view()
+            if errorbars:
+                occupied = counts > 0
+                self._add_errorbars(grid['x_mean'][occupied] + x_shift, grid['y_mean'][occupied] + y_shift,
+                                    errors=(grid['x_error'][occupied], grid['y_error'][occupied]), fmt='none')
+
+    def _manage_density(self, kwargs):
+        if not 'density' in kwargs or kwargs['density'] is False or kwargs['density'] is None:
+            return None
+        mode = kwargs['density']
+        if mode is True:
+            mode = 'hist'
+        if not mode in _DENSITY_MODES:
+            raise BadParameter
+        if 'decimate' in kwargs and kwargs['decimate']:
+            raise BadParameter('density and decimate cannot be combined')
+        return mode
+
+    def _manage_bins(self, kwargs, mode):
+        # (bins along x, bins along y); for hexagons the y count follows from the x count
+        bins = kwargs.get('bins', 256 if mode == 'hist' else 100)
+        if self._is_number(bins) and not isinstance(bins, bool) and int(bins) == bins and bins >= 1:
+            bins = (int(bins), int(bins))
+        elif isinstance(bins, (tuple, list)) and len(bins) == 2 and mode == 'hist' and all(isinstance(b, int) and b >= 1 for b in bins):
+            bins = tuple(bins)
+        else:
+            raise BadParameter
+        if mode == 'hex':
+            bins = (bins[0], max(int(bins[0] / np.sqrt(3)), 1))
+        if 'cmap' in kwargs and not isinstance(kwargs['cmap'], str):
+            raise BadParameter
+        return bins
 
     def _manage_kwargs(self, kwargs, **nkwargs):
-        _autoaxis = False
-        _autolegend = None
+        # the per call part of the options: legend, axis labels and scatter defaults
+        style = kwargs if isinstance(kwargs, PlotStyle) else self._resolve_style(kwargs)
         _finallegend = '_nolegend_' # internal. gets updated with legend, autolegend or customlegend (for fits)
-        _colour = DEFAULT_COLORS[0]
-        _x_shift = 0
-        _y_shift = 0
-        _errorbars = False
-        _marker = None
-        _s = rcParams['lines.markersize'] ** 2
-        _linestyle = 'solid'
-
-        for k in kwargs:
-            if not (k in _PLOT_KWARGS or k in _SCATTER_KWARGS):
-                log.warning('In "plotting": The passed key "{0}" is not valid'.format(k))
-
-        if 'autoaxis' in kwargs:
-            if not isinstance(kwargs['autoaxis'], bool):
-                raise BadParameter
-            if kwargs['autoaxis']:
-                _autoaxis = True
-                plt.xlabel(self._working_headers[0])
-                plt.ylabel(self._working_headers[1])
+
+        if style.autoaxis:
+            self._axes().set_xlabel(self._working_headers[0])
+            self._axes().set_ylabel(self._working_headers[1])
 
         _addLegend = False
-        if 'legend' in kwargs:
-                if not isinstance(kwargs['legend'], str):
-                    raise BadParameter
-                _finallegend = kwargs['legend']
+        if style.legend is not None:
+                _finallegend = style.legend
                 _addLegend = True
         elif 'fit' in nkwargs:
             if nkwargs['fit'] == 'linear':
@@ -297,21 +820,22 @@ class Graphing2D:
                 _finallegend = 'Quadratic Fit: a = {0}, b = {1}, c = {2}\n'.format(round(nkwargs['a'], 2), round(nkwargs['b'], 2), round(nkwargs['c'], 2))
             elif nkwargs['fit'] == 'exponential':
                 _finallegend = 'Exponential Fit: k = {0}, '.format(round(nkwargs['k'], 2)) + r'$\gamma$' + ' = {0}\n'.format(round(nkwargs['gamma'], 2))
+            elif nkwargs['fit'] == 'rolling':
+                _finallegend = 'Rolling Fit: window = {0}, n = {1}\n'.format(nkwargs['window'], nkwargs['n'])
+            elif nkwargs['fit'] == 'segmented':
+                _finallegend = 'Segmented Fit: {0} pieces, n = {1}\n'.format(nkwargs['pieces'], nkwargs['n'])
+            elif nkwargs['fit'] == 'curve':
+                _model = nkwargs['model']
+                _finallegend = '{0} Fit: '.format(_model.name.capitalize()) + ', '.join('{0} = {1}'.format(name, round(v, 2)) for name, v in zip(_model.parameters, nkwargs['p'])) + '\n'
             else:
                 raise InternalError
-            if 'customlegend' in kwargs:
-                if not isinstance(kwargs['customlegend'], str):
-                    raise BadParameter
-                _finallegend += kwargs['customlegend']
+            if style.customlegend is not None:
+                _finallegend += style.customlegend
                 _addLegend = True
-            elif 'autolegend' in kwargs:
-                if not isinstance(kwargs['autolegend'], bool):
-                    raise BadParameter
+            elif style.autolegend is not None:
                 _finallegend += self._working_headers[1]
                 _addLegend = True
-        elif 'autolegend' in kwargs:
-            if not isinstance(kwargs['autolegend'], bool):
-                raise BadParameter
+        elif style.autolegend is not None:
             _finallegend = self._working_headers[1]
             _addLegend = True
 
@@ -319,59 +843,180 @@ class Graphing2D:
             _finallegend = '_nolegend_'
         self._legends.append(_finallegend)     
 
-        if 'colour' in kwargs:
-            if not isinstance(kwargs['colour'], str):
-                raise BadParameter
-            if kwargs['colour'] in _COLOURS:
-                _colour = kwargs['colour']
-        elif 'color' in kwargs:
-            if not isinstance(kwargs['color'], str):
-                raise BadParameter
-            if kwargs['color'] in _COLOURS:
-                _colour = kwargs['color']
-
-        if 'x_shift' in kwargs:
-            if not self._is_number(kwargs['x_shift']):
-                raise BadParameter
-            _x_shift = kwargs['x_shift']
-        if 'y_shift' in kwargs:
-            if not self._is_number(kwargs['y_shift']):
+        _marker = style.marker
+        _s = None # marker size, only used by scatter plots
+        if 'scatter' in nkwargs:
+            if nkwargs['scatter']:
+                from matplotlib import rcParams
+                if _marker is None:
+                    _marker = rcParams['scatter.marker']
+                _s = rcParams['lines.markersize'] ** 2 if style.s is None else style.s
+
+        return _finallegend, style.colour, style.x_shift, style.y_shift, style.errorbars, _marker, _s, style.linestyle
+
+    def _resolve_style(self, kwargs):
+        # the PlotStyle of an add_* call: the one passed as style= (with the other
+        # keywords on top of it) or one built from the keywords
+        if not kwargs:
+            return _DEFAULT_STYLE
+        if not 'style' in kwargs:
+            return PlotStyle(**kwargs)
+        style = kwargs['style']
+        if not isinstance(style, PlotStyle):
+            raise BadParameter('style must be a PlotStyle')
+        if len(kwargs) == 1:
+            return style
+        options = dict(style.options)
+        options.update((k, v) for k, v in kwargs.items() if k != 'style')
+        return PlotStyle(**options)
+
+    def _fit(self, x, y, n, kwargs, y_linear=None):
+        with self._stage('fit'):
+            return self._solve_fit(x, y, n, kwargs, y_linear)
+
+    def _solve_fit(self, x, y, n, kwargs, y_linear=None):
+        # Polynomial fit of degree n, returns (coefficients, covariance). With
+        # weighted=True the working error columns are used: 1/y_error^2 weights,
+        # and orthogonal distance regression when x errors are set too. The
+        # covariance is None for unweighted fits. y_linear is the data before a
+        # log transform, so its errors can be propagated (d log y = dy / y).
+        if not 'weighted' in kwargs or not kwargs['weighted']:
+            if 'weighted' in kwargs and not isinstance(kwargs['weighted'], bool):
                 raise BadParameter
-            _y_shift = kwargs['y_shift']
+            return PolyFit(x, y, n), None
+        if not isinstance(kwargs['weighted'], bool):
+            raise BadParameter
+        if self._y_error is None and self._x_error is None:
+            raise NonExistingData('weighted fits need error columns, see set_working_error_data')
+        y_error = None if self._y_error is None else np.asarray(self._data[self._y_error])
+        x_error = None if self._x_error is None else np.asarray(self._data[self._x_error])
+        if y_linear is not None and y_error is not None:
+            y_error = y_error / y_linear
+        _, p, cov = WeightedNRankFit(x, y, n, y_error, x_error)
+        return p, cov
+
+    def _stage(self, name):
+        if self._timings is None:
+            return _NO_TIMING
+        return _StageTimer(self, name)
+
+    def _manage_live(self, kwargs):
+        if not 'live' in kwargs:
+            return False
+        if not isinstance(kwargs['live'], bool):
+            raise BadParameter
+        return kwargs['live']
 
-        if 'errorbars' in kwargs:
-            if not isinstance(kwargs['errorbars'], bool):
-                raise BadParameter
-            if kwargs['errorbars']:
-                _errorbars = True
+    def _manage_refit_every(self, kwargs):
+        # number of appended samples between two refits of a live fit
+        if not 'refit_every' in kwargs:
+            return 1
+        if not isinstance(kwargs['refit_every'], int) or kwargs['refit_every'] < 1:
+            raise BadParameter
+        return kwargs['refit_every']
+
+    def _add_live(self, artist, kind, x_shift, y_shift, fitter=None, refit_every=None, decimate=None):
+        # animated artists are left out of full redraws and blitted by refresh()
+        artist.set_animated(True)
+        n = min(len(self._data[self._x]), len(self._data[self._y]))
+        x = np.asarray(self._data[self._x][:n])
+        self._live.append({
+            'artist' : artist,
+            'kind' : kind,
+            'x' : self._x,
+            'y' : self._y,
+            'x_shift' : x_shift,
+            'y_shift' : y_shift,
+            'fitter' : fitter,
+            'refit_every' : refit_every,
+            'decimate' : decimate,
+            'drawn' : n,
+            'pending' : 0,
+            'x_min' : x.min() if n else np.inf,
+            'x_max' : x.max() if n else -np.inf
+        })
+        self._background = None
+
+    def _refit_live(self, live, x, y, n):
+        # feeds the samples appended since the last refresh to the incremental
+        # fitter and redraws the fit every refit_every samples
+        if n > live['drawn']:
+            xs = x[live['drawn']:n]
+            ys = y[live['drawn']:n]
+            if live['kind'] == 'exponential':
+                if np.any(ys <= 0):
+                    raise NegativeLog
+                ys = np.log(ys)
+            live['fitter'].update(xs, ys)
+            live['x_min'] = min(live['x_min'], xs.min())
+            live['x_max'] = max(live['x_max'], xs.max())
+            live['pending'] += n - live['drawn']
+            live['drawn'] = n
+        if live['pending'] < live['refit_every'] or live['fitter'].n < 2:
+            return (), ()
+        live['pending'] = 0
+
+        m, b = live['fitter'].result()[0]
+        if live['kind'] == 'linear':
+            x_fit = np.array([live['x_min'], live['x_max']])
+            Y = PolyVal([m, b + live['y_shift']], x_fit)
+        else:
+            x_fit = np.linspace(live['x_min'], live['x_max'], 256)
+            Y = np.exp(b) * np.exp(m*x_fit) + live['y_shift']
+        X = self._shifted(x_fit, live['x_shift'])
+        live['artist'].set_data(X, Y)
+        return X, Y
 
-        if 'scatter' in nkwargs:
-            if nkwargs['scatter']:
-                _marker = rcParams['scatter.marker']
-                if 's' in kwargs:
-                    if not self._is_number(kwargs['s']):
-                        raise BadParameter
-                    _s = kwargs['s']
-
-        if 'marker' in kwargs:
-                    if not (isinstance(kwargs['marker'], str) or isinstance(kwargs['marker'], int)):
-                        raise BadParameter
-                    if isinstance(kwargs['marker'], str):
-                        if kwargs['marker'] in _MARKER_STYLES or (kwargs['marker'].startswith('$') and kwargs['marker'].endswith('$')):
-                            _marker = kwargs['marker']
-                    elif kwargs['marker'] in _MARKER_STYLES:
-                        _marker = kwargs['marker']
-                    if not kwargs['marker'] in _MARKER_STYLES or (kwargs['marker'].startswith('$') and kwargs['marker'].endswith('$')):
-                        log.warning('Not supported marker!')
-
-        if 'linestyle' in kwargs:
-            if not kwargs['linestyle'] in _LINE_STYLES:
-                log.warning('Not supported linestyle!')
-            else:
-                _linestyle = kwargs['linestyle']
+    @staticmethod
+    def _out_of_view(ax, X, Y):
+        x_low, x_high = sorted(ax.get_xlim())
+        y_low, y_high = sorted(ax.get_ylim())
+        return np.min(X) < x_low or np.max(X) > x_high or np.min(Y) < y_low or np.max(Y) > y_high
+
+    def _manage_decimate(self, kwargs, scatter=False):
+        # returns the indices of the points to draw, or None to draw all of them
+        return self._decimate(self._decimate_mode(kwargs, scatter), self._data[self._x], self._data[self._y])
+
+    def _decimate_mode(self, kwargs, scatter=False):
+        if not 'decimate' in kwargs or kwargs['decimate'] is False or kwargs['decimate'] is None:
+            return None
+        mode = kwargs['decimate']
+        if mode is True:
+            mode = 'pixel' if scatter else 'minmax'
+        if not mode in (_SCATTER_DECIMATE_MODES if scatter else _DECIMATE_MODES):
+            raise BadParameter
+        return mode
+
+    def _decimate(self, mode, x, y):
+        # indices of the points of (x, y) to draw with the decimation mode, None for all of them
+        if mode is None:
+            return None
+        # about two points per horizontal pixel of the figure are enough to look identical
+        fig = self._axes().figure
+        n_out = 2 * int(fig.get_figwidth() * fig.dpi)
+        x = np.asarray(x)
+        y = np.asarray(y)
+        if len(y) <= n_out:
+            return None
+        if mode == 'pixel':
+            return _pixel_indices(x, y, int(fig.get_figwidth() * fig.dpi), int(fig.get_figheight() * fig.dpi))
+        if mode == 'lttb':
+            return _lttb_indices(x, y, n_out)
+        return _minmax_indices(y, n_out // 2)
 
+    @staticmethod
+    def _shifted(column, shift):
+        # the column itself (no copy) when there is nothing to shift
+        column = np.asarray(column)
+        if shift == 0:
+            return column
+        return column + shift
 
-        return _finallegend, _colour, _x_shift, _y_shift, _errorbars, _marker, _s, _linestyle
+    @staticmethod
+    def _take(column, idx):
+        if idx is None:
+            return column
+        return np.asarray(column)[idx]
 
     def _manage_working_data_args(self, args):
         if len(args) == 2:
@@ -389,32 +1034,137 @@ class Graphing2D:
 
     def _get_column_input(self, param):
         if isinstance(param, str):
-            return self._headers[param]
+            return self._data.index(param)
         elif isinstance(param, int):
             return param
         raise BadParameter
 
     @staticmethod
     def _is_number(val):
-        if isinstance(val, int) or isinstance(val, float) or isinstance(val, np.int64) or isinstance(val, np.float):
-            return True
-        return False
+        return isinstance(val, _NUMBER_TYPES)
 
-    def show(self):
+    @staticmethod
+    def _as_column(arg, required=False):
+        # Returns arg as a numeric ndarray, or None when it is not made of numbers.
+        # Numeric ndarrays are checked by dtype only and lists are converted in a
+        # single np.array call, so no Python work is done per element. Object
+        # arrays are only accepted when they convert to float64 as a whole.
+        if isinstance(arg, np.ndarray):
+            if arg.dtype.kind == 'O':
+                column = Graphing2D._object_as_float(arg)
+                if column is not None:
+                    arg = column
+            if arg.dtype.kind in 'biuf':
+                if not arg.ndim in (1, 2):
+                    raise BadParameter('arrays of numbers must be 1-D or 2-D, got {0}-D'.format(arg.ndim))
+                return arg
+        elif len(arg) == 0:
+            return np.array(arg, dtype=np.float64)
+        elif Graphing2D._is_number(arg[0]):
+            try:
+                column = np.array(arg)
+            except ValueError:
+                raise BadParameter('list of numbers mixed with sequences') from None
+            if column.dtype.kind == 'O':
+                column = Graphing2D._object_as_float(column)
+            if column is None or column.dtype.kind not in 'biuf' or column.ndim != 1:
+                raise BadParameter('list of numbers mixed with non numeric values')
+            return column
+        if required:
+            raise BadParameter('expected a list or array of numbers')
+        return None
+
+    @staticmethod
+    def _object_as_float(column):
+        # object array holding numbers (None becomes NaN) as float64, None if it holds anything else
+        if any(isinstance(e, (str, bytes)) for e in column.flat):
+            return None
+        try:
+            return np.asarray(column, dtype=np.float64)
+        except (TypeError, ValueError):
+            return None
+
+    def _axes(self):
+        if not self._headless:
+            import matplotlib.pyplot as plt
+            return plt.gca()
+        if self._ax is None:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self._fig = Figure()
+            FigureCanvasAgg(self._fig)
+            self._ax = self._fig.add_subplot()
+        return self._ax
+
+    def _draw_legend(self):
         _show_legends = False
         for l in self._legends:
             if l != '_nolegend_':
                 _show_legends = True
                 break
         if _show_legends:
-            plt.legend()
-        plt.show()
+            self._axes().legend()
+
+    def show(self, block=None):
+        # block=False returns right away so live series can keep streaming
+        if self._headless:
+            log.warning('In "show": headless plots can only be saved')
+            return
+        import matplotlib.pyplot as plt
+        self._draw_legend()
+        if block is False:
+            plt.show(block=False)
+            self._background = None
+            self.refresh(force=True)
+        else:
+            # nothing can update the live series while the window blocks
+            self.stop_live()
+            plt.show()
+
+    def save(self, path, format=None, **kwargs):
+        # kwargs are passed on to Figure.savefig (dpi, bbox_inches, ...)
+        self._draw_legend()
+        # full draws leave out animated (live) artists
+        for live in self._live:
+            live['artist'].set_animated(False)
+        try:
+            with self._stage('render'):
+                self._axes().figure.savefig(path, format=format, **kwargs)
+        finally:
+            for live in self._live:
+                live['artist'].set_animated(True)
+            self._background = None
+        return path
+
+    @staticmethod
+    def render_batch(specs, out_dir, format='png', workers=1):
+        # Renders many plots to out_dir and returns the written paths in order.
+        # Every spec is a dict:
+        #   {'name' : file name without extension,
+        #    'data' : [arguments for add_data],
+        #    'calls' : [(method name, args, kwargs), ...]}
+        # e.g. {'name' : 'run1', 'data' : ['run1.csv'], 'calls' : [('add_plot', ('t', 'v'), {'autolegend' : True})]}
+        # Each worker process keeps a single Agg figure that is cleared and reused for all its specs.
+        specs = list(specs)
+        os.makedirs(out_dir, exist_ok=True)
+        workers = max(1, min(workers, len(specs)))
+        if workers == 1:
+            return _render_shard((specs, out_dir, format))
+
+        from concurrent.futures import ProcessPoolExecutor
+        size = -(-len(specs) // (workers * 4))
+        shards = [(specs[i:i+size], out_dir, format) for i in range(0, len(specs), size)]
+        paths = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for shard_paths in pool.map(_render_shard, shards):
+                paths.extend(shard_paths)
+        return paths
 
     @staticmethod
     def help():
         s = 'This library simplifies the graphic representations of datasets that can be python lists or excel-like files.'
         s += 'When calling Graphing2D for the first time you have two options: either\n'
-        s += '\t- pass a string with the file path to a .csv/.tsv/.xlsx file\n'
+        s += '\t- pass a string with the file path to a .csv/.tsv/.xlsx file (or .npy/.npz/.feather/.parquet)\n'
         s += '\t- pass all the lists of (numerical) values\n\n'
         s += 'Although you can load multiple data "axis" only 2 (4 projected) can be active at the same time as "x" and "y".\n'
         s += 'This can be set with the "set_working_data()" method.\n\n'
@@ -427,8 +1177,203 @@ class Graphing2D:
         s += '\t- colour/color=str -> draws the plot with the specified colour (for more info visit matplotlibs documentation)\n'
         s += '\t- x_shift=float -> shifts the plot by the input in the "x" axis\n'
         s += '\t- y_shift=float -> like x_shift but in the "y" axis\n'
+        s += '\t- style=PlotStyle -> options checked once and shared by many calls, e.g. style = PlotStyle(colour="red", linestyle="--")\n'
+        s += '\t- decimate=bool/str -> (add_plot) draws only ~2 points per pixel using "minmax" (default) or "lttb" reduction; (add_scatter) one point per occupied pixel ("pixel")\n'
+        s += '\t- density=bool/str -> (add_scatter) draws the point density as one image, on a "hist" (default) or "hex" grid, for plots with too many points to draw one by one\n'
+        s += '\t- bins=int/(int, int) -> (density) number of bins along x (and y)\n'
+        s += '\t- weighted=bool -> (fits) weights the fit with the working error columns (orthogonal distance regression if x errors are set); the fits return (coefficients, covariance)\n'
+        s += '\t- step=int, n=int -> (add_rolling_fit) samples between windows and degree of the local fits; add_segmented_fit also takes n\n'
+        s += '\t- loss=str -> (add_curve_fit) "linear", "huber" or "ransac"; the robust losses ignore outliers\n'
+        s += '\t- live=bool -> keeps the drawn series updated as values are appended with "append()"/"stream()" and redrawn with "refresh()"\n'
+        s += '\t- refit_every=int -> (live fits) number of appended samples between two refits\n\n'
+        s += 'Graphing2D(..., timing=True) or "set_timing()" records the time spent loading, fitting, transforming, creating artists and rendering, see "timings()".\n'
         print(s)
 
+class _StageTimer:
+    __slots__ = ('_graph', '_name', '_start')
+
+    def __init__(self, graph, name):
+        self._graph = graph
+        self._name = name
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        graph = self._graph
+        calls, total = graph._timings.get(self._name, (0, 0.0))
+        graph._timings[self._name] = (calls + 1, total + seconds)
+        if graph._timing_callback is not None:
+            graph._timing_callback(self._name, seconds)
+        return False
+
+def _render_shard(args):
+    specs, out_dir, format = args
+    g = None
+    paths = []
+    for spec in specs:
+        if g is None:
+            g = Graphing2D(*spec.get('data', []), headless=True)
+        else:
+            # keep the figure, canvas and axes of the previous plot
+            fig, ax = g._fig, g._ax
+            ax.clear()
+            g = Graphing2D(*spec.get('data', []), headless=True)
+            g._fig, g._ax = fig, ax
+        for call in spec.get('calls', []):
+            method = call[0]
+            args = call[1] if len(call) > 1 else ()
+            kwargs = call[2] if len(call) > 2 else {}
+            getattr(g, method)(*args, **kwargs)
+        paths.append(g.save(os.path.join(out_dir, '{0}.{1}'.format(spec['name'], format)), format=format))
+    return paths
+
+def _density_grid(x, y, bins, hexagonal=False, errors=None, chunk=2**20):
+    # Bins the points (x, y) on a regular grid of bins = (nx, ny) cells over
+    # their range, or on a hexagonal grid (two interleaved lattices, like
+    # matplotlib's hexbin). The columns are processed chunk rows at a time and
+    # counted with np.bincount, so memory-mapped columns are never loaded whole.
+    # Non finite points are skipped. Returns a dict with 'counts' (flat, row
+    # major for the regular grid), 'extent', and for hexagons 'centres' and
+    # 'spacing'. With errors = (x errors, y errors) also the per bin mean
+    # position ('x_mean', 'y_mean') and error of the mean ('x_error',
+    # 'y_error'), sqrt(sum of variances) / count.
+    n = min(len(x), len(y))
+    x_low = y_low = np.inf
+    x_high = y_high = -np.inf
+    for start in range(0, n, chunk):
+        xs, ys, _ = _finite_chunk(x, y, start, start + chunk)
+        if len(xs):
+            x_low, x_high = min(x_low, xs.min()), max(x_high, xs.max())
+            y_low, y_high = min(y_low, ys.min()), max(y_high, ys.max())
+    if x_low > x_high:
+        x_low = x_high = y_low = y_high = 0.0
+    # degenerate ranges get a unit width so every point falls into a bin
+    if x_high == x_low:
+        x_low, x_high = x_low - 0.5, x_high + 0.5
+    if y_high == y_low:
+        y_low, y_high = y_low - 0.5, y_high + 0.5
+
+    nx, ny = bins
+    sx = (x_high - x_low) / nx
+    sy = (y_high - y_low) / ny
+    size = (nx + 1) * (ny + 1) + nx * ny if hexagonal else nx * ny
+    counts = np.zeros(size, dtype=np.int64)
+    if errors is not None:
+        sums = np.zeros((4, size))
+
+    for start in range(0, n, chunk):
+        xs, ys, finite = _finite_chunk(x, y, start, start + chunk)
+        u = (xs - x_low) / sx
+        v = (ys - y_low) / sy
+        if hexagonal:
+            # nearest centre out of the lattice on the grid points and the one on the cell centres
+            i1 = np.rint(u).astype(np.intp)
+            j1 = np.rint(v).astype(np.intp)
+            i2 = np.minimum(np.floor(u).astype(np.intp), nx - 1)
+            j2 = np.minimum(np.floor(v).astype(np.intp), ny - 1)
+            first = (u - i1)**2 + 3*(v - j1)**2 < (u - i2 - 0.5)**2 + 3*(v - j2 - 0.5)**2
+            index = np.where(first, i1*(ny + 1) + j1, (nx + 1)*(ny + 1) + i2*ny + j2)
+        else:
+            i = np.minimum(u.astype(np.intp), nx - 1)
+            j = np.minimum(v.astype(np.intp), ny - 1)
+            index = j*nx + i
+        counts += np.bincount(index, minlength=size)
+        if errors is not None:
+            x_error = np.asarray(errors[0][start:start + chunk])[finite]
+            y_error = np.asarray(errors[1][start:start + chunk])[finite]
+            for row, weights in enumerate((xs, ys, x_error*x_error, y_error*y_error)):
+                sums[row] += np.bincount(index, weights=weights, minlength=size)
+
+    grid = {'counts' : counts, 'extent' : (x_low, x_high, y_low, y_high)}
+    if hexagonal:
+        i, j = np.meshgrid(np.arange(nx + 1), np.arange(ny + 1), indexing='ij')
+        k, l = np.meshgrid(np.arange(nx), np.arange(ny), indexing='ij')
+        grid['centres'] = np.concatenate([
+            np.column_stack([x_low + i.ravel()*sx, y_low + j.ravel()*sy]),
+            np.column_stack([x_low + (k.ravel() + 0.5)*sx, y_low + (l.ravel() + 0.5)*sy])])
+        grid['spacing'] = (sx, sy)
+    if errors is not None:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            grid['x_mean'] = sums[0] / counts
+            grid['y_mean'] = sums[1] / counts
+            grid['x_error'] = np.sqrt(sums[2]) / counts
+            grid['y_error'] = np.sqrt(sums[3]) / counts
+    return grid
+
+def _finite_chunk(x, y, start, stop):
+    # rows start:stop of x and y as arrays, without the points that are not finite
+    xs = np.asarray(x[start:stop], dtype=np.float64)
+    ys = np.asarray(y[start:stop], dtype=np.float64)
+    finite = np.isfinite(xs) & np.isfinite(ys)
+    if finite.all():
+        return xs, ys, slice(None)
+    return xs[finite], ys[finite], finite
+
+def _lttb_indices(x, y, n_out):
+    # Largest-Triangle-Three-Buckets (Steinarsson, 2013). The first and last
+    # points are kept, the rest is split into n_out - 2 buckets and from each one
+    # the point forming the largest triangle with the previously selected point
+    # and the average of the next bucket is kept.
+    n = len(y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    idx = np.empty(n_out, dtype=np.int64)
+    idx[0] = 0
+    idx[-1] = n - 1
+
+    # averages of every bucket, with the last point acting as the bucket after the last one
+    counts = np.diff(edges)
+    avg_x = np.append(np.add.reduceat(x[:edges[-1]], edges[:-1]) / counts, x[-1])
+    avg_y = np.append(np.add.reduceat(y[:edges[-1]], edges[:-1]) / counts, y[-1])
+
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        bx = x[start:stop]
+        by = y[start:stop]
+        area = np.abs((x[a] - avg_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        idx[i + 1] = a
+    return idx
+
+def _pixel_indices(x, y, nx, ny):
+    # keeps the first point of every occupied cell of an nx by ny grid over the
+    # range of the points (one cell per pixel of the figure), in their original
+    # order; points that are not finite are dropped, they are not drawn anyway
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    finite = np.isfinite(x) & np.isfinite(y)
+    kept = None if finite.all() else np.flatnonzero(finite)
+    if kept is not None:
+        x = x[kept]
+        y = y[kept]
+    if not len(x):
+        return np.zeros(0, dtype=np.intp)
+    cells = np.zeros(len(x), dtype=np.intp)
+    for values, n, stride in ((x, nx, 1), (y, ny, nx)):
+        low, high = values.min(), values.max()
+        if high > low:
+            cells += np.minimum(((values - low) * (n / (high - low))).astype(np.intp), n - 1) * stride
+    first = np.sort(np.unique(cells, return_index=True)[1])
+    return first if kept is None else kept[first]
+
+def _minmax_indices(y, n_buckets):
+    # keeps the minimum and the maximum of each of n_buckets equally sized index
+    # buckets (assumes x is sorted, as for time series), in their original order
+    n = len(y)
+    size = -(-n // n_buckets)
+    full = (n // size) * size
+    blocks = y[:full].reshape(-1, size)
+    offsets = np.arange(0, full, size)
+    idx = [np.argmin(blocks, axis=1) + offsets, np.argmax(blocks, axis=1) + offsets]
+    if full < n:
+        tail = y[full:]
+        idx[0] = np.append(idx[0], full + np.argmin(tail))
+        idx[1] = np.append(idx[1], full + np.argmax(tail))
+    idx = np.sort(np.stack(idx, axis=1), axis=1).ravel()
+    return np.unique(np.concatenate(([0], idx, [n - 1])))
+
 class BadParameter(Exception):
     # print('Bad parameter was given')
     pass
@@ -1,3 +1,10 @@
+import sys
+import json as _json
+import time
+import atexit
+import threading
+from collections import deque
+
 RESET = '\u001b[0m'
 
 FG_BLACK = '\u001b[30m'
@@ -22,24 +29,369 @@ BOLD = '\u001b[1m'
 UNDERLINE = '\u001b[4m'
 REVERSED = '\u001b[7m'
 
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+_LEVEL_NAMES = {INFO : 'INFO', WARNING : 'WARNING', ERROR : 'ERROR', None : 'PRINT'}
+
 class log:
-    @staticmethod
-    def info(message):
-        print(FG_GREEN + message + RESET)
+    # Messages may be passed as a str.format template plus its arguments, e.g.
+    # log.warning('The key "{0}" is not valid', key). Messages below the
+    # configured level are dropped before any formatting happens. Keyword
+    # arguments are kept as structured fields of the record.
+    _level = INFO
+    _sink = None
+    _writer = None
+    _limiter = None
+    # records at or above this level need their call site (JSON output or limiter)
+    _site_level = WARNING
+
+    @classmethod
+    def configure(cls, level=None, sink=None, asynchronous=None, flush_interval=0.1, batch_size=1024, colour=None,
+                  format=None, rate=None, burst=10, dedup=None, dedup_level=None, reset=False):
+        # reset: back to the defaults (INFO, synchronous, sys.stdout, text, 10 s
+        # dedup for WARNING and above) before the other options are applied
+        # level: INFO, WARNING or ERROR
+        # sink: stream or file path to write to (sys.stdout by default)
+        # asynchronous: write from a background thread, in batches at most flush_interval seconds apart
+        # colour: force ANSI colours on/off (by default only when the sink is a TTY)
+        # format: 'text' or 'json' (one JSON object per line)
+        # rate, burst: token bucket per call site, at most burst records at once and rate records/s after that
+        # dedup: seconds during which an identical message from the same call site is suppressed
+        # (10 s by default), for the messages at or above dedup_level (WARNING by default)
+        # rate=0 or dedup=0 turn the respective limit off
+        if reset:
+            cls._report_suppressed()
+            if cls._writer is not None:
+                cls._writer.stop()
+                cls._writer = None
+            if cls._sink is not None:
+                cls._sink.close()
+                cls._sink = None
+            cls._level = INFO
+            cls._limiter = _Limiter(dedup=10, dedup_level=WARNING)
+        if level is not None:
+            cls._level = level
+        if rate is not None or dedup is not None:
+            cls._report_suppressed()
+            old = cls._limiter
+            rate = (old.rate if old else None) if rate is None else rate
+            dedup = (old.dedup if old else None) if dedup is None else dedup
+            dedup_level = (old.dedup_level if old else WARNING) if dedup_level is None else dedup_level
+            cls._limiter = _Limiter(rate, burst, dedup, dedup_level) if rate or dedup else None
+        elif dedup_level is not None and cls._limiter is not None:
+            cls._limiter.dedup_level = dedup_level
+        if sink is not None or colour is not None or format is not None or asynchronous is not None:
+            if asynchronous is None:
+                asynchronous = cls._writer is not None
+            if cls._writer is not None:
+                cls._writer.stop()
+                cls._writer = None
+            if sink is not None or colour is not None or format is not None:
+                old = cls._get_sink()
+                old.close()
+                cls._sink = _Sink(old.target if sink is None else sink, old.forced_colour if colour is None else colour,
+                                  old.json if format is None else format == 'json')
+            if asynchronous:
+                cls._writer = _AsyncWriter(cls._get_sink(), flush_interval, batch_size)
+        cls._site_level = cls._needed_site_level()
+
+    @classmethod
+    def info(cls, message, *args, **fields):
+        if cls._level <= INFO:
+            cls._emit(INFO, message, args, fields)
+
+    @classmethod
+    def warning(cls, message, *args, **fields):
+        if cls._level <= WARNING:
+            cls._emit(WARNING, message, args, fields)
+
+    @classmethod
+    def error(cls, message, *args, **fields):
+        if cls._level <= ERROR:
+            cls._emit(ERROR, message, args, fields)
+
+    @classmethod
+    def colourprint(cls, message, *args):
+        cls._write(_Record(None, message, args, None, None))
+
+    @classmethod
+    def flush(cls):
+        cls._report_suppressed()
+        if cls._writer is not None:
+            cls._writer.flush()
+
+    @classmethod
+    def suppressed(cls):
+        # {call site : number of records suppressed and not reported yet}
+        if cls._limiter is None:
+            return {}
+        return {_site_name(site) : count for site, (count, _) in cls._limiter.pending.items()}
+
+    @classmethod
+    def _get_sink(cls):
+        if cls._sink is None:
+            cls._sink = _Sink()
+        return cls._sink
+
+    @classmethod
+    def _needed_site_level(cls):
+        limiter = cls._limiter
+        if (cls._sink is not None and cls._sink.json) or (limiter is not None and limiter.rate):
+            return 0
+        if limiter is not None and limiter.dedup:
+            return limiter.dedup_level
+        return float('inf')
+
+    @classmethod
+    def _emit(cls, level, message, args, fields):
+        # the frame lookup and the limiter only run when the output or a limit needs the call site
+        site = None
+        suppressed = 0
+        if level >= cls._site_level:
+            frame = sys._getframe(2)
+            site = (frame.f_code.co_filename, frame.f_lineno, frame.f_code.co_name)
+            if cls._limiter is not None:
+                suppressed = cls._limiter.allow(level, message, args, site)
+                if suppressed is None:
+                    return
+        if cls._writer is not None:
+            # a plain tuple, the record is built and formatted by the writer thread
+            cls._writer.put((level, message, args, fields, site, time.time(), suppressed))
+        else:
+            cls._write(_Record(level, message, args, fields, site, None, suppressed))
+
+    @classmethod
+    def _write(cls, record):
+        if cls._writer is not None:
+            cls._writer.put(record)
+        else:
+            sink = cls._get_sink()
+            sink.write([_format_safe(record, sink.colour, sink.json)])
+
+    @classmethod
+    def _report_suppressed(cls):
+        if cls._limiter is None:
+            return
+        for site, (count, level) in list(cls._limiter.pending.items()):
+            record = _Record(level, 'suppressed {0} similar messages', (count,), None, site)
+            cls._write(record)
+        cls._limiter.pending.clear()
+
+class _Record:
+    __slots__ = ('level', 'message', 'args', 'fields', 'site', 'time', 'suppressed')
+
+    def __init__(self, level, message, args, fields, site, created=None, suppressed=0):
+        self.level = level
+        self.message = message
+        self.args = args
+        self.fields = fields
+        self.site = site
+        self.time = time.time() if created is None else created
+        self.suppressed = suppressed
+
+class _Limiter:
+    # token bucket per call site plus deduplication of identical messages per
+    # call site (only for the levels at or above dedup_level)
+    def __init__(self, rate=None, burst=10, dedup=None, dedup_level=WARNING):
+        self.rate = rate
+        self.burst = burst
+        self.dedup = dedup
+        self.dedup_level = dedup_level
+        self._buckets = {}
+        self._seen = {}
+        self.pending = {}
+        self._lock = threading.Lock()
+
+    def allow(self, level, message, args, site):
+        # None if the record is suppressed, otherwise the number of records
+        # suppressed at its site since the last one that got through
+        now = time.monotonic()
+        with self._lock:
+            allowed = True
+            if self.dedup and level is not None and level >= self.dedup_level:
+                try:
+                    key = (site, message, args)
+                    hash(key)
+                except TypeError:
+                    key = (site, message, repr(args))
+                last = self._seen.get(key)
+                if last is not None and now - last < self.dedup:
+                    allowed = False
+                else:
+                    if len(self._seen) > 4096:
+                        self._seen = {k : t for k, t in self._seen.items() if now - t < self.dedup}
+                    self._seen[key] = now
+            if allowed and self.rate:
+                tokens, last = self._buckets.get(site, (self.burst, now))
+                tokens = min(self.burst, tokens + (now - last) * self.rate)
+                if tokens < 1:
+                    allowed = False
+                else:
+                    tokens -= 1
+                self._buckets[site] = (tokens, now)
+            if not allowed:
+                count, _ = self.pending.get(site, (0, None))
+                self.pending[site] = (count + 1, level)
+                return None
+            if site in self.pending:
+                return self.pending.pop(site)[0]
+            return 0
+
+def _site_name(site):
+    return '{0}:{1}:{2}'.format(*site)
+
+def _format(record, colour, json=False):
+    level = record.level
+    message = record.message
+    if level is None and not json:
+        # colourprint: args are the colour codes
+        return (''.join(record.args) + message + RESET if colour else message) + '\n'
+    if record.args and level is not None:
+        message = message.format(*record.args)
+
+    if json:
+        out = {'level' : _LEVEL_NAMES[level], 'time' : record.time, 'message' : message}
+        if record.site is not None:
+            out['site'] = _site_name(record.site)
+        if record.fields:
+            out['fields'] = record.fields
+        if record.suppressed:
+            out['suppressed'] = record.suppressed
+        return _json.dumps(out, default=repr) + '\n'
+
+    if record.fields:
+        message += ' [' + ', '.join('{0}={1}'.format(k, v) for k, v in record.fields.items()) + ']'
+    if record.suppressed:
+        message += ' ({0} similar messages suppressed)'.format(record.suppressed)
+    if level == INFO:
+        line = FG_GREEN + message + RESET if colour else message
+    elif level == WARNING:
+        line = FG_YELLOW + UNDERLINE + 'WARNING' + RESET + FG_YELLOW + ': ' + message + RESET if colour else 'WARNING: ' + message
+    else:
+        line = FG_BLACK + BG_RED + UNDERLINE + 'ERROR' + RESET + FG_BLACK + BG_RED + ': ' + message + RESET if colour else 'ERROR: ' + message
+    return line + '\n'
+
+def _format_safe(record, colour, json=False):
+    # a record that cannot be formatted (bad template, failing __format__ or
+    # repr of an argument) is written as its raw message and arguments instead
+    try:
+        return _format(record, colour, json)
+    except Exception as e:
+        return '{0}: unformattable record ({1}): message={2} args={3}\n'.format(
+            _LEVEL_NAMES.get(record.level, 'PRINT'), type(e).__name__, _safe_repr(record.message), _safe_repr(record.args))
+
+def _safe_repr(value):
+    try:
+        return repr(value)
+    except Exception:
+        return '<{0} object>'.format(type(value).__name__)
+
+class _Sink:
+    def __init__(self, target=None, colour=None, json=False):
+        # target None follows sys.stdout even if it is replaced later
+        self.target = target
+        self.forced_colour = colour
+        self.json = json
+        self._owned = isinstance(target, str)
+        self._stream = open(target, 'a') if self._owned else target
+
+    @property
+    def stream(self):
+        return sys.stdout if self._stream is None else self._stream
+
+    @property
+    def colour(self):
+        if self.json:
+            return False
+        if self.forced_colour is not None:
+            return self.forced_colour
+        isatty = getattr(self.stream, 'isatty', None)
+        return bool(isatty and isatty())
+
+    def write(self, lines):
+        stream = self.stream
+        stream.write(''.join(lines))
+        stream.flush()
+
+    def close(self):
+        if self._owned:
+            self._stream.close()
+
+_STOP = object()
+
+class _AsyncWriter:
+    # The calling thread only appends to a deque (atomic, no lock). The writer
+    # thread wakes every flush_interval seconds, or as soon as batch_size records
+    # are waiting, and builds, formats and writes them batch_size at a time.
+    # flush() and stop() queue a marker behind the pending records and wait for it.
+    def __init__(self, sink, flush_interval=0.1, batch_size=1024):
+        self._sink = sink
+        self._flush_interval = flush_interval
+        self._batch_size = batch_size
+        self._queue = deque()
+        self._wake = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='log-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def put(self, item):
+        # item: a _Record or the tuple of its arguments
+        queue = self._queue
+        queue.append(item)
+        if len(queue) == self._batch_size:
+            self._wake.set()
+
+    def flush(self):
+        if self._thread.is_alive():
+            done = threading.Event()
+            self._queue.append(done)
+            self._wake.set()
+            done.wait()
 
-    @staticmethod
-    def warning(message):
-        print(FG_YELLOW + UNDERLINE + 'WARNING' + RESET + FG_YELLOW + ': ' + message + RESET)
+    def stop(self):
+        if self._thread.is_alive():
+            self._queue.append(_STOP)
+            self._wake.set()
+            self._thread.join()
+        atexit.unregister(self.stop)
 
-    @staticmethod
-    def error(message):
-        print(FG_BLACK + BG_RED + UNDERLINE + 'ERROR' + RESET + FG_BLACK + BG_RED + ': ' + message + RESET)
+    def _run(self):
+        queue = self._queue
+        while True:
+            self._wake.wait(self._flush_interval)
+            self._wake.clear()
+            while queue:
+                batch = []
+                marker = None
+                while queue and len(batch) < self._batch_size:
+                    item = queue.popleft()
+                    if isinstance(item, tuple):
+                        batch.append(_Record(*item))
+                    elif isinstance(item, _Record):
+                        batch.append(item)
+                    else:
+                        marker = item
+                        break
+                try:
+                    if batch:
+                        colour = self._sink.colour
+                        self._sink.write([_format_safe(r, colour, self._sink.json) for r in batch])
+                except Exception:
+                    # closed or broken sink, the records are lost but the writer keeps running
+                    pass
+                finally:
+                    if marker is not None and marker is not _STOP:
+                        marker.set()
+                if marker is _STOP:
+                    return
 
-    @staticmethod
-    def colourprint(message, *args):
-        print(''.join(args) + message + RESET)
+# repeated warnings (e.g. an invalid option passed in a plotting loop) are
+# written once per call site and message every 10 s, see log.configure(dedup=...)
+log.configure(reset=True)
 
 if __name__ == '__main__':
     log.info('this is a piece of information')
     log.warning('this is a warning')
-    log.error('this is an error')
\ No newline at end of file
+    log.error('this is an error')
@@ -0,0 +1,20 @@
+import io
+import os
+import sys
+import pytest
+
+# the modules live at the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+@pytest.fixture
+def log_sink():
+    # log.configure with an in-memory sink and no colours, returns the sink;
+    # the logger is back to its defaults after the test
+    from Logging import log
+    def configure(**options):
+        sink = io.StringIO()
+        log.configure(sink=sink, colour=False, **options)
+        return sink
+    yield configure
+    log.configure(reset=True)
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+import Graphing
+
+as_column = Graphing.Graphing2D._as_column
+
+@pytest.mark.parametrize('arg, expected', [
+    ([1, 2, 3], [1, 2, 3]),
+    ([1.5, np.float32(2), np.int64(3)], [1.5, 2, 3]),
+    (np.array([1.0, 2.0]), [1.0, 2.0]),
+    (np.array([1.0, 2.0, None], dtype=object), [1.0, 2.0, np.nan]),
+    ([1.0, None, 3.0], [1.0, np.nan, 3.0]),
+    ([], [])
+])
+def test_numeric_inputs(arg, expected):
+    column = as_column(arg)
+    assert column.dtype.kind in 'biuf'
+    assert np.allclose(column, expected, equal_nan=True)
+
+@pytest.mark.parametrize('arg', [[1, 'a'], [1, [2, 3]]])
+def test_mixed_lists_are_rejected(arg):
+    with pytest.raises(Graphing.BadParameter):
+        as_column(arg)
+
+@pytest.mark.parametrize('arg', [np.array(['1', 2], dtype=object), np.array([[1, 2], [3]], dtype=object), ['a', 'b']])
+def test_non_numeric_is_not_a_column(arg):
+    assert as_column(arg) is None
+
+def test_2d_block_and_nested_lists():
+    block = np.arange(6.0).reshape(2, 3)
+    g = Graphing.Graphing2D(block, headless=True)
+    assert len(g._data) == 2 and np.shares_memory(g._data[1], block)
+    g.add_data([[1, 2, 3], np.array([4.0, 5.0, 6.0])])
+    assert np.array_equal(g._data[3], [4, 5, 6])
+    with pytest.raises(Graphing.BadParameter):
+        g.add_data(np.zeros((2, 2, 2)))
+    with pytest.raises(Graphing.BadParameter):
+        g.add_data({'a' : 1})
+
+def test_matches_baseline_per_element_check():
+    # the dtype based check accepts exactly the lists of numbers the per element check did
+    candidates = [[1, 2.5], [1, True], [np.nan, 1], [1, '2'], [1, None], [2, [1]], [1.0, np.int8(3)]]
+    for arg in candidates:
+        baseline = all(isinstance(e, (int, float, np.integer, np.floating)) for e in arg)
+        try:
+            accepted = as_column(arg) is not None
+        except Graphing.BadParameter:
+            accepted = False
+        if baseline:
+            assert accepted, arg
@@ -0,0 +1,44 @@
+import io
+import json
+import numpy as np
+import Benchmarks
+import Graphing
+
+def test_skipped_timings_are_null_in_strict_json(tmp_path, monkeypatch):
+    monkeypatch.setitem(Benchmarks._QUICK, 'transform', {'sizes' : [100, 1000], 'legacy_limit' : 100})
+    results = Benchmarks.run(['transform'], quick=True)
+    rows = results['transform']['linear']
+    assert rows[0][1] is not None and rows[1][1] is None and rows[1][2] is not None
+    path = Benchmarks.save_results(results, str(tmp_path / 'bench.json'))
+    with open(path) as f:
+        text = f.read()
+    # NaN is not valid JSON
+    assert 'NaN' not in text
+    saved = json.loads(text)
+    assert saved['labels'] == {'transform' : 'points'}
+    assert Benchmarks.load_results(path) == json.loads(json.dumps(results))
+
+def test_compare_skips_missing_timings():
+    base = {'g' : {'case' : [[10, 1.0], [100, None], [1000, 1.0]]}}
+    new = {'g' : {'case' : [[10, 2.0], [100, 5.0], [1000, None]], 'new' : [[10, 9.0]]}}
+    assert Benchmarks.compare(base, new) == [('g', 'case', 10, 1.0, 2.0)]
+
+def test_import_rows_count_imports():
+    assert Benchmarks.LABELS['import'] == 'cold imports'
+    assert all(isinstance(row[0], int) for row in Benchmarks.bench_import(repeat=1)['Graphing'])
+
+def test_stage_timings_and_callback():
+    calls = []
+    x = np.linspace(0, 1, 100)
+    g = Graphing.Graphing2D(x, 2*x, headless=True)
+    g.set_timing(callback=lambda stage, seconds: calls.append((stage, seconds)))
+    g.add_linear_fit()
+    g.save(io.BytesIO(), format='png')
+    timings = g.timings(reset=True)
+    assert {'fit', 'transform', 'artists', 'render'} <= set(timings)
+    assert {stage for stage, _ in calls} == set(timings)
+    assert all(seconds >= 0 for _, seconds in calls)
+    assert g.timings() == {}
+    g.set_timing(False)
+    g.add_plot()
+    assert g.timings() == {}
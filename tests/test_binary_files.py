@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+import DataFiles
+
+rng = np.random.default_rng(19)
+N = 500
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / 'data.csv'
+    t = np.arange(N)
+    v = np.round(rng.normal(size=N), 6)
+    k = rng.integers(0, 4, size=N)
+    path.write_text('t;v;k\n' + ''.join('{0};{1};{2}\n'.format(*row) for row in zip(t, v, k)))
+    return str(path)
+
+def _reference(csv, rows, where):
+    # the whole CSV, then the range and a mask built by hand
+    columns = DataFiles.read_columns(csv)
+    start, stop = rows
+    columns = {name : column[start:stop] for name, column in columns.items()}
+    mask = np.ones(stop - start, dtype=bool)
+    for column, op, value in where:
+        mask &= DataFiles._OPERATORS[op](columns[column], value)
+    return {name : column[mask] for name, column in columns.items()}
+
+@pytest.mark.parametrize('format', ['npz', 'npy'])
+def test_convert_round_trips(csv, tmp_path, format):
+    out = DataFiles.convert(csv, str(tmp_path / ('data.' + format)), format)
+    assert DataFiles.file_format(out) == format
+    assert DataFiles.read_headers(out) == ['t', 'v', 'k']
+    source = DataFiles.read_columns(csv)
+    converted = DataFiles.read_columns(out)
+    for name in source:
+        assert converted[name].dtype == source[name].dtype
+        assert np.array_equal(converted[name], source[name])
+
+@pytest.mark.parametrize('format', ['npz', 'npy'])
+def test_rows_and_where_equal_csv_plus_mask(csv, tmp_path, format):
+    out = DataFiles.convert(csv, str(tmp_path / ('data.' + format)), format)
+    rows = (37, 412)
+    where = [('k', 'in', [1, 3]), ('v', '>', -0.5)]
+    expected = _reference(csv, rows, where)
+    got = DataFiles.read_columns(out, ['v', 't'], rows=rows, where=where)
+    assert list(got) == ['v', 't']
+    for name in got:
+        assert np.array_equal(got[name], expected[name])
+    # the text reader pushes the same selection down
+    text = DataFiles.read_columns(csv, ['v', 't'], rows=rows, where=where)
+    assert np.array_equal(text['t'], expected['t'])
+
+def test_npz_rows_past_the_end(csv, tmp_path):
+    out = DataFiles.convert(csv, str(tmp_path / 'data.npz'))
+    assert np.array_equal(DataFiles.read_columns(out, ['t'], rows=(N - 3, N + 10))['t'], np.arange(N - 3, N))
+    assert len(DataFiles.read_columns(out, ['t'], rows=(N + 5, None))['t']) == 0
+
+@pytest.mark.filterwarnings('ignore:Stored array in format 3.0')
+def test_npz_member_with_utf8_header(tmp_path):
+    # a unicode field name only fits a version 3.0 .npy header
+    table = np.zeros(10, dtype=[('Δt', np.float64), ('n', np.int32)])
+    table['Δt'] = np.arange(10) * 0.5
+    table['n'] = np.arange(10)
+    member = tmp_path / 'table.npy'
+    np.save(member, table)
+    with open(member, 'rb') as f:
+        assert np.lib.format.read_magic(f) == (3, 0)
+    path = str(tmp_path / 'data.npz')
+    np.savez(path, table=table, n=np.arange(10))
+    rows = DataFiles.read_columns(path, ['table', 'n'], rows=(2, 6))
+    assert np.array_equal(rows['table'], table[2:6])
+    assert np.array_equal(rows['n'], np.arange(2, 6))
+
+def test_explicit_dtype(csv, tmp_path):
+    out = DataFiles.convert(csv, str(tmp_path / 'data.npz'))
+    columns = DataFiles.read_columns(out, ['t', 'k'], dtype={'t' : np.float32})
+    assert columns['t'].dtype == np.float32 and columns['k'].dtype == np.int64
+
+def test_sniffs_the_format_without_extension(csv, tmp_path):
+    out = DataFiles.convert(csv, str(tmp_path / 'data.npz'))
+    renamed = tmp_path / 'data.bin'
+    renamed.write_bytes(open(out, 'rb').read())
+    assert DataFiles.file_format(str(renamed)) == 'npz'
+
+def test_bad_selection():
+    with pytest.raises(ValueError):
+        DataFiles.FileColumn('data.npz', 'x', rows=(5, 2))
+    with pytest.raises(ValueError):
+        DataFiles.FileColumn('data.npz', 'x', where=[('x', '~', 1)])
+
+@pytest.mark.parametrize('format', ['feather', 'parquet'])
+def test_arrow_formats(csv, tmp_path, format):
+    pytest.importorskip('pyarrow')
+    out = DataFiles.convert(csv, str(tmp_path / ('data.' + format)), format)
+    rows = (37, 412)
+    where = [('k', '==', 2)]
+    expected = _reference(csv, rows, where)
+    got = DataFiles.read_columns(out, ['t', 'v'], rows=rows, where=where)
+    for name in got:
+        assert got[name].dtype == expected[name].dtype
+        assert np.array_equal(got[name], expected[name])
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+import Graphing
+from CurveFit import CurveFit, CurveFitter
+
+rng = np.random.default_rng(15)
+x = np.linspace(0.5, 10, 300)
+
+@pytest.mark.parametrize('model, p', [
+    ('exponential', [2.0, -0.4, 1.0]),
+    # negative amplitudes: a charging curve and a concave growth
+    ('exponential', [-2.0, -1.0, 5.0]),
+    ('exponential', [-2.0, 0.3, 10.0]),
+    ('power', [1.5, 0.7]),
+    ('gaussian', [3.0, 5.0, 1.2, 0.5]),
+    ('sigmoid', [4.0, 1.5, 6.0, -1.0]),
+])
+def test_models_recover_their_parameters(model, p):
+    y = CurveFitter(model).model.function(x, np.array(p)) + rng.normal(scale=1e-3, size=len(x))
+    _, q, cov = CurveFit(x, y, model)
+    assert q == pytest.approx(p, rel=1e-2, abs=1e-2)
+    assert np.all(np.diag(cov) >= 0)
+
+@pytest.mark.parametrize('loss', ['huber', 'ransac'])
+def test_robust_losses_ignore_outliers(loss):
+    p = [3.0, 5.0, 1.2, 0.5]
+    y = CurveFitter('gaussian').model.function(x, np.array(p)) + rng.normal(scale=0.02, size=len(x))
+    bad = rng.choice(len(x), size=30, replace=False)
+    y[bad] += rng.uniform(5, 10, size=30)
+    _, plain, _ = CurveFit(x, y, 'gaussian')
+    _, robust, _ = CurveFit(x, y, 'gaussian', loss=loss)
+    error = lambda q: np.max(np.abs(np.asarray(q) - p))
+    assert error(robust) < 0.05
+    assert error(robust) < error(plain)
+
+def test_ransac_marks_the_outliers():
+    y = 2*x**0.5 + rng.normal(scale=0.01, size=len(x))
+    y[::10] += 50
+    fitter = CurveFitter('power', 'ransac')
+    fitter.fit(x, y)
+    assert not np.any(fitter.inliers[::10])
+    assert np.all(np.delete(fitter.inliers, np.s_[::10]))
+
+@pytest.mark.parametrize('loss', ['linear', 'huber', 'ransac'])
+def test_warm_start_converges_faster(loss):
+    p = np.array([3.0, 5.0, 1.2, 0.5])
+    fitter = CurveFitter('gaussian', loss)
+    y = fitter.model.function(x, p) + rng.normal(scale=0.02, size=len(x))
+    if loss != 'linear':
+        y[::10] += 8
+    fitter.fit(x, y)
+    cold = fitter.iterations
+    _, q, _ = fitter.fit(x, y * 1.001)
+    assert fitter.iterations < cold
+    if loss == 'ransac':
+        # the previous consensus set still holds, no minimal fits are resampled
+        assert fitter.iterations < cold / 10
+    assert q == pytest.approx(CurveFitter('gaussian', loss, warm_start=False).fit(x, y * 1.001)[1], rel=1e-4)
+
+def test_ransac_warm_start_resamples_when_the_inliers_change():
+    p = np.array([3.0, 5.0, 1.2, 0.5])
+    fitter = CurveFitter('gaussian', 'ransac')
+    y = fitter.model.function(x, p) + rng.normal(scale=0.02, size=len(x))
+    y[::10] += 8
+    fitter.fit(x, y)
+    # other points are the outliers now
+    y[::10] -= 8
+    y[5::10] += 8
+    _, q, _ = fitter.fit(x, y)
+    assert q == pytest.approx(p, abs=0.05)
+    assert not np.any(fitter.inliers[5::10]) and np.all(fitter.inliers[::10])
+
+def test_unknown_loss():
+    with pytest.raises(ValueError):
+        CurveFitter('gaussian', 'cauchy')
+
+def test_graphing_keeps_a_fitter_per_column_pair():
+    y1 = 2*np.exp(-0.4*x) + 1
+    y2 = 3*np.exp(0.2*x) - 2
+    g = Graphing.Graphing2D(x, y1, y2, headless=True)
+    p1, _ = g.add_curve_fit('exponential')
+    g.set_working_data(0, 2)
+    p2, _ = g.add_curve_fit('exponential')
+    assert p1 == pytest.approx([2, -0.4, 1], rel=1e-6)
+    assert p2 == pytest.approx([3, 0.2, -2], rel=1e-6)
+    assert {key[2:] for key in g._curve_fitters} == {(0, 1), (0, 2)}
+    with pytest.raises(Graphing.BadParameter):
+        g.add_curve_fit('lorentzian')
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+from DataTable import DataTable
+
+def test_names_and_indices():
+    table = DataTable()
+    assert table.append(np.arange(3), 'a') == 0
+    assert table.append(np.arange(4)) == 1
+    assert table.index('a') == 0 and table.index('1') == 1 and table.index(-1) == 1
+    assert table.name(1) == '1' and table.names() == ['a', '1']
+    with pytest.raises(KeyError):
+        table.index('missing')
+    with pytest.raises(IndexError):
+        table.index(2)
+    with pytest.raises(TypeError):
+        table.index(True)
+
+def test_duplicate_name_refers_to_latest():
+    table = DataTable()
+    table.append(np.zeros(2), 'x')
+    table.append(np.ones(2), 'x')
+    assert np.array_equal(table['x'], np.ones(2))
+    assert np.array_equal(table[0], np.zeros(2))
+
+def test_extend_keeps_views_of_block():
+    block = np.arange(12.0).reshape(3, 4)
+    table = DataTable()
+    assert table.extend(block, ['a', 'b', 'c']) == [0, 1, 2]
+    assert all(np.shares_memory(table[i], block) for i in range(3))
+    assert np.array_equal(table['b'], block[1])
+
+def test_extend_column_matches_concatenate():
+    rng = np.random.default_rng(4)
+    table = DataTable()
+    table.append(np.array([1.0, 2.0]), 'y')
+    expected = [1.0, 2.0]
+    for _ in range(50):
+        chunk = rng.normal(size=rng.integers(0, 20))
+        table.extend_column('y', chunk)
+        expected.extend(chunk)
+    assert np.array_equal(table['y'], expected)
+    # amortized growth: the buffer is at most about twice the data
+    assert len(table._buffers[0]) <= 2 * len(expected) + 16
+
+def test_extend_column_promotes_dtype():
+    table = DataTable()
+    table.append(np.array([1, 2]), 'n')
+    table.extend_column('n', [0.5])
+    assert table['n'].dtype == np.float64 and np.array_equal(table['n'], [1, 2, 0.5])
@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+import Graphing
+from Graphing import _lttb_indices, _minmax_indices
+
+rng = np.random.default_rng(5)
+x = np.arange(10007, dtype=np.float64)
+y = np.cumsum(rng.normal(size=10007))
+
+def test_minmax_keeps_every_bucket_extreme():
+    n_buckets = 100
+    idx = _minmax_indices(y, n_buckets)
+    assert np.all(np.diff(idx) > 0)
+    assert idx[0] == 0 and idx[-1] == len(y) - 1
+    size = -(-len(y) // n_buckets)
+    # brute force: the extremes of every bucket are among the kept points
+    for start in range(0, len(y), size):
+        bucket = y[start:start+size]
+        assert start + np.argmin(bucket) in idx
+        assert start + np.argmax(bucket) in idx
+    assert y[idx].min() == y.min() and y[idx].max() == y.max()
+
+def test_lttb_matches_reference():
+    n_out = 200
+    idx = _lttb_indices(x, y, n_out)
+    assert len(idx) == n_out and idx[0] == 0 and idx[-1] == len(y) - 1
+    # straightforward loop over the buckets, as in the original paper
+    edges = np.linspace(1, len(y) - 1, n_out - 1).astype(np.int64)
+    a = 0
+    for i in range(n_out - 2):
+        if i + 2 < len(edges):
+            nxt = slice(edges[i + 1], edges[i + 2])
+            cx, cy = x[nxt].mean(), y[nxt].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        best, best_area = None, -1
+        for j in range(edges[i], edges[i + 1]):
+            area = abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a]))
+            if area > best_area:
+                best, best_area = j, area
+        assert idx[i + 1] == best
+        a = best
+
+def test_add_plot_decimates():
+    g = Graphing.Graphing2D(x, y, headless=True)
+    g.add_plot(decimate=True)
+    g.add_plot(decimate='lttb')
+    g.add_plot()
+    lines = g._axes().get_lines()
+    fig = g._axes().figure
+    limit = 2 * int(fig.get_figwidth() * fig.dpi) + 2
+    assert len(lines[0].get_xdata()) <= limit
+    assert len(lines[1].get_xdata()) <= limit
+    assert len(lines[2].get_xdata()) == len(x)
+
+def test_scatter_decimation_keeps_every_occupied_pixel():
+    rng = np.random.default_rng(6)
+    cx = rng.normal(size=200000)
+    cy = rng.normal(size=200000)
+    g = Graphing.Graphing2D(cx, cy, headless=True)
+    g.add_scatter(decimate=True)
+    kept = g._axes().collections[0].get_offsets()
+    assert len(kept) < len(cx) // 2
+    fig = g._axes().figure
+    nx, ny = int(fig.get_figwidth() * fig.dpi), int(fig.get_figheight() * fig.dpi)
+    def cells(px, py):
+        i = np.minimum(((px - cx.min()) / np.ptp(cx) * nx).astype(int), nx - 1)
+        j = np.minimum(((py - cy.min()) / np.ptp(cy) * ny).astype(int), ny - 1)
+        return set(zip(i.tolist(), j.tolist()))
+    # one point per occupied pixel, the dense core included
+    assert cells(kept[:, 0], kept[:, 1]) == cells(cx, cy)
+    assert len(kept) == len(cells(cx, cy))
+
+def test_pixel_indices_skip_non_finite_points():
+    px = np.array([0.0, 0.0, np.nan, 1.0, 1.0, 0.9])
+    py = np.array([0.0, 0.0, 1.0, 1.0, np.inf, 0.1])
+    assert list(Graphing._pixel_indices(px, py, 2, 2)) == [0, 3, 5]
+
+def test_decimate_modes_per_plot_kind():
+    g = Graphing.Graphing2D(x, y, headless=True)
+    for mode in ('minmax', 'lttb'):
+        with pytest.raises(Graphing.BadParameter):
+            g.add_scatter(decimate=mode)
+    with pytest.raises(Graphing.BadParameter):
+        g.add_plot(decimate='pixel')
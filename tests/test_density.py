@@ -0,0 +1,89 @@
+import io
+import warnings
+import numpy as np
+import pytest
+import Graphing
+from Graphing import _density_grid
+
+rng = np.random.default_rng(20)
+x = rng.normal(size=20000)
+y = 3 * rng.normal(size=20000) + x
+
+@pytest.mark.parametrize('chunk', [2**20, 777])
+def test_hist_counts_equal_histogram2d(chunk):
+    grid = _density_grid(x, y, (40, 25), chunk=chunk)
+    x_low, x_high, y_low, y_high = grid['extent']
+    H, _, _ = np.histogram2d(x, y, bins=(40, 25), range=[(x_low, x_high), (y_low, y_high)])
+    assert np.array_equal(grid['counts'].reshape(25, 40), H.T)
+
+def test_hex_counts_equal_hexbin():
+    import matplotlib.pyplot as plt
+    nx, ny = 30, int(30 / np.sqrt(3))
+    grid = _density_grid(x, y, (nx, ny), hexagonal=True, chunk=4096)
+    fig, ax = plt.subplots()
+    try:
+        collection = ax.hexbin(x, y, gridsize=(nx, ny))
+        assert np.array_equal(collection.get_array(), grid['counts'])
+        assert np.allclose(collection.get_offsets(), grid['centres'])
+    finally:
+        plt.close(fig)
+
+def test_hex_counts_equal_nearest_centre():
+    nx, ny = 12, 7
+    xs, ys = x[:3000], y[:3000]
+    grid = _density_grid(xs, ys, (nx, ny), hexagonal=True)
+    sx, sy = grid['spacing']
+    # hexagons are regular in (x / sx, sqrt(3) y / sy)
+    du = (xs[:, None] - grid['centres'][:, 0]) / sx
+    dv = (ys[:, None] - grid['centres'][:, 1]) / sy
+    nearest = np.argmin(du*du + 3*dv*dv, axis=1)
+    assert np.array_equal(grid['counts'], np.bincount(nearest, minlength=len(grid['centres'])))
+
+def test_non_finite_points_are_skipped():
+    xs = x[:1000].copy()
+    xs[::7] = np.nan
+    ys = y[:1000].copy()
+    ys[::11] = np.inf
+    grid = _density_grid(xs, ys, (10, 10), chunk=100)
+    keep = np.isfinite(xs) & np.isfinite(ys)
+    assert grid['counts'].sum() == keep.sum()
+    assert np.array_equal(grid['counts'], _density_grid(xs[keep], ys[keep], (10, 10))['counts'])
+
+def test_bin_means_and_errors():
+    xs, ys = x[:2000], y[:2000]
+    ex = np.full(2000, 0.1)
+    ey = np.full(2000, 0.2)
+    grid = _density_grid(xs, ys, (5, 4), errors=(ex, ey), chunk=300)
+    x_low, x_high, y_low, y_high = grid['extent']
+    i = np.minimum(((xs - x_low) / (x_high - x_low) * 5).astype(int), 4)
+    j = np.minimum(((ys - y_low) / (y_high - y_low) * 4).astype(int), 3)
+    for b in np.flatnonzero(grid['counts']):
+        inside = j*5 + i == b
+        n = inside.sum()
+        assert grid['x_mean'][b] == pytest.approx(xs[inside].mean())
+        assert grid['y_mean'][b] == pytest.approx(ys[inside].mean())
+        assert grid['x_error'][b] == pytest.approx(0.1 / np.sqrt(n))
+        assert grid['y_error'][b] == pytest.approx(0.2 / np.sqrt(n))
+
+def test_density_scatter_is_one_artist():
+    g = Graphing.Graphing2D(x, y, headless=True)
+    g.add_scatter(density=True, bins=64)
+    g.add_scatter(density='hex', bins=20)
+    ax = g._axes()
+    assert len(ax.images) == 1 and ax.images[0].get_array().shape == (64, 64)
+    assert len(ax.collections) == 1
+    for kwargs in [{'density' : 'contour'}, {'density' : True, 'decimate' : True}, {'density' : 'hex', 'bins' : (10, 10)},
+                   {'density' : True, 'bins' : 0}, {'density' : True, 'live' : True}]:
+        with pytest.raises(Graphing.BadParameter):
+            g.add_scatter(**kwargs)
+
+@pytest.mark.parametrize('mode', ['hist', 'hex'])
+def test_density_legend(mode):
+    g = Graphing.Graphing2D(x, y, headless=True)
+    g.add_scatter(density=mode, bins=20, legend='density')
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        g.save(io.BytesIO(), format='png')
+    _, labels = g._axes().get_legend_handles_labels()
+    assert labels == ['density']
+    assert g._axes().get_legend() is not None
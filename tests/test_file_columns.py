@@ -0,0 +1,55 @@
+import os
+import numpy as np
+import pytest
+import Graphing
+import DataFiles
+from DataFiles import FileColumn
+
+@pytest.fixture
+def csv(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('label;x;y\n' + ''.join('p{0};{0};{1}\n'.format(i, 0.5*i) for i in range(20)))
+    return str(path)
+
+def _graph(*args, **kwargs):
+    g = Graphing.Graphing2D([0.0], [0.0], headless=True)
+    g.add_data(*args, **kwargs)
+    return g
+
+def test_lazy_columns_are_read_on_use(csv):
+    g = _graph(csv, lazy=True)
+    assert isinstance(g._data._columns[g._data.index('y')], FileColumn)
+    g.set_working_data('x', 'y')
+    assert np.array_equal(g._data['y'], 0.5*np.arange(20))
+    # the text column was never needed
+    assert isinstance(g._data._columns[g._data.index('label')], FileColumn)
+
+def test_cache_keeps_file_dtypes(csv):
+    for _ in range(2):
+        g = _graph(csv, cache=True)
+        assert g._data['label'].dtype.kind == 'O'
+        assert g._data['x'].dtype.kind == 'i'
+        assert np.array_equal(g._data['y'], 0.5*np.arange(20))
+    assert os.path.exists(DataFiles.cache_path(csv, 'y'))
+    # numeric columns come back memory-mapped from the cache
+    column = DataFiles.read_columns(csv, ['y'], cache=True)['y']
+    while column is not None and not isinstance(column, np.memmap):
+        column = column.base
+    assert column is not None
+
+def test_cache_with_numeric_dtype_on_text_column(csv):
+    with pytest.raises(Graphing.BadParameter):
+        _graph(csv, cache=True, dtype=np.float64)
+
+def test_stale_cache_is_reread(csv):
+    DataFiles.read_columns(csv, ['y'], cache=True)
+    with open(csv, 'a') as f:
+        f.write('p20;20;99.0\n')
+    os.utime(csv, (os.path.getatime(csv), os.path.getmtime(DataFiles.cache_path(csv, 'y')) + 10))
+    assert DataFiles.read_columns(csv, ['y'], cache=True)['y'][-1] == 99.0
+
+def test_columns_selection(csv):
+    g = _graph(csv, columns=['y'])
+    assert g._data.names() == ['0', '1', 'y']
+    with pytest.raises(Graphing.NonExistingData):
+        _graph(csv, columns=['z'])
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+import EasyStats
+from EasyStats import FitCache, fit_cache
+
+x = np.linspace(0, 1, 100)
+y = 3*x + 2
+
+@pytest.fixture
+def cache():
+    fit_cache.configure(maxsize=8)
+    fit_cache.clear()
+    yield fit_cache
+    fit_cache.configure(maxsize=0)
+    fit_cache.clear()
+
+def test_disabled_by_default():
+    assert not FitCache(maxsize=0).enabled
+    assert not fit_cache.enabled
+
+def test_hit_returns_same_coefficients(cache):
+    _, first = EasyStats.LinearFit(x, y)
+    _, second = EasyStats.LinearFit(x, y)
+    assert cache.info()['hits'] == 1 and cache.info()['misses'] == 1
+    assert np.array_equal(first, second)
+    # callers get copies, changing one does not change the cache
+    second[0] = 100
+    assert EasyStats.LinearFit(x, y)[1][0] == pytest.approx(3)
+
+def test_key_depends_on_data_kind_and_degree(cache):
+    keys = {cache.key('poly', 1, x, y), cache.key('poly', 2, x, y), cache.key('casero', 1, x, y),
+            cache.key('poly', 1, x, y + 1), cache.key('poly', 1, x.astype(np.float32), y)}
+    assert len(keys) == 5
+
+def test_changed_data_misses(cache):
+    EasyStats.LinearFit(x, y)
+    _, poly = EasyStats.LinearFit(x, 2*y)
+    assert np.allclose(poly, [6, 4])
+    assert cache.info()['misses'] == 2
+
+def test_lru_bound(cache):
+    cache.configure(maxsize=2)
+    for k in range(4):
+        EasyStats.LinearFit(x, y + k)
+    assert cache.info()['size'] == 2
+    EasyStats.LinearFit(x, y + 3)
+    assert cache.info()['hits'] == 1
+
+def test_directory(tmp_path):
+    disk = FitCache(maxsize=0, directory=str(tmp_path))
+    key = disk.key('poly', 1, x, y)
+    disk.put(key, np.array([3.0, 2.0]))
+    assert np.array_equal(FitCache(maxsize=0, directory=str(tmp_path)).get(key), [3.0, 2.0])
+    assert [p.suffix for p in tmp_path.iterdir()] == ['.npy']
+
+@pytest.mark.parametrize('size', [0, 20])
+def test_partial_directory_entry_is_a_miss(tmp_path, size):
+    fit_cache.configure(maxsize=0, directory=str(tmp_path))
+    try:
+        EasyStats.LinearFit(x, y)
+        path, = tmp_path.iterdir()
+        # an empty or truncated entry, as left by a writer that was interrupted
+        data = path.read_bytes()
+        path.write_bytes(data[:size])
+        _, poly = EasyStats.LinearFit(x, y)
+        assert np.allclose(poly, [3, 2])
+        # the entry was written again in full
+        assert path.read_bytes() == data
+    finally:
+        fit_cache.configure(maxsize=0)
+        fit_cache.clear()
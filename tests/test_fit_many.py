@@ -0,0 +1,40 @@
+import os
+import numpy as np
+import pytest
+import EasyStats
+
+rng = np.random.default_rng(2)
+datasets = [(np.linspace(0, 1, n), rng.normal(size=n)) for n in (10, 50, 200, 7, 31)]
+
+@pytest.mark.parametrize('kind', ['linear', 'quadratic', 3])
+def test_pool_matches_serial(kind):
+    serial = EasyStats.FitMany(datasets, kind, workers=1)
+    pooled = EasyStats.FitMany(datasets, kind, workers=2)
+    for (fit, poly), (pooled_fit, pooled_poly) in zip(serial, pooled):
+        assert np.allclose(fit, pooled_fit)
+        assert np.allclose(poly, pooled_poly)
+
+def test_stacked_series_in_pool():
+    x = np.linspace(0, 1, 20)
+    Y = np.stack([x, 2*x + 1])
+    fit, poly = EasyStats.FitMany([(x, Y), (x, Y[0])], workers=2)[0]
+    assert fit.shape == Y.shape
+    assert np.allclose(poly, [[1, 0], [2, 1]])
+
+@pytest.mark.skipif(not os.path.isdir('/dev/shm'), reason='needs /dev/shm to look for leaked blocks')
+def test_no_leak_when_second_block_fails(monkeypatch):
+    from multiprocessing import shared_memory
+    created = []
+    original = shared_memory.SharedMemory
+
+    class Failing(original):
+        def __init__(self, *args, **kwargs):
+            if kwargs.get('create') and created:
+                raise OSError('no space left')
+            super().__init__(*args, **kwargs)
+            created.append(self.name)
+
+    monkeypatch.setattr(shared_memory, 'SharedMemory', Failing)
+    with pytest.raises(OSError):
+        EasyStats.FitMany(datasets, workers=2)
+    assert created and not os.path.exists(os.path.join('/dev/shm', created[0].lstrip('/')))
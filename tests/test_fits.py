@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+import EasyStats
+
+rng = np.random.default_rng(0)
+x = np.linspace(-3, 7, 200)
+Y = np.stack([2*x + 1, 0.5*x*x - x + 3, -x + 4]) + rng.normal(0, 0.1, (3, 200))
+
+@pytest.mark.parametrize('fit, n', [(EasyStats.LinearFit, 1), (EasyStats.LinearFitCasero, 1), (EasyStats.QuadraticFit, 2)])
+def test_matches_polyfit(fit, n):
+    values, poly = fit(x, Y[0])
+    expected = np.polyfit(x, Y[0], n)
+    assert np.allclose(poly, expected)
+    assert np.allclose(values, np.polyval(expected, x))
+
+def test_nrank_matches_polyfit():
+    _, poly = EasyStats.NRankFit(x, Y[1], 5)
+    assert np.allclose(poly, np.polyfit(x, Y[1], 5))
+
+def test_origin_fit():
+    _, (m, b) = EasyStats.LinearFitOrigin(x, Y[0])
+    assert b == 0
+    assert np.isclose(m, np.dot(x, Y[0]) / np.dot(x, x))
+
+@pytest.mark.parametrize('fit', [EasyStats.LinearFit, EasyStats.LinearFitCasero, EasyStats.LinearFitOrigin, EasyStats.QuadraticFit])
+def test_stack_matches_single_series(fit):
+    values, poly = fit(x, Y)
+    assert values.shape == Y.shape
+    for k in range(len(Y)):
+        single_values, single_poly = fit(x, Y[k])
+        assert np.allclose(poly[k], single_poly)
+        assert np.allclose(values[k], single_values)
+
+def test_polyval_stack():
+    poly = np.array([[1.0, 2.0], [3.0, -1.0]])
+    assert np.allclose(EasyStats.PolyVal(poly, x), [np.polyval(p, x) for p in poly])
+
+def test_shape_mismatch():
+    with pytest.raises(ValueError):
+        EasyStats.LinearFit(x, Y[0][:-1])
@@ -0,0 +1,49 @@
+import io
+import numpy as np
+import pytest
+import Graphing
+
+def _specs():
+    x = [0.0, 1.0, 2.0, 3.0]
+    return [{'name' : 'plot{0}'.format(k), 'data' : [x, [v * k for v in x]],
+             'calls' : [('add_plot', (0, 1), {}), ('add_linear_fit', (), {'autolegend' : True})]} for k in range(1, 6)]
+
+def test_save_png(tmp_path):
+    g = Graphing.Graphing2D([0.0, 1.0], [1.0, 2.0], headless=True)
+    g.add_plot()
+    path = g.save(str(tmp_path / 'plot.png'))
+    with open(path, 'rb') as f:
+        assert f.read(8) == b'\x89PNG\r\n\x1a\n'
+
+def test_save_to_stream():
+    g = Graphing.Graphing2D([0.0, 1.0], [1.0, 2.0], headless=True)
+    g.add_scatter()
+    out = io.BytesIO()
+    g.save(out, format='svg')
+    assert b'<svg' in out.getvalue()
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_render_batch(tmp_path, workers):
+    paths = Graphing.Graphing2D.render_batch(_specs(), str(tmp_path), workers=workers)
+    assert [p.rsplit('/', 1)[-1] for p in paths] == ['plot{0}.png'.format(k) for k in range(1, 6)]
+    for path in paths:
+        with open(path, 'rb') as f:
+            assert f.read(4) == b'\x89PNG'
+
+def test_reused_figure_starts_empty(tmp_path):
+    # the figure kept between specs must not carry the lines of the previous one
+    specs = _specs()[:2]
+    Graphing.Graphing2D.render_batch(specs, str(tmp_path))
+    g = Graphing.Graphing2D(*specs[1]['data'], headless=True)
+    g.add_plot(0, 1)
+    g.add_linear_fit(autolegend=True)
+    single = g.save(str(tmp_path / 'single.png'))
+    with open(single, 'rb') as a, open(str(tmp_path / 'plot2.png'), 'rb') as b:
+        assert a.read() == b.read()
+
+def test_headless_does_not_import_pyplot():
+    import subprocess, sys, os
+    code = 'import sys, Graphing; Graphing.Graphing2D([1.0, 2.0], [2.0, 4.0], headless=True).add_plot(); print("matplotlib.pyplot" in sys.modules)'
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True).stdout
+    assert out.strip() == 'False'
@@ -0,0 +1,25 @@
+import os
+import subprocess
+import sys
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ('matplotlib', 'pandas', 'scipy', 'openpyxl', 'pyarrow')
+
+def _loaded(statement):
+    # top-level packages out of HEAVY imported by statement, in a fresh interpreter
+    code = '{0}\nimport sys\nprint(" ".join(sorted({{m.split(".")[0] for m in sys.modules}} & set({1!r}))))'.format(statement, HEAVY)
+    out = subprocess.run([sys.executable, '-c', code], cwd=ROOT, capture_output=True, text=True, check=True).stdout
+    return set(out.split())
+
+@pytest.mark.parametrize('module', ['Logging', 'EasyStats', 'CurveFit', 'DataFiles', 'DataTable', 'Graphing'])
+def test_import_is_light(module):
+    assert _loaded('import ' + module) == set()
+
+def test_loading_data_does_not_import_matplotlib():
+    assert _loaded('import Graphing; Graphing.Graphing2D([1.0, 2.0], [2.0, 4.0]).add_data([3.0, 4.0])') == set()
+
+def test_headless_plot_skips_pyplot():
+    code = 'import Graphing; Graphing.Graphing2D([1.0, 2.0], [2.0, 4.0], headless=True).add_plot()\n' \
+           'import sys; assert "matplotlib.pyplot" not in sys.modules'
+    assert _loaded(code) == {'matplotlib'}
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+import EasyStats
+import Graphing
+
+rng = np.random.default_rng(13)
+
+def test_live_plot_follows_appended_data():
+    g = Graphing.Graphing2D(np.arange(10.), np.arange(10.), headless=True)
+    g.add_plot(live=True)
+    g.append(0, np.arange(10., 20.))
+    g.append(1, np.arange(10., 20.))
+    assert g.refresh(force=True)
+    xdata, ydata = g._live[0]['artist'].get_data()
+    assert np.array_equal(xdata, np.arange(20.))
+    assert np.array_equal(ydata, np.arange(20.))
+    # the view grew to the new samples
+    assert g._axes().get_xlim()[1] >= 19
+
+def test_live_refresh_keeps_decimation():
+    x = np.arange(1000, dtype=np.float64)
+    g = Graphing.Graphing2D(x, rng.normal(size=1000), headless=True)
+    g.add_plot(decimate=True, live=True)
+    g.append(0, np.arange(1000, 200000, dtype=np.float64))
+    g.append(1, rng.normal(size=199000))
+    g.refresh(force=True)
+    fig = g._axes().figure
+    limit = 2 * int(fig.get_figwidth() * fig.dpi) + 2
+    xdata = g._live[0]['artist'].get_xdata()
+    assert len(xdata) <= limit
+    assert xdata[0] == 0 and xdata[-1] == 199999
+
+def test_live_linear_fit_equals_batch_fit():
+    x = np.linspace(0, 10, 200)
+    y = 3 * x - 1 + rng.normal(scale=0.5, size=200)
+    g = Graphing.Graphing2D(x[:50], y[:50], headless=True)
+    g.add_linear_fit(live=True)
+    g.append(0, x[50:])
+    g.append(1, y[50:])
+    g.refresh(force=True)
+    X, Y = g._live[0]['artist'].get_data()
+    _, (m, b) = EasyStats.LinearFit(x, y)
+    assert np.asarray(X) == pytest.approx([x.min(), x.max()])
+    assert np.asarray(Y) == pytest.approx([m * x.min() + b, m * x.max() + b])
+
+def test_live_is_rejected_where_it_is_not_supported():
+    x = np.linspace(1, 10, 50)
+    g = Graphing.Graphing2D(x, np.exp(-x) + 1, headless=True)
+    with pytest.raises(Graphing.BadParameter):
+        g.add_quadratic_fit(live=True)
+    with pytest.raises(Graphing.BadParameter):
+        g.add_curve_fit('exponential', live=True)
+    g.add_quadratic_fit(live=False)
+    assert g._live == []
@@ -0,0 +1,87 @@
+import threading
+import pytest
+from Logging import log, WARNING
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+def test_records_are_written_in_order(log_sink, asynchronous):
+    sink = log_sink(asynchronous=asynchronous, batch_size=64)
+    for i in range(1000):
+        log.info('record {0}', i, run=1)
+    log.flush()
+    assert sink.getvalue().splitlines() == ['record {0} [run=1]'.format(i) for i in range(1000)]
+
+def test_async_from_many_threads(log_sink):
+    sink = log_sink(asynchronous=True, batch_size=32)
+    def worker(k):
+        for i in range(500):
+            log.info('{0} {1}', k, i)
+    threads = [threading.Thread(target=worker, args=(k,)) for k in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    log.flush()
+    lines = sink.getvalue().splitlines()
+    assert sorted(lines) == sorted('{0} {1}'.format(k, i) for k in range(4) for i in range(500))
+    # per thread order is kept
+    for k in range(4):
+        assert [l for l in lines if l.startswith('{0} '.format(k))] == ['{0} {1}'.format(k, i) for i in range(500)]
+
+def test_async_caller_does_not_format(log_sink):
+    class Loud:
+        formatted = 0
+        def __format__(self, spec):
+            Loud.formatted += 1
+            return 'loud'
+    sink = log_sink(asynchronous=True, flush_interval=10)
+    log.info('{0}', Loud())
+    assert Loud.formatted == 0
+    log.flush()
+    assert Loud.formatted == 1 and sink.getvalue() == 'loud\n'
+
+def test_level_filter_skips_formatting(log_sink):
+    sink = log_sink(level=WARNING)
+    log.info('{0}', object())
+    log.warning('kept')
+    log.error('also kept')
+    assert sink.getvalue() == 'WARNING: kept\nERROR: also kept\n'
+
+def test_stop_drains_pending_records(log_sink):
+    sink = log_sink(asynchronous=True, flush_interval=10)
+    for i in range(10):
+        log.info('{0}', i)
+    log.configure(asynchronous=False)
+    assert sink.getvalue().splitlines() == [str(i) for i in range(10)]
+
+@pytest.mark.parametrize('asynchronous', [False, True])
+def test_bad_records_do_not_stop_the_writer(log_sink, asynchronous):
+    class Broken:
+        def __format__(self, spec):
+            raise RuntimeError
+        def __repr__(self):
+            raise RuntimeError
+    sink = log_sink(asynchronous=asynchronous)
+    log.info('bad {1}', 0)
+    log.info('{0}', Broken())
+    log.info('fields', value=Broken())
+    log.info('after')
+    log.flush()
+    assert sink.getvalue().splitlines() == [
+        "INFO: unformattable record (IndexError): message='bad {1}' args=(0,)",
+        "INFO: unformattable record (RuntimeError): message='{0}' args=<tuple object>",
+        "INFO: unformattable record (RuntimeError): message='fields' args=()",
+        'after']
+
+def test_flush_returns_when_the_sink_fails(log_sink):
+    class Failing:
+        def write(self, text):
+            raise RuntimeError('disk full')
+        def flush(self):
+            pass
+    log.configure(sink=Failing(), asynchronous=True)
+    log.info('lost')
+    log.flush()
+    sink = log_sink(asynchronous=True)
+    log.info('kept')
+    log.flush()
+    assert sink.getvalue() == 'kept\n'
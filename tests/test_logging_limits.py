@@ -0,0 +1,74 @@
+import json
+import pytest
+import Logging
+from Logging import log, INFO, WARNING
+
+def test_warnings_are_deduplicated_by_default(log_sink):
+    sink = log_sink(format='text')
+    for _ in range(50):
+        log.warning('The passed key "{0}" is not valid', 'foo')
+    log.warning('The passed key "{0}" is not valid', 'bar')
+    for _ in range(3):
+        log.info('progress')
+    log.flush()
+    assert sink.getvalue().splitlines() == [
+        'WARNING: The passed key "foo" is not valid',
+        'WARNING: The passed key "bar" is not valid',
+        'progress', 'progress', 'progress',
+        'WARNING: suppressed 49 similar messages'
+    ]
+
+def test_dedup_off_and_level(log_sink):
+    sink = log_sink(dedup=0)
+    for _ in range(3):
+        log.warning('same')
+    assert sink.getvalue().count('same') == 3
+    sink = log_sink(dedup=10, dedup_level=INFO)
+    for _ in range(3):
+        log.info('same')
+    assert sink.getvalue().count('same') == 1
+
+def test_suppressed_count_is_carried_by_next_record(log_sink, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(Logging.time, 'monotonic', lambda: now[0])
+    sink = log_sink(dedup=1.0)
+    def warn():
+        # one call site for all the records
+        log.warning('again')
+    for _ in range(4):
+        warn()
+    assert list(log.suppressed().values()) == [3]
+    now[0] = 2.0
+    warn()
+    assert sink.getvalue().splitlines()[-1] == 'WARNING: again (3 similar messages suppressed)'
+
+def test_rate_limit_matches_token_bucket(log_sink, monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(Logging.time, 'monotonic', lambda: now[0])
+    sink = log_sink(rate=2, burst=3, dedup=0)
+    written = 0
+    for step in range(100):
+        now[0] = step * 0.1
+        before = sink.getvalue().count('\n')
+        log.info('tick {0}', step)
+        written += sink.getvalue().count('\n') - before
+    # a burst of 3, then 2 records/s over the 9.9 s that follow
+    assert written == 3 + int(9.9 * 2)
+
+def test_json_records(log_sink):
+    sink = log_sink(format='json', dedup=0)
+    log.warning('value {0}', 3, run='a')
+    record = json.loads(sink.getvalue())
+    assert record['level'] == 'WARNING' and record['message'] == 'value 3'
+    assert record['fields'] == {'run' : 'a'}
+    assert record['site'].endswith(':test_json_records')
+
+def test_reset_restores_the_defaults(log_sink, capsys):
+    sink = log_sink(level=WARNING, format='json', rate=5, dedup=0, asynchronous=True)
+    log.configure(reset=True)
+    log.info('info')
+    for _ in range(3):
+        log.warning('twice?')
+    log.flush()
+    assert sink.getvalue() == ''
+    assert capsys.readouterr().out == 'info\nWARNING: twice?\nWARNING: suppressed 2 similar messages\n'
@@ -0,0 +1,46 @@
+import numpy as np
+import EasyStats
+
+rng = np.random.default_rng(1)
+x = rng.uniform(0, 10, 1000)
+y = 3*x - 2 + rng.normal(0, 0.5, 1000)
+
+def _reference(x, y):
+    # closed form simple linear regression
+    n = len(x)
+    m, b = np.polyfit(x, y, 1)
+    residuals = y - (m*x + b)
+    sse = np.sum(residuals**2)
+    sxx = np.sum((x - x.mean())**2)
+    s2 = sse / (n - 2)
+    r2 = 1 - sse / np.sum((y - y.mean())**2)
+    return np.array([m, b]), r2, np.array([np.sqrt(s2/sxx), np.sqrt(s2*(1/n + x.mean()**2/sxx))])
+
+def test_chunks_match_batch_fit():
+    fitter = EasyStats.OnlineLinearFit()
+    for start in range(0, len(x), 37):
+        fitter.update(x[start:start+37], y[start:start+37])
+    poly, r2, se = fitter.result()
+    expected_poly, expected_r2, expected_se = _reference(x, y)
+    assert fitter.n == len(x)
+    assert np.allclose(poly, expected_poly)
+    assert np.isclose(r2, expected_r2)
+    assert np.allclose(se, expected_se)
+
+def test_merge_is_order_independent():
+    a = EasyStats.OnlineLinearFit().update(x[:300], y[:300])
+    b = EasyStats.OnlineLinearFit().update(x[300:], y[300:])
+    c = EasyStats.OnlineLinearFit().update(x[300:], y[300:]).merge(EasyStats.OnlineLinearFit().update(x[:300], y[:300]))
+    assert np.allclose(a.merge(b).result()[0], c.result()[0])
+
+def test_stacked_series():
+    Y = np.stack([y, -y])
+    poly, _, _ = EasyStats.OnlineLinearFit().update(x, Y).result()
+    assert np.allclose(poly[1], -poly[0])
+    assert np.allclose(poly[0], np.polyfit(x, y, 1))
+
+def test_large_offset():
+    # the centred sums keep their precision far from zero
+    t = x + 1e9
+    poly, _, _ = EasyStats.OnlineLinearFit().update(t[:500], y[:500]).update(t[500:], y[500:]).result()
+    assert np.isclose(poly[0], np.polyfit(x, y, 1)[0], rtol=1e-6)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+import Graphing
+from Graphing import PlotStyle, BadParameter
+
+x = np.linspace(0, 1, 50)
+
+def test_options_are_checked_once():
+    style = PlotStyle(colour='red', linestyle='--', marker='o', x_shift=1, legend='data')
+    assert (style.colour, style.linestyle, style.marker, style.x_shift, style.legend) == ('red', '--', 'o', 1, 'data')
+    assert 'legend' in style and style['marker'] == 'o' and style.get('live', False) is False
+    # 'colour' wins over 'color', unsupported values keep the defaults
+    assert PlotStyle(color='blue', colour='red').colour == 'red'
+    assert PlotStyle(color='blue').colour == 'blue'
+    assert PlotStyle(linestyle=[4, 2]).linestyle == 'solid'
+    assert PlotStyle(marker='not a marker').marker is None
+
+@pytest.mark.parametrize('options', [{'colour' : 3}, {'legend' : 1}, {'autolegend' : 'yes'}, {'x_shift' : '1'},
+                                     {'marker' : 1.5}, {'errorbars' : 1}, {'s' : None}])
+def test_bad_options(options):
+    with pytest.raises(BadParameter):
+        PlotStyle(**options)
+
+def test_style_is_reused_and_overridden():
+    g = Graphing.Graphing2D(x, x, headless=True)
+    style = PlotStyle(colour='red', linestyle='--')
+    assert g._resolve_style({'style' : style}) is style
+    merged = g._resolve_style({'style' : style, 'colour' : 'blue'})
+    assert (merged.colour, merged.linestyle) == ('blue', '--')
+    assert style.colour == 'red'
+    with pytest.raises(BadParameter):
+        g.add_plot(style={'colour' : 'red'})
+
+def test_style_equals_keywords():
+    g = Graphing.Graphing2D(x, x*x, headless=True)
+    g.add_plot(colour='red', linestyle='--', marker='o', y_shift=2)
+    g.add_plot(style=PlotStyle(colour='red', linestyle='--', marker='o', y_shift=2))
+    a, b = g._axes().get_lines()
+    assert np.array_equal(a.get_xydata(), b.get_xydata())
+    for prop in ('get_color', 'get_linestyle', 'get_marker'):
+        assert getattr(a, prop)() == getattr(b, prop)()
+
+def test_series_batch_is_one_collection():
+    g = Graphing.Graphing2D(x, x, 2*x, headless=True)
+    series = [(0, 1), (0, 2), (x, 3*x), (list(x), [1.0] * 50)]
+    g.add_series_batch(series, style=PlotStyle(colour='black'), y_shift=1)
+    ax = g._axes()
+    assert len(ax.collections) == 1 and not ax.get_lines()
+    segments = ax.collections[0].get_segments()
+    for segment, k in zip(segments, [x, 2*x, 3*x, np.ones(50)]):
+        assert np.allclose(segment, np.column_stack([x, k + 1]))
+
+def test_series_batch_colours_and_options():
+    g = Graphing.Graphing2D(x, x, headless=True)
+    g.add_series_batch([(0, 1), (0, 1)], colours=['red', 'blue'])
+    assert len(g._axes().collections[0].get_colors()) == 2
+    with pytest.raises(BadParameter):
+        g.add_series_batch([(0, 1)], colours=['red', 'blue'])
+    with pytest.raises(BadParameter):
+        g.add_series_batch([(0, 1)], colours=['not a colour'])
+    for option in ('errorbars', 'decimate', 'live'):
+        with pytest.raises(BadParameter):
+            g.add_series_batch([(0, 1)], **{option : True})
+    with pytest.raises(Graphing.NonExistingData):
+        g.add_series_batch([(0, 5)])
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+import EasyStats
+
+rng = np.random.default_rng(16)
+x = np.linspace(-2, 6, 120)
+y = np.sin(x) + rng.normal(scale=0.05, size=120)
+
+@pytest.mark.parametrize('basis', ['chebyshev', 'legendre'])
+def test_orthogonal_fit_equals_polyfit(basis):
+    values, poly = EasyStats.NRankFit(x, y, 6, basis)
+    expected = np.polyfit(x, y, 6)
+    assert poly.degree == 6
+    assert np.allclose(values, np.polyval(expected, x), atol=1e-10)
+    assert np.allclose(poly.power(), expected)
+    assert np.allclose(EasyStats.PolyVal(poly, x), values)
+
+def test_chebyshev_coefficients_equal_numpy():
+    poly = EasyStats.PolyFit(x, y, 8, 'chebyshev')
+    assert np.allclose(poly.coef, np.polynomial.Chebyshev.fit(x, y, 8).coef)
+
+def test_large_offset_stays_accurate():
+    # timestamps: the power basis Vandermonde of x is hopeless at this offset
+    t = np.linspace(0, 3600, 500)
+    yt = 1e-6*(t - 1800)**3 + rng.normal(scale=0.01, size=500)
+    values, _ = EasyStats.NRankFit(1.7e9 + t, yt, 7, 'chebyshev')
+    assert np.allclose(values, np.polyval(np.polyfit(t - 1800, yt, 7), t - 1800), atol=1e-8)
+
+def test_stack_matches_single_series():
+    Y = np.stack([y, np.cos(x), x**3])
+    values, poly = EasyStats.NRankFit(x, Y, 4, 'legendre')
+    for k in range(3):
+        assert np.allclose(values[k], EasyStats.NRankFit(x, Y[k], 4, 'legendre')[0])
+    assert poly.coef.shape == (3, 5)
+
+def brute_force_loo(xs, ys, max_degree):
+    press = []
+    for d in range(max_degree + 1):
+        total = 0.0
+        for i in range(len(xs)):
+            keep = np.arange(len(xs)) != i
+            p = np.polyfit(xs[keep], ys[keep], d)
+            total += (ys[i] - np.polyval(p, xs[i]))**2
+        press.append(total)
+    return int(np.argmin(press))
+
+@pytest.mark.parametrize('basis', ['chebyshev', 'legendre'])
+def test_auto_degree_equals_brute_force_loo(basis):
+    xs = x[::3]
+    ys = y[::3]
+    poly = EasyStats.PolyFit(xs, ys, 'auto', basis, max_degree=10)
+    assert poly.degree == brute_force_loo(xs, ys, 10)
+    assert np.allclose(poly(xs), np.polyval(np.polyfit(xs, ys, poly.degree), xs))
+
+def test_bad_basis():
+    with pytest.raises(ValueError):
+        EasyStats.PolyFit(x, y, 3, 'hermite')
+    with pytest.raises(ValueError):
+        EasyStats.PolyFit(x, y, 'auto')
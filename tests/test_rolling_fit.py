@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+import EasyStats
+import Graphing
+
+rng = np.random.default_rng(22)
+N = 400
+t = np.sort(rng.uniform(0, 100, N))
+y = np.sin(t / 7) + 0.01 * t**1.5 + rng.normal(scale=0.1, size=N)
+
+def _window_fits(x, y, window, step, n):
+    # np.polyfit on every window, in coordinates relative to the window start
+    starts = range(0, len(x) - window + 1, step)
+    return [(s, np.polyfit(x[s:s+window] - x[s], y[s:s+window], n)) for s in starts]
+
+@pytest.mark.parametrize('window, step, n', [(10, 1, 1), (25, 3, 1), (7, 10, 1), (40, 4, 2), (N, 1, 3)])
+@pytest.mark.parametrize('offset', [0.0, 1.7e9])
+def test_rolling_fit_equals_polyfit_per_window(monkeypatch, window, step, n, offset):
+    # a small chunk so several chunks of blocks are solved
+    monkeypatch.setattr(EasyStats, '_ROLLING_CHUNK', 256)
+    x = t + offset
+    start, poly = EasyStats.RollingFit(x, y, window, step, n)
+    expected = _window_fits(x, y, window, step, n)
+    assert list(start) == [s for s, _ in expected]
+    assert len(poly) == len(start) and poly.degree == n
+    for i, (s, p) in enumerate(expected):
+        xs = x[s:s+window]
+        values = poly(np.broadcast_to(xs, (len(poly), window)))[i]
+        assert np.allclose(values, np.polyval(p, xs - x[s]), atol=1e-8)
+
+def test_rolling_fit_power_basis():
+    start, poly = EasyStats.RollingFit(t, y, 30, 5, 2)
+    for i, s in enumerate(start):
+        assert np.allclose(poly.power()[i], np.polyfit(t[s:s+30], y[s:s+30], 2), rtol=1e-6, atol=1e-9)
+
+def test_rolling_fit_stack():
+    Y = np.stack([y, 2*y, -t])
+    start, poly = EasyStats.RollingFit(t, Y, 20, 2)
+    assert poly.coef.shape == (3, len(start), 2)
+    for k in range(3):
+        _, single = EasyStats.RollingFit(t, Y[k], 20, 2)
+        assert np.allclose(poly.coef[k], single.coef)
+
+@pytest.mark.parametrize('offset', [0.0, 1.7e9])
+@pytest.mark.parametrize('n', [1, 2])
+def test_segmented_fit_equals_polyfit_per_piece(offset, n):
+    x = t + offset
+    breakpoints = [offset + 20, offset + 55.5, offset + 80]
+    fit, poly = EasyStats.SegmentedFit(x, y, breakpoints, n)
+    edges = np.concatenate([[0], np.searchsorted(x, breakpoints), [N]])
+    assert len(poly) == 4
+    for a, b in zip(edges[:-1], edges[1:]):
+        p = np.polyfit(x[a:b] - x[a], y[a:b], n)
+        assert np.allclose(fit[a:b], np.polyval(p, x[a:b] - x[a]), atol=1e-8)
+
+def test_segmented_fit_small_pieces_and_errors():
+    # the piece between 50 and 50.001 is empty
+    fit, poly = EasyStats.SegmentedFit(t, y, [50, 50.001], 1)
+    assert np.all(np.isnan(poly.coef[1])) and np.all(np.isfinite(poly.coef[[0, 2]]))
+    assert np.all(np.isfinite(fit))
+    with pytest.raises(ValueError):
+        EasyStats.SegmentedFit(t, y, [50, 40])
+    with pytest.raises(ValueError):
+        EasyStats.SegmentedFit(t[::-1], y, [50])
+    with pytest.raises(ValueError):
+        EasyStats.RollingFit(t, y, 2, 1, 2)
+    with pytest.raises(ValueError):
+        EasyStats.RollingFit(t, y, 10, 0)
+
+def test_graphing_draws_the_local_fits():
+    g = Graphing.Graphing2D(t, y, headless=True)
+    start, poly = g.add_rolling_fit(50, step=10, y_shift=1)
+    X, Y = g._axes().get_lines()[0].get_data()
+    centre = (t[start] + t[start + 49]) / 2
+    assert np.allclose(X, centre) and np.allclose(Y, poly(centre) + 1)
+    poly = g.add_segmented_fit([30, 60], n=2)
+    X, Y = g._axes().get_lines()[1].get_data()
+    assert len(poly) == 3 and np.count_nonzero(np.isnan(X)) == 2
+    with pytest.raises(Graphing.BadParameter):
+        g.add_rolling_fit(1)
+    with pytest.raises(Graphing.BadParameter):
+        g.add_segmented_fit([30, 60], live=True)
@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+import Graphing
+
+x = np.linspace(0.1, 4, 50)
+y = np.exp(0.7*x) * 1.5
+
+def _line(g):
+    line = g._axes().get_lines()[-1]
+    return np.asarray(line.get_xdata()), np.asarray(line.get_ydata())
+
+def test_plot_shift():
+    g = Graphing.Graphing2D(x, y, headless=True)
+    g.add_plot(x_shift=1.5, y_shift=-2.0)
+    X, Y = _line(g)
+    assert np.allclose(X, x + 1.5) and np.allclose(Y, y - 2.0)
+
+def test_linear_fit_line():
+    g = Graphing.Graphing2D(x, 2*x + 1, headless=True)
+    (m, b), _ = g.add_linear_fit(x_shift=1.0, y_shift=3.0)
+    X, Y = _line(g)
+    assert np.allclose([m, b], [2, 1])
+    assert np.allclose(X, x + 1.0) and np.allclose(Y, np.polyval([m, b], x) + 3.0)
+
+def test_quadratic_fit_line():
+    g = Graphing.Graphing2D(x, x*x - x, headless=True)
+    p, _ = g.add_quadratic_fit(y_shift=1.0)
+    X, Y = _line(g)
+    assert np.allclose(p, [1, -1, 0], atol=1e-9)
+    assert np.allclose(Y, np.polyval(p, x) + 1.0)
+
+def test_exponential_fit_line():
+    g = Graphing.Graphing2D(x, y, headless=True)
+    p, _ = g.add_exponential_fit(y_shift=0.5)
+    X, Y = _line(g)
+    assert np.allclose(p, np.polyfit(x, np.log(y), 1))
+    assert np.allclose(Y, np.exp(p[1]) * np.exp(p[0]*x) + 0.5)
+
+def test_exponential_fit_rejects_non_positive():
+    g = Graphing.Graphing2D(x, y - 2, headless=True)
+    with pytest.raises(Graphing.NegativeLog):
+        g.add_exponential_fit()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+import EasyStats
+import Graphing
+
+rng = np.random.default_rng(14)
+x = np.linspace(-3, 5, 80)
+sigma = rng.uniform(0.1, 1.0, size=80)
+y = 0.5 * x**2 - 2 * x + 1 + rng.normal(scale=sigma)
+
+def test_weighted_fit_equals_polyfit():
+    fit, p, cov = EasyStats.WeightedNRankFit(x, y, 2, sigma)
+    ref, ref_cov = np.polyfit(x, y, 2, w=1/sigma, cov='unscaled')
+    assert p == pytest.approx(ref, rel=1e-10)
+    assert cov == pytest.approx(ref_cov, rel=1e-8)
+    assert fit == pytest.approx(np.polyval(ref, x), rel=1e-10)
+
+def test_relative_sigma_scales_like_polyfit():
+    _, p, cov = EasyStats.WeightedNRankFit(x, y, 2, sigma, absolute_sigma=False)
+    ref, ref_cov = np.polyfit(x, y, 2, w=1/sigma, cov=True)
+    assert p == pytest.approx(ref, rel=1e-10)
+    assert cov == pytest.approx(ref_cov, rel=1e-8)
+
+def test_odr_line_equals_deming_regression():
+    # equal errors on every point: the orthogonal distance line is the Deming
+    # regression line with delta = var_y / var_x
+    t = rng.uniform(0, 10, size=200)
+    xs = t + rng.normal(scale=0.3, size=200)
+    ys = 2 * t + 1 + rng.normal(scale=0.5, size=200)
+    _, (m, b), _ = EasyStats.WeightedNRankFit(xs, ys, 1, np.full(200, 0.5), np.full(200, 0.3))
+    delta = 0.5**2 / 0.3**2
+    sxx, syy = np.var(xs), np.var(ys)
+    sxy = np.mean((xs - xs.mean()) * (ys - ys.mean()))
+    slope = (syy - delta*sxx + np.sqrt((syy - delta*sxx)**2 + 4*delta*sxy**2)) / (2*sxy)
+    assert m == pytest.approx(slope, rel=1e-6)
+    assert b == pytest.approx(ys.mean() - slope*xs.mean(), rel=1e-6)
+
+def test_graphing_uses_the_error_columns():
+    g = Graphing.Graphing2D(x, y, np.zeros_like(x), sigma, headless=True)
+    g.set_working_error_data(2, 3)
+    p, cov = g.add_quadratic_fit(weighted=True)
+    ref, ref_cov = np.polyfit(x, y, 2, w=1/sigma, cov='unscaled')
+    assert p == pytest.approx(ref, rel=1e-8)
+    assert cov == pytest.approx(ref_cov, rel=1e-6)
+    with pytest.raises(Graphing.BadParameter):
+        g.add_linear_fit(weighted='yes')
+
+@pytest.mark.parametrize('absolute_sigma', [True, False])
+def test_stack_covariance_has_one_matrix_per_series(absolute_sigma):
+    Y = np.stack([y, 2*y + x])
+    _, p, cov = EasyStats.WeightedNRankFit(x, Y, 2, sigma, absolute_sigma=absolute_sigma)
+    assert p.shape == (2, 3) and cov.shape == (2, 3, 3)
+    for k in range(2):
+        _, single_p, single_cov = EasyStats.WeightedNRankFit(x, Y[k], 2, sigma, absolute_sigma=absolute_sigma)
+        assert np.allclose(p[k], single_p)
+        assert np.allclose(cov[k], single_cov)